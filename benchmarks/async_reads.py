@@ -0,0 +1,107 @@
+"""
+Latency and throughput of the ring read endpoints under WSGI and ASGI.
+
+Drives Django's own WSGI and ASGI handlers in process (through the test
+clients) with ``--concurrency`` requests in flight:
+
+- ``wsgi drf``: the DRF endpoint on a pool of threads, as a threaded WSGI
+  server would run it.
+- ``asgi drf``: the same endpoint under ASGI, where the sync view is run in
+  a worker thread.
+- ``asgi async``: the ``/api/async/`` endpoint on the event loop.
+
+Each mode is warmed up first, so list endpoints are measured on response
+cache hits. Numbers exclude socket and server overhead; use them to compare
+modes, not as absolute server capacity.
+
+Usage (from the project root):
+    python benchmarks/async_reads.py [--path /api/rings/] [--concurrency 64] [--seconds 5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'woy.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+
+# The test clients are rejected unless their host is allowed
+settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+
+
+def check(response, path):
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {path} returned {response.status_code}')
+
+
+def run_wsgi(path, concurrency, seconds):
+    Client().get(path)
+    deadline = time.perf_counter() + seconds
+    latencies = []
+
+    def worker():
+        client = Client()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = client.get(path)
+            latencies.append(time.perf_counter() - started)
+            check(response, path)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+async def run_asgi(path, concurrency, seconds):
+    await AsyncClient().get(path)
+    deadline = time.perf_counter() + seconds
+    latencies = []
+
+    async def worker():
+        client = AsyncClient()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+            check(response, path)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def describe(latencies, seconds):
+    cuts = statistics.quantiles(latencies, n=100)
+    return (f'{len(latencies) / seconds:8.0f} req/s  p50 {cuts[49] * 1000:8.1f} ms  '
+            f'p99 {cuts[98] * 1000:8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--path', default='/api/rings/', help='DRF path; the async twin is under /api/async/')
+    parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each mode')
+    args = parser.parse_args()
+
+    async_path = args.path.replace('/api/', '/api/async/', 1)
+    print(f'{args.path} and {async_path}, {args.concurrency} in flight, {args.seconds:g}s per mode')
+    print(f"{'wsgi drf':12}{describe(run_wsgi(args.path, args.concurrency, args.seconds), args.seconds)}")
+    print(f"{'asgi drf':12}{describe(asyncio.run(run_asgi(args.path, args.concurrency, args.seconds)), args.seconds)}")
+    print(f"{'asgi async':12}{describe(asyncio.run(run_asgi(async_path, args.concurrency, args.seconds)), args.seconds)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Bytes on the wire and CPU time per request for each response encoding.
+
+Requests every path with ``Accept-Encoding`` set to identity, gzip and br (if
+the brotli package is installed), through Django's test client:
+
+- ``cold``: the first request after a dataset version bump, which renders the
+  body and, for cached list endpoints, compresses it for the cache.
+- ``warm``: the mean of ``--repeat`` further requests. Cached list endpoints
+  send the stored variant; other endpoints are compressed per request by
+  ``CompressionMiddleware``.
+
+CPU time is this process's, so it includes the test client's overhead.
+
+Usage (from the project root):
+    python benchmarks/compression.py [--path /api/rings/ ...] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'woy.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from woy.cache import get_response_cache  # noqa: E402
+from woy.compression import available_encodings  # noqa: E402
+
+# The test client is rejected unless its host is allowed
+settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+
+DEFAULT_PATHS = [
+    '/api/rings/',
+    '/api/rings/?format=lean',
+    '/api/user/rings/',
+    '/api/ring-eras/',
+    '/api/rings/timeline/?start=0&days=365',
+]
+
+
+def get(client, path, encoding):
+    started = time.process_time()
+    response = client.get(path, HTTP_ACCEPT_ENCODING=encoding or '')
+    elapsed = time.process_time() - started
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {path} returned {response.status_code}')
+    if response.get('Content-Encoding') != encoding:
+        raise RuntimeError(f'GET {path} was sent as {response.get("Content-Encoding")!r}, not {encoding!r}')
+    return len(response.content), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--path', action='append', help='Path to request; repeat for several')
+    parser.add_argument('--repeat', type=int, default=20, help='Warm requests per path and encoding')
+    args = parser.parse_args()
+
+    client = Client()
+    encodings = [None, *reversed(available_encodings())]
+    print(f"{'path':<40} {'encoding':<9} {'bytes':>10} {'cold ms':>9} {'warm ms':>9}")
+    for path in args.path or DEFAULT_PATHS:
+        for encoding in encodings:
+            get_response_cache().invalidate()
+            size, cold = get(client, path, encoding)
+            warm = sum(get(client, path, encoding)[1] for _ in range(args.repeat)) / args.repeat
+            print(f'{path:<40} {encoding or "identity":<9} {size:>10} {cold * 1000:>9.2f} {warm * 1000:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Read latency while ring preferences are being rewritten.
+
+Reader processes request ``/api/user/rings/preferences/`` and ``/api/rings/<id>/``
+in a loop, first on their own and then while a writer process keeps posting
+reordered ring lists to ``/api/user/rings/update/``. It reports the read
+latency percentiles for both phases and the write rate.
+
+It writes to the configured database, so point it at a copy, and compare
+journal modes by setting WOY_SQLITE_JOURNAL_MODE (e.g. ``delete`` and ``wal``).
+
+Usage (from the project root):
+    WOY_DB_NAME=/tmp/woy-copy.sqlite3 python benchmarks/concurrency.py [--readers 4] [--seconds 5]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'woy.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from woy.models import Ring  # noqa: E402
+
+# The test client is rejected unless its host is allowed
+settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+
+
+# Separate processes, so that readers wait on database locks rather than on
+# each other's GIL
+def read_loop(ring_ids, stop, results):
+    client = Client()
+    urls = ['/api/user/rings/preferences/'] + [f'/api/rings/{ring_id}/' for ring_id in ring_ids[:50]]
+    latencies = []
+    # The first request in a process pays for URL and serializer setup
+    client.get(urls[0])
+    client.get(urls[-1])
+    while not stop.is_set():
+        url = random.choice(urls)
+        started = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}')
+    results.put(('read', latencies))
+
+
+def write_loop(ring_ids, stop, results):
+    client = Client()
+    ring_ids = list(ring_ids)
+    writes = 0
+    while not stop.is_set():
+        random.shuffle(ring_ids)
+        response = client.post('/api/user/rings/update/', {'ring_ids': ring_ids}, content_type='application/json')
+        if response.status_code != 200:
+            raise RuntimeError(f'POST update returned {response.status_code}')
+        writes += 1
+    results.put(('write', writes))
+
+
+def run_phase(ring_ids, readers, seconds, with_writer):
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=read_loop, args=(ring_ids, stop, results)) for _ in range(readers)]
+    if with_writer:
+        processes.append(multiprocessing.Process(target=write_loop, args=(ring_ids, stop, results)))
+    for process in processes:
+        process.start()
+    time.sleep(seconds)
+    stop.set()
+    latencies = []
+    writes = 0
+    for _ in processes:
+        kind, value = results.get()
+        if kind == 'read':
+            latencies.extend(value)
+        else:
+            writes = value
+    for process in processes:
+        process.join()
+    return latencies, writes
+
+
+def describe(latencies):
+    cuts = statistics.quantiles(latencies, n=100)
+    return (f'{len(latencies):7d} reads  p50 {cuts[49] * 1000:7.1f} ms  p95 {cuts[94] * 1000:7.1f} ms  '
+            f'p99 {cuts[98] * 1000:7.1f} ms  max {max(latencies) * 1000:7.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--readers', type=int, default=4, help='Reader threads')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each phase')
+    parser.add_argument('--rings', type=int, default=1000, help='Rings in each preference update')
+    args = parser.parse_args()
+
+    ring_ids = list(Ring.objects.order_by('index').values_list('id', flat=True)[:args.rings])
+    if not ring_ids:
+        sys.exit('No rings in the database; load some with load_rings_data or load_additional_rings')
+    if not User.objects.exists():
+        sys.exit('The preference endpoints act for the first user; create one with createsuperuser')
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            mode = cursor.fetchone()[0]
+        print(f'SQLite, journal_mode={mode}')
+    else:
+        print(connection.vendor)
+    connection.close()
+    print(f'{args.readers} readers, {len(ring_ids)} rings per preference update, {args.seconds:g}s per phase')
+
+    latencies, _ = run_phase(ring_ids, args.readers, args.seconds, with_writer=False)
+    print(f'reads only      {describe(latencies)}')
+    latencies, writes = run_phase(ring_ids, args.readers, args.seconds, with_writer=True)
+    print(f'reads + writer  {describe(latencies)}  ({writes / args.seconds:.1f} writes/s)')
+
+
+if __name__ == '__main__':
+    main()
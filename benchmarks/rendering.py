@@ -0,0 +1,77 @@
+"""
+Wheel renders per second, in one process and in a process pool.
+
+Builds the spec of one wheel (``--rings`` rings, default the first 10 by
+index) for ``--count`` consecutive days, then renders every spec in each
+format and size without the render store:
+
+- ``serial``: one after another in this process;
+- ``pool``: spread over ``--workers`` processes (default one per CPU) as the
+  ``prerender_wheels`` command does, including the cost of sending the specs
+  and images between processes.
+
+Renders per second per core is the pool rate divided by the worker count;
+against the serial rate it shows how well rendering scales across cores.
+
+Usage (from the project root):
+    python benchmarks/rendering.py [--rings 1,2,3] [--count 100] [--sizes 256,512] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'woy.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from woy.models import Ring  # noqa: E402
+from woy.rendering import FORMATS, render_job, wheel_spec  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rings', help='Comma-separated ring IDs (default: the first 10 by index)')
+    parser.add_argument('--count', type=int, default=100, help='Days, and so renders, per format and size')
+    parser.add_argument('--sizes', default='256,512', help='Comma-separated image sizes in pixels')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes in the pool')
+    args = parser.parse_args()
+
+    if args.rings:
+        ring_ids = [int(ring_id) for ring_id in args.rings.split(',')]
+    else:
+        ring_ids = list(Ring.objects.order_by('index').values_list('id', flat=True)[:10])
+    specs = [wheel_spec(ring_ids, day + 0.5) for day in range(args.count)]
+    workers = max(1, args.workers or 1)
+
+    print(f'{len(specs[0].rings)} rings, {args.count} renders per row, {workers} workers')
+    print(f"{'format':<7} {'size':>5} {'serial/s':>9} {'pool/s':>9} {'per core/s':>11} {'scaling':>8}")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Start the workers before timing anything
+        list(executor.map(render_job, [(specs[0], 16, 'svg')] * workers))
+        for image_format in FORMATS:
+            for size in (int(size) for size in args.sizes.split(',')):
+                jobs = [(spec, size, image_format) for spec in specs]
+
+                started = time.perf_counter()
+                for job in jobs:
+                    render_job(job)
+                serial = len(jobs) / (time.perf_counter() - started)
+
+                started = time.perf_counter()
+                list(executor.map(render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+                pool = len(jobs) / (time.perf_counter() - started)
+
+                print(
+                    f'{image_format:<7} {size:>5} {serial:>9.1f} {pool:>9.1f} '
+                    f'{pool / workers:>11.1f} {pool / serial:>7.2f}x'
+                )
+
+
+if __name__ == '__main__':
+    main()
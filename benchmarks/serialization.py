@@ -0,0 +1,68 @@
+"""
+Bytes and serialization time per ring for each ring wire format.
+
+Reads every ring from the configured database and serializes it with the full
+``RingSerializer``, the lean ``?format=lean`` representation and a sparse
+``?fields=`` selection of each.
+
+Usage (from the project root):
+    python benchmarks/serialization.py [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'woy.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from woy.models import Ring  # noqa: E402
+from woy.serializers import LeanRingSerializer, RingSerializer  # noqa: E402
+
+MODES = [
+    ('full', RingSerializer, ''),
+    ('full ?fields=id,name,eras', RingSerializer, 'fields=id,name,eras'),
+    ('lean', LeanRingSerializer, ''),
+    ('lean ?fields=id,name,eras', LeanRingSerializer, 'fields=id,name,eras'),
+]
+
+
+def measure(serializer_class, query, rings, repeat):
+    request = Request(APIRequestFactory().get(f'/api/rings/?{query}'))
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        data = serializer_class(rings, many=True, context={'request': request}).data
+        body = JSONRenderer().render(data)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(body), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per mode; the fastest is reported')
+    args = parser.parse_args()
+
+    rings = list(Ring.objects.order_by('index').with_eras_and_images())
+    if not rings:
+        sys.exit('No rings in the database; load some with load_rings_data or load_additional_rings')
+
+    print(f'{len(rings)} rings, best of {args.repeat} runs')
+    print(f"{'mode':<28} {'bytes/ring':>12} {'us/ring':>10}")
+    for name, serializer_class, query in MODES:
+        size, elapsed = measure(serializer_class, query, rings, args.repeat)
+        print(f'{name:<28} {size / len(rings):>12.0f} {elapsed / len(rings) * 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
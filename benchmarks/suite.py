@@ -0,0 +1,498 @@
+"""
+Reproducible benchmark suite for the ring API.
+
+``run`` seeds one deterministic SQLite database per dataset size (the bundled
+rings plus ``load_additional_rings --seed``), then for each dataset:
+
+- drives every GET route of the API router in process, recording cold and
+  warm latency percentiles, throughput and queries per request;
+- starts Django's threaded development server on the dataset and runs a
+  concurrent keep-alive HTTP load against every route (skip with
+  ``--no-http``);
+- records the peak RSS of the in-process run and of the server.
+
+Results are written as JSON. ``compare`` reads two result files and flags
+regressions beyond a threshold, exiting with status 1 if there are any.
+
+Usage (from the project root):
+    python benchmarks/suite.py run [--sizes 10,1000,50000] [--output results.json]
+    python benchmarks/suite.py compare baseline.json results.json [--threshold 0.2]
+
+Seeded databases are kept in ``--data-dir`` (default ``benchmarks/.data``) and
+reused by later runs with the same size and seed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SIZES = '10,1000,50000'
+DEFAULT_DATA_DIR = ROOT / 'benchmarks' / '.data'
+# Rings picked by the benchmark user, so /api/user/rings/ has work to do
+USER_RING_COUNT = 50
+# Query parameters for routes that need them, formatted with the sample keys
+ROUTE_QUERIES = {
+    'ring-alignments': 'eras={ringera}',
+    'ring-search': 'q=moon',
+    'ring-snapshot': 'day=100.5',
+    'ring-timeline': 'start=0&days=365',
+    'user-rings-snapshot': 'day=100.5',
+    'user-rings-timeline': 'start=0&days=365',
+}
+# Routes that answer with a redirect rather than a body
+SKIPPED_ROUTES = {'ringimage-variant'}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def latency_summary(latencies, elapsed):
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else None,
+    }
+
+
+def peak_rss_kb(pid=None):
+    """Peak resident set size in KiB, or None where it cannot be read"""
+    if pid is not None:
+        try:
+            status = Path(f'/proc/{pid}/status').read_text()
+        except OSError:
+            return None
+        for line in status.splitlines():
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def dataset_env(database):
+    return {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'woy.settings',
+        'WOY_DB_ENGINE': 'sqlite',
+        'WOY_DB_NAME': str(database),
+        # One log line per request would swamp the output
+        'WOY_PERFORMANCE_LOG_LEVEL': 'WARNING',
+    }
+
+
+def setup_django():
+    sys.path.insert(0, str(ROOT))
+    import django
+
+    django.setup()
+    from django.conf import settings
+
+    # Adding the test client's host disables DEBUG's implicit localhost entries
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver', '127.0.0.1', 'localhost']
+
+
+def seed(size, seed_value):
+    """Worker: create the dataset in the database named by WOY_DB_NAME"""
+    setup_django()
+    from io import StringIO
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+
+    from woy.models import Ring
+
+    quiet = StringIO()
+    call_command('migrate', verbosity=0)
+    call_command('load_rings_data', stdout=quiet)
+    extra = size - Ring.objects.count()
+    if extra > 0:
+        call_command('load_additional_rings', count=extra, seed=seed_value, stdout=quiet)
+
+    User.objects.get_or_create(username='benchmark')
+    ring_ids = list(Ring.objects.order_by('index').values_list('id', flat=True)[:USER_RING_COUNT])
+    response = Client().post('/api/user/rings/update/', {'ring_ids': ring_ids}, content_type='application/json')
+    if response.status_code != 200:
+        raise RuntimeError(f'Saving the benchmark user\'s rings failed: {response.content!r}')
+
+
+def get_routes():
+    """(name, path) for every GET route of the API router, with sample arguments"""
+    from django.urls import reverse
+
+    from woy.models import Ring, RingEra, RingImage
+    from woy.urls import router
+
+    sample_pks = {
+        'ring': Ring.objects.order_by('index').values_list('pk', flat=True).first(),
+        'ringera': RingEra.objects.values_list('pk', flat=True).first(),
+        'ringimage': RingImage.objects.values_list('pk', flat=True).first(),
+    }
+    routes = []
+    for pattern in router.urls:
+        actions = getattr(pattern.callback, 'actions', None)
+        if 'format' in pattern.pattern.regex.groupindex or (actions is not None and 'get' not in actions):
+            continue
+        if pattern.name in SKIPPED_ROUTES:
+            continue
+        kwargs = {}
+        if 'pk' in pattern.pattern.regex.groupindex:
+            basename = pattern.name.rsplit('-', 1)[0]
+            if sample_pks.get(basename) is None:
+                continue
+            kwargs['pk'] = sample_pks[basename]
+        path = reverse(pattern.name, kwargs=kwargs)
+        query = ROUTE_QUERIES.get(pattern.name, '').format(**sample_pks)
+        routes.append((pattern.name, f'{path}?{query}' if query else path))
+    return routes
+
+
+def measure(requests, time_budget):
+    """Worker: drive every route in process and print the results as JSON"""
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection, reset_queries
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from woy.cache import get_response_cache
+    from woy.models import Ring, RingEra
+
+    # A database seeded by an older revision may lack newer migrations
+    call_command('migrate', verbosity=0)
+    client = Client()
+    results = {}
+    for name, path in get_routes():
+        # Cold: nothing cached for this dataset version
+        get_response_cache().invalidate()
+        # The debug query log is capped, so empty it before each capture
+        reset_queries()
+        with CaptureQueriesContext(connection) as cold_queries:
+            started = time.perf_counter()
+            response = client.get(path)
+            cold = time.perf_counter() - started
+        # captured_queries slices connection.queries, which reset_queries()
+        # below empties, so count them now
+        cold_count = len(cold_queries.captured_queries)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path} returned {response.status_code}')
+
+        reset_queries()
+        with CaptureQueriesContext(connection) as warm_queries:
+            client.get(path)
+        warm_count = len(warm_queries.captured_queries)
+        latencies = []
+        deadline = time.perf_counter() + time_budget
+        started = time.perf_counter()
+        while len(latencies) < requests and (not latencies or time.perf_counter() < deadline):
+            request_started = time.perf_counter()
+            client.get(path)
+            latencies.append(time.perf_counter() - request_started)
+        results[path] = {
+            'route': name,
+            'cold_ms': round(cold * 1000, 3),
+            'cold_queries': cold_count,
+            'queries': warm_count,
+            'bytes': len(response.content),
+            **latency_summary(latencies, time.perf_counter() - started),
+        }
+
+    print(json.dumps({
+        'rings': Ring.objects.count(),
+        'eras': RingEra.objects.count(),
+        'peak_rss_kb': peak_rss_kb(),
+        'endpoints': results,
+    }))
+
+
+def serve(port):
+    """Worker: serve the API on ``port`` with Django's threaded development server"""
+    setup_django()
+    from django.core.servers.basehttp import WSGIServer, get_internal_wsgi_application
+    from django.core.servers.basehttp import run as run_server
+
+    class NoDelayWSGIServer(WSGIServer):
+        # The server writes headers and body separately; without TCP_NODELAY
+        # Nagle's algorithm and delayed ACKs add ~40 ms to every response
+        def get_request(self):
+            sock, address = super().get_request()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return sock, address
+
+    run_server('127.0.0.1', port, get_internal_wsgi_application(), threading=True, server_cls=NoDelayWSGIServer)
+
+
+def list_routes():
+    """Worker: print the routes as JSON, for the HTTP load"""
+    setup_django()
+    print(json.dumps(get_routes()))
+
+
+def run_worker(command, database, *args):
+    output = subprocess.run(
+        [sys.executable, __file__, command, *map(str, args)],
+        env=dataset_env(database), cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True,
+    ).stdout
+    return json.loads(output) if output.strip() else None
+
+
+async def http_get(reader, writer, host, path):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    length = 0
+    close = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        header, _, value = line.decode('latin-1').partition(':')
+        if header.lower() == 'content-length':
+            length = int(value)
+        elif header.lower() == 'connection' and value.strip().lower() == 'close':
+            close = True
+    await reader.readexactly(length)
+    return status, close
+
+
+async def load_route(base_url, path, concurrency, duration):
+    """Keep ``concurrency`` connections busy with GET ``path`` for ``duration`` seconds"""
+    parts = urlsplit(base_url)
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        connection = None
+        # Requests in flight at the deadline are awaited rather than abandoned,
+        # so the server is idle again before the next route is measured
+        while time.perf_counter() < deadline:
+            if connection is None:
+                connection = await asyncio.open_connection(parts.hostname, parts.port)
+            started = time.perf_counter()
+            try:
+                status, close = await http_get(*connection, parts.netloc, path)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errors += 1
+                connection[1].close()
+                connection = None
+                continue
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+            if close:
+                connection[1].close()
+                connection = None
+        if connection is not None:
+            connection[1].close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    summary = latency_summary(latencies, elapsed) if latencies else {'requests': 0}
+    if errors:
+        print(f'  {errors} failed requests for {path}', file=sys.stderr)
+    return {**summary, 'errors': errors}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'The server did not start on port {port}')
+
+
+def http_load(database, concurrency, duration):
+    """Run the HTTP load against a local server for the dataset"""
+    routes = run_worker('_routes', database)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, __file__, '_serve', str(port)],
+        env=dataset_env(database), cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server(port)
+        results = {}
+        for name, path in routes:
+            results[path] = {
+                'route': name,
+                **asyncio.run(load_route(f'http://127.0.0.1:{port}', path, concurrency, duration)),
+            }
+        return {'concurrency': concurrency, 'server_peak_rss_kb': peak_rss_kb(server.pid), 'endpoints': results}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'datasets': {},
+    }
+    for size in [int(size) for size in args.sizes.split(',')]:
+        database = data_dir / f'rings-{size}-seed{args.seed}.sqlite3'
+        if args.reseed and database.exists():
+            database.unlink()
+        if not database.exists():
+            print(f'Seeding {size} rings...', file=sys.stderr)
+            started = time.perf_counter()
+            try:
+                run_worker('_seed', database, size, args.seed)
+            except BaseException:
+                # Never reuse a half-seeded database
+                database.unlink(missing_ok=True)
+                raise
+            print(f'  seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+        print(f'Measuring {size} rings in process...', file=sys.stderr)
+        dataset = run_worker('_measure', database, args.requests, args.time_budget)
+        if not args.no_http:
+            print(f'Measuring {size} rings over HTTP...', file=sys.stderr)
+            dataset['http'] = http_load(database, args.concurrency, args.duration)
+        report['datasets'][str(size)] = dataset
+
+    body = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(body + '\n')
+        print(f'Results written to {args.output}', file=sys.stderr)
+    else:
+        print(body)
+
+
+def iter_metrics(report):
+    """Yield (label, metric, value) for every comparable figure in a report"""
+    for size, dataset in report['datasets'].items():
+        yield f'{size} rings', 'peak_rss_kb', dataset.get('peak_rss_kb')
+        for path, result in dataset['endpoints'].items():
+            for metric in ('p50_ms', 'p99_ms', 'requests_per_second', 'queries', 'cold_queries'):
+                yield f'{size} rings {path}', metric, result.get(metric)
+        http = dataset.get('http')
+        if http:
+            yield f'{size} rings http', 'server_peak_rss_kb', http.get('server_peak_rss_kb')
+            for path, result in http['endpoints'].items():
+                for metric in ('p50_ms', 'p99_ms', 'requests_per_second', 'errors'):
+                    yield f'{size} rings http {path}', metric, result.get(metric)
+
+
+def compare(args):
+    baseline = {(label, metric): value for label, metric, value in iter_metrics(json.loads(Path(args.baseline).read_text()))}
+    current = json.loads(Path(args.current).read_text())
+    regressions = []
+    for label, metric, value in iter_metrics(current):
+        old = baseline.get((label, metric))
+        if old is None or value is None:
+            continue
+        if metric in ('queries', 'cold_queries', 'errors'):
+            # Counts are deterministic; any increase counts
+            regressed = value > old
+        elif metric == 'requests_per_second':
+            regressed = value < old * (1 - args.threshold)
+        else:
+            # Ignore sub-millisecond noise on latencies
+            regressed = value > old * (1 + args.threshold) and (not metric.endswith('_ms') or value - old > 1)
+        marker = 'REGRESSION' if regressed else ''
+        if regressed or args.verbose:
+            print(f'{marker:10} {label} {metric}: {old} -> {value}')
+        if regressed:
+            regressions.append((label, metric))
+    print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Seed the datasets and measure every endpoint')
+    run_parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma-separated dataset sizes in rings')
+    run_parser.add_argument('--seed', type=int, default=42, help='Seed for the generated rings')
+    run_parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='Where seeded databases are kept')
+    run_parser.add_argument('--reseed', action='store_true', help='Rebuild seeded databases')
+    run_parser.add_argument('--requests', type=int, default=50, help='Warm in-process requests per endpoint')
+    run_parser.add_argument('--time-budget', type=float, default=10, help='Seconds of warm requests per endpoint at most')
+    run_parser.add_argument('--no-http', action='store_true', help='Skip the HTTP load')
+    run_parser.add_argument('--concurrency', type=int, default=16, help='HTTP connections per endpoint')
+    run_parser.add_argument('--duration', type=float, default=5, help='Seconds of HTTP load per endpoint')
+    run_parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+
+    compare_parser = commands.add_parser('compare', help='Flag regressions between two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative slowdown')
+    compare_parser.add_argument('--verbose', action='store_true', help='Print every compared figure')
+
+    # Internal commands, run in a subprocess per dataset
+    worker = commands.add_parser('_seed')
+    worker.add_argument('size', type=int)
+    worker.add_argument('seed', type=int)
+    worker = commands.add_parser('_measure')
+    worker.add_argument('requests', type=int)
+    worker.add_argument('time_budget', type=float)
+    commands.add_parser('_routes')
+    worker = commands.add_parser('_serve')
+    worker.add_argument('port', type=int)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    elif args.command == 'compare':
+        sys.exit(compare(args))
+    elif args.command == '_seed':
+        seed(args.size, args.seed)
+    elif args.command == '_measure':
+        measure(args.requests, args.time_budget)
+    elif args.command == '_routes':
+        list_routes()
+    elif args.command == '_serve':
+        serve(args.port)
+
+
+if __name__ == '__main__':
+    main()
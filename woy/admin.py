@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django import forms
-from .models import Ring, RingEra, RingImage, UserRingPreference
+from django.db.models.expressions import RawSQL
+from .models import Ring, RingEra, RingImage, UserRingPreference, UserRingPreferenceVersion
+from .search import matching_ids_sql
 
 # Ring admin
 class RingAdminForm(forms.ModelForm):
@@ -37,6 +39,13 @@ class RingAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     inlines = [RingEraInline, RingImageInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index (see woy.search) instead of a LIKE scan
+        matching = matching_ids_sql(search_term)
+        if matching is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=RawSQL(*matching)), False
+
 @admin.register(RingEra)
 class RingEraAdmin(admin.ModelAdmin):
     list_display = ('name', 'ring', 'start_day', 'end_day', 'color')
@@ -53,3 +62,8 @@ class UserRingPreferenceAdmin(admin.ModelAdmin):
     list_display = ('user', 'ring', 'display_order')
     list_filter = ('user',)
     search_fields = ('user__username', 'ring__name')
+
+@admin.register(UserRingPreferenceVersion)
+class UserRingPreferenceVersionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'version')
+    search_fields = ('user__username',)
@@ -0,0 +1,163 @@
+"""
+Cycle alignment: the days on which chosen eras of several rings coincide.
+
+An era is active on absolute day ``t`` when ``t % number_of_ticks`` falls in
+one of its segments in the ring's ``RingIntervals`` (see ``woy.intervals``),
+exactly as in the snapshot and timeline endpoints. A set of eras is aligned
+while all of them are active.
+
+The eras are combined one at a time into windows modulo the least common
+multiple of their periods, without stepping through days. For a window
+``[lo, hi)`` modulo ``M`` and an era segment ``[a, b)`` modulo ``P``, the
+window's copies start at ``lo + k * M``; their offsets against the segment's
+grid, ``(lo - a + k * M) % P``, run over the multiples of ``g = gcd(M, P)``.
+Only offsets within ``(-(hi - lo), b - a)`` can meet a copy of the segment, so
+only those are enumerated, and the Chinese remainder theorem gives back each
+one's ``k``. The work is proportional to the number of coincidences in the
+combined period rather than to the period's length.
+
+Once the combined period would outgrow the search horizon, the windows found so
+far are laid out over the horizon instead and the remaining eras are
+intersected with them directly, still in time order, stopping as soon as
+enough alignments are found.
+"""
+import math
+
+EPSILON = 1e-9
+MAX_COUNT = 1000
+MAX_HORIZON = 1000000
+
+
+def lcm(a, b):
+    """Least common multiple of two positive integers (``math.lcm`` needs Python 3.9)"""
+    return a // math.gcd(a, b) * b
+
+
+def era_segments(era_index, era_id):
+    """``(number_of_ticks, [(start, end), ...])`` where an era is active within one cycle"""
+    intervals = era_index.rings[era_index.eras[era_id]['ring_id']]
+    boundaries = [*intervals.boundaries, float(intervals.number_of_ticks)]
+    segments = [
+        (boundaries[i], boundaries[i + 1])
+        for i, owner in enumerate(intervals.era_ids) if owner == era_id
+    ]
+    return intervals.number_of_ticks, segments
+
+
+def combine(modulus, windows, period, segments):
+    """
+    Intersect ``windows`` (``(lo, hi)`` modulo ``modulus``) with ``segments``
+    (modulo ``period``), returning ``(lcm, windows modulo lcm)``.
+    """
+    g = math.gcd(modulus, period)
+    combined = modulus // g * period
+    # k * modulus % period == j * g  <=>  k == j * inverse (mod step)
+    step = period // g
+    inverse = pow(modulus // g, -1, step) if step > 1 else 0
+
+    result = []
+    for lo, hi in windows:
+        width = hi - lo
+        for a, b in segments:
+            offset = (lo - a) % period
+            first = math.floor((-width - offset) / g)
+            last = math.ceil((b - a - offset) / g)
+            residues = range(step) if last - first + 1 >= step else {j % step for j in range(first, last + 1)}
+            for j in residues:
+                start = lo + (j * inverse % step) * modulus
+                end = start + width
+                # The segment copy at or before start, then any later ones the window reaches
+                copy = math.floor((start - a) / period) * period
+                while a + copy < end - EPSILON:
+                    overlap_start = max(start, a + copy)
+                    overlap_end = min(end, b + copy)
+                    if overlap_end - overlap_start > EPSILON:
+                        shifted = overlap_start % combined
+                        result.append((shifted, shifted + overlap_end - overlap_start))
+                    copy += period
+    result.sort()
+    return combined, result
+
+
+def repeat_windows(modulus, windows, start, end):
+    """Yield every copy of ``windows`` (sorted, modulo ``modulus``) meeting ``[start, end)``, in order"""
+    if not windows:
+        return
+    widest = max(hi - lo for lo, hi in windows)
+    base = math.floor((start - widest) / modulus) * modulus
+    while base < end:
+        for lo, hi in windows:
+            if base + lo >= end:
+                return
+            if base + hi > start:
+                yield base + lo, base + hi
+        base += modulus
+
+
+def intersect(windows, period, segments):
+    """Yield the parts of absolute ``windows`` covered by ``segments`` modulo ``period``, in order"""
+    if not segments:
+        return
+    for start, end in windows:
+        for lo, hi in repeat_windows(period, segments, start, end):
+            overlap_start = max(start, lo)
+            overlap_end = min(end, hi)
+            if overlap_end - overlap_start > EPSILON:
+                yield overlap_start, overlap_end
+
+
+def merge_adjacent(windows):
+    """Join windows that touch, like the two halves of an era wrapping the cycle"""
+    current = None
+    for start, end in windows:
+        if current is not None and start <= current[1] + EPSILON:
+            current = (current[0], max(current[1], end))
+            continue
+        if current is not None:
+            yield current
+        current = (start, end)
+    if current is not None:
+        yield current
+
+
+def find_alignments(era_index, era_ids, start, count, horizon):
+    """
+    The first ``count`` periods from absolute day ``start`` (and before
+    ``start + horizon``) during which every era in ``era_ids`` is active.
+
+    An alignment already in progress at ``start`` is included with its real
+    start. Returns ``(period, alignments)``: ``period`` is the number of days
+    after which the whole pattern repeats, ``alignments`` a list of
+    ``(start, end)`` day pairs.
+    """
+    constraints = [era_segments(era_index, era_id) for era_id in era_ids]
+    period = 1
+    for ticks, _ in constraints:
+        period = lcm(period, ticks) if ticks > 0 else period
+    if not constraints or any(not segments for _, segments in constraints):
+        return period, []
+
+    # Sparse eras first keeps the intermediate window lists short
+    constraints.sort(key=lambda constraint: sum(b - a for a, b in constraint[1]) / constraint[0])
+    modulus, windows = constraints[0]
+    windows = sorted(windows)
+    remaining = constraints[1:]
+    while remaining and lcm(modulus, remaining[0][0]) <= horizon:
+        modulus, windows = combine(modulus, windows, *remaining.pop(0))
+        if not windows:
+            # No coincidence in a whole combined period means none ever
+            return period, []
+
+    end = start + horizon
+    aligned = repeat_windows(modulus, windows, start, end)
+    for ticks, segments in remaining:
+        aligned = intersect(aligned, ticks, segments)
+
+    alignments = []
+    for window_start, window_end in merge_adjacent(aligned):
+        if window_end <= start:
+            continue
+        if window_start >= end or len(alignments) >= count:
+            break
+        alignments.append((window_start, window_end))
+    return period, alignments
@@ -0,0 +1,21 @@
+from django.apps import AppConfig
+
+
+class WoyConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'woy'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+
+        from .db import NATIVE_HEALTH_CHECKS, check_connections, configure_sqlite
+        from .instrumentation import install_query_recorder
+
+        # Connect the cache invalidation signal handlers
+        from . import signals  # noqa: F401
+
+        connection_created.connect(configure_sqlite, dispatch_uid='woy.configure_sqlite')
+        connection_created.connect(install_query_recorder, dispatch_uid='woy.install_query_recorder')
+        if not NATIVE_HEALTH_CHECKS:
+            request_started.connect(check_connections, dispatch_uid='woy.check_connections')
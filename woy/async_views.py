@@ -0,0 +1,178 @@
+"""
+Async read endpoints for ASGI deployments.
+
+DRF viewsets are synchronous, so under an ASGI server every request to them
+holds a worker thread from start to finish. The views here serve the hot read
+paths natively instead, mounted under ``/api/async/`` with the same responses
+as their DRF counterparts:
+
+- ``rings/`` and ``rings/public/``: answered from the response cache after one
+  primary key lookup of the dataset version on a hit. On a miss the rings are
+  fetched and serialized off the event loop; the body is filed under the same
+  key as the DRF endpoint, so each path warms the cache for the other.
+- ``user/rings/``: the same, after two small queries for the user and their
+  preference version.
+- ``rings/snapshot/`` and ``user/rings/snapshot/``: read the in-memory era
+  index, which is only rebuilt (in a thread) when the dataset changes.
+
+List bodies are sent in the compressed variant negotiated from
+``Accept-Encoding``, shared with the DRF endpoints through the cache.
+
+Only the JSON and lean formats are served, and there are no conditional
+(ETag) responses; the browsable API and writes stay on the DRF endpoints.
+
+Django 3.2 has no async ORM and its ``require_GET`` turns a coroutine view
+into a sync one, so queries run through ``sync_to_async`` and the method is
+checked by ``async_require_GET``.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .cache import get_response_cache
+from .compression import encoded_response, negotiate_encoding
+from .instrumentation import timed
+from .intervals import aget_era_index
+from .models import Ring, UserRingPreference, UserRingPreferenceVersion
+from .renderers import LeanJSONRenderer
+from .serializers import LeanRingSerializer, RingSerializer
+from .views import list_cache_key, parse_day
+
+ASYNC_PREFIX = '/api/async/'
+
+
+def negotiate_format(request):
+    """'json' or 'lean' from ``?format=`` or the Accept header, or None if unsupported"""
+    requested = request.GET.get('format')
+    if requested:
+        return requested if requested in ('json', 'lean') else None
+    if LeanJSONRenderer.media_type in request.headers.get('Accept', ''):
+        return 'lean'
+    return 'json'
+
+
+def media_type(renderer_format):
+    return LeanJSONRenderer.media_type if renderer_format == 'lean' else JSONRenderer.media_type
+
+
+def render_json(data, renderer_format, status=200):
+    # DRF's renderer, so bodies match the DRF endpoints byte for byte
+    return HttpResponse(JSONRenderer().render(data), content_type=media_type(renderer_format), status=status)
+
+
+def not_found():
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+
+def async_require_GET(view):
+    """``require_GET`` that keeps a coroutine view a coroutine"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def demo_user_preferences():
+    """The first user and their preference version"""
+    # For demo purposes, use the first user
+    # In a real app, you'd use request.user
+    user = User.objects.first()
+    preference_version = (
+        UserRingPreferenceVersion.objects.filter(user=user).values_list('version', flat=True).first()
+    ) or 0
+    return user, preference_version
+
+
+async def cached_ring_list(request, queryset, key=None):
+    """Serve a ring list body from the response cache, rendering it on a miss"""
+    renderer_format = negotiate_format(request)
+    if renderer_format is None:
+        return not_found()
+
+    async def render():
+        rings = await sync_to_async(list)(queryset)
+        serializer_class = LeanRingSerializer if renderer_format == 'lean' else RingSerializer
+
+        def serialize():
+            data = serializer_class(rings, many=True, context={'request': Request(request)}).data
+            with timed('render'):
+                return JSONRenderer().render(data)
+
+        # Large catalogs take long enough to serialize to stall the event loop
+        return await sync_to_async(serialize, thread_sensitive=False)()
+
+    # Share entries with the DRF endpoint of the same path
+    path = request.get_full_path().replace(ASYNC_PREFIX, '/api/', 1)
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    key = list_cache_key(key or path, renderer_format)
+    body = await get_response_cache().aget_or_render(key, render, encoding=encoding)
+    return encoded_response(body, media_type(renderer_format), encoding)
+
+
+@async_require_GET
+async def ring_list(request):
+    """Async ``GET /api/rings/``"""
+    return await cached_ring_list(request, Ring.objects.all().order_by('index').with_eras_and_images())
+
+
+@async_require_GET
+async def public_rings(request):
+    """Async ``GET /api/rings/public/``"""
+    queryset = Ring.objects.filter(is_public=True).order_by('index').with_eras_and_images()
+    return await cached_ring_list(request, queryset)
+
+
+@async_require_GET
+async def user_ring_list(request):
+    """Async ``GET /api/user/rings/``"""
+    user, preference_version = await sync_to_async(demo_user_preferences)()
+
+    rings = (
+        Ring.objects.filter(user_preferences__user=user)
+        .annotate(display_order=F('user_preferences__display_order'))
+        .order_by('display_order', 'index')
+        .with_eras_and_images()
+    )
+    path = request.get_full_path().replace(ASYNC_PREFIX, '/api/', 1)
+    key = f'{path}:user={user.pk if user else None}:preferences={preference_version}'
+    return await cached_ring_list(request, rings, key=key)
+
+
+@async_require_GET
+async def ring_snapshot(request):
+    """Async ``GET /api/rings/snapshot/?day=N``"""
+    renderer_format = negotiate_format(request)
+    if renderer_format is None:
+        return not_found()
+    day = parse_day(Request(request))
+    if day is None:
+        return render_json({'error': 'day must be a number'}, renderer_format, status=400)
+    era_index = await aget_era_index()
+    return render_json({'day': day, 'rings': era_index.snapshot(day)}, renderer_format)
+
+
+@async_require_GET
+async def user_ring_snapshot(request):
+    """Async ``GET /api/user/rings/snapshot/?day=N``"""
+    renderer_format = negotiate_format(request)
+    if renderer_format is None:
+        return not_found()
+    # For demo purposes, use the first user
+    # In a real app, you'd use request.user
+    user = await sync_to_async(User.objects.first)()
+
+    day = parse_day(Request(request))
+    if day is None:
+        return render_json({'error': 'day must be a number'}, renderer_format, status=400)
+
+    ring_ids = UserRingPreference.objects.filter(user=user).values_list('ring_id', flat=True)
+    ring_ids = await sync_to_async(list)(ring_ids)
+    era_index = await aget_era_index()
+    return render_json({'day': day, 'rings': era_index.snapshot(day, ring_ids)}, renderer_format)
@@ -0,0 +1,353 @@
+"""
+Sprite atlases of ring images.
+
+A ring with ``use_images`` has one ``RingImage`` per tick, each naming a file
+under the Flutter project (``assets/images/moon/full_moon.svg``). Sending the
+paths alone costs the client one request per image, so ``build_ring_atlas``
+packs a ring's images, in order, into a few atlas files plus a coordinate map
+stored on ``Ring.image_atlas``:
+
+    {"source": "<digest of the inputs>",
+     "atlases": [{"file": "<hash>.svg", "width": 2040, "height": 130}, ...],
+     "frames": [{"atlas": 0, "x": 0, "y": 0, "width": 128, "height": 128}, ...]}
+
+``frames`` has one entry per image (None if its file is missing or
+unreadable). Images are scaled to fit a ``CELL_SIZE`` square, keeping their
+aspect ratio, and laid out on a grid of at most ``MAX_ATLAS_SIZE`` pixels a
+side; rings with more images than fit get several atlases. Raster images are
+packed into PNG atlases with Pillow and SVG images into SVG atlases, each
+nested as its own ``<svg>`` element with its IDs prefixed so they cannot clash.
+
+Atlas files are named by a hash of their content, so they are served as
+immutable (see ``views.ring_image_atlas``) and never overwritten. Rebuilding
+is skipped while the ring's image paths and file contents are unchanged.
+
+Configured by ``settings.WOY_ATLAS``.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from .models import Ring, RingImage
+from .signals import invalidate_ring_data
+
+logger = logging.getLogger(__name__)
+
+SVG_NAMESPACE = 'http://www.w3.org/2000/svg'
+XLINK_NAMESPACE = 'http://www.w3.org/1999/xlink'
+ElementTree.register_namespace('', SVG_NAMESPACE)
+ElementTree.register_namespace('xlink', XLINK_NAMESPACE)
+
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+# Atlas file names: a content hash and the format
+ATLAS_NAME = re.compile(r'^[0-9a-f]{20}\.(png|svg)$')
+# Bump when the packing changes, so unchanged rings are rebuilt
+ATLAS_VERSION = 1
+
+DEFAULT_CONFIG = {
+    # Directories that RingImage.image_path is relative to, searched in order
+    'SOURCE_DIRS': [],
+    'ATLAS_DIR': None,
+    'URL_PREFIX': '/api/ring-image-atlases/',
+    'CELL_SIZE': 128,
+    # Transparent pixels between cells, so scaled sampling does not bleed
+    'PADDING': 2,
+    'MAX_ATLAS_SIZE': 2048,
+}
+
+# (path, size, mtime) -> sha256 of the file, so unchanged files are not reread
+_file_digests = {}
+
+
+def get_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, 'WOY_ATLAS', {})}
+
+
+def atlas_url(name, config=None):
+    return (config or get_config())['URL_PREFIX'] + name
+
+
+def resolve_source(image_path, config):
+    """Absolute path of an image inside one of the source directories, or None"""
+    for directory in config['SOURCE_DIRS']:
+        directory = Path(directory).resolve()
+        candidate = (directory / image_path).resolve()
+        # Never follow a path out of the source directory (Path.is_relative_to
+        # needs Python 3.9)
+        try:
+            candidate.relative_to(directory)
+        except ValueError:
+            continue
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def file_digest(path):
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    digest = _file_digests.get(key)
+    if digest is None:
+        digest = _file_digests[key] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return digest
+
+
+def source_digest(sources, config):
+    """Digest of everything an atlas is built from: paths, file contents and layout settings"""
+    digest = hashlib.sha256(repr((
+        ATLAS_VERSION, config['CELL_SIZE'], config['PADDING'], config['MAX_ATLAS_SIZE'],
+    )).encode())
+    for image_path, path in sources:
+        digest.update(f'{image_path}\0{file_digest(path) if path else ""}\n'.encode())
+    return digest.hexdigest()
+
+
+def fit(width, height, cell_size):
+    """(width, height) scaled to fit a ``cell_size`` square, keeping the aspect ratio"""
+    scale = cell_size / max(width, height, 1e-9)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def svg_length(value):
+    """Leading number of an SVG length such as ``100`` or ``100px``, or None"""
+    match = re.match(r'\s*([0-9.]+)', value or '')
+    return float(match.group(1)) if match else None
+
+
+def load_svg(path):
+    """(root element, viewBox width, viewBox height) of an SVG file"""
+    root = ElementTree.parse(path).getroot()
+    if root.tag != f'{{{SVG_NAMESPACE}}}svg':
+        raise ValueError('not an SVG document')
+    view_box = root.get('viewBox')
+    if view_box:
+        width, height = (float(value) for value in view_box.replace(',', ' ').split()[2:4])
+    else:
+        width = svg_length(root.get('width')) or 100.0
+        height = svg_length(root.get('height')) or 100.0
+        root.set('viewBox', f'0 0 {width:g} {height:g}')
+    return root, width, height
+
+
+def prefix_ids(root, prefix):
+    """Rename every ID in an SVG tree, and the references to them, with ``prefix``"""
+    ids = {element.get('id') for element in root.iter() if element.get('id')}
+    if not ids:
+        return
+    reference = re.compile(r'url\(\s*#(' + '|'.join(map(re.escape, ids)) + r')\s*\)')
+    for element in root.iter():
+        for name, value in element.attrib.items():
+            if name == 'id':
+                element.set(name, prefix + value)
+            elif name.endswith('href') and value.startswith('#') and value[1:] in ids:
+                element.set(name, '#' + prefix + value[1:])
+            elif 'url(' in value:
+                element.set(name, reference.sub(lambda match: f'url(#{prefix}{match.group(1)})', value))
+        if element.tag == f'{{{SVG_NAMESPACE}}}style' and element.text:
+            element.text = reference.sub(lambda match: f'url(#{prefix}{match.group(1)})', element.text)
+
+
+def grid(count, config):
+    """(columns, cells per atlas) for ``count`` images"""
+    step = config['CELL_SIZE'] + config['PADDING']
+    across = max(1, (config['MAX_ATLAS_SIZE'] + config['PADDING']) // step)
+    return min(count, across), across * across
+
+
+def place(position, columns, per_atlas, config):
+    """(atlas number, x, y) of the cell for the image at ``position`` of its format"""
+    step = config['CELL_SIZE'] + config['PADDING']
+    cell = position % per_atlas
+    return position // per_atlas, cell % columns * step, cell // columns * step
+
+
+def atlas_size(count, columns, config):
+    """(width, height) of an atlas holding ``count`` cells"""
+    step = config['CELL_SIZE'] + config['PADDING']
+    rows = -(-count // columns)
+    return columns * step - config['PADDING'], rows * step - config['PADDING']
+
+
+def load_tile(path, cell_size):
+    """An image file decoded and scaled down to fit a ``cell_size`` square, as RGBA"""
+    with Image.open(path) as image:
+        # Lets JPEG decode at a fraction of full size
+        image.draft('RGB', (cell_size, cell_size))
+        tile = image.convert('RGBA')
+    return tile.resize(fit(tile.width, tile.height, cell_size), Image.LANCZOS)
+
+
+def pack_png(paths, config):
+    """
+    ``(atlases, frames)`` for raster image files: ``(body, width, height)`` per
+    PNG atlas and ``(atlas, x, y, width, height)`` per image.
+    """
+    columns, per_atlas = grid(len(paths), config)
+    canvases = []
+    frames = []
+    # Rings often repeat an image; each file is decoded once, one at a time
+    tiles = {}
+    for position, path in enumerate(paths):
+        number, x, y = place(position, columns, per_atlas, config)
+        if number == len(canvases):
+            count = min(per_atlas, len(paths) - position)
+            canvases.append(Image.new('RGBA', atlas_size(count, columns, config), (0, 0, 0, 0)))
+        tile = tiles.get(path)
+        if tile is None:
+            tile = tiles[path] = load_tile(path, config['CELL_SIZE'])
+        canvases[number].paste(tile, (x, y))
+        frames.append((number, x, y, tile.width, tile.height))
+
+    atlases = []
+    for canvas in canvases:
+        output = io.BytesIO()
+        canvas.save(output, format='PNG', optimize=True)
+        atlases.append((output.getvalue(), canvas.width, canvas.height))
+    return atlases, frames
+
+
+def pack_svg(images, config):
+    """``(atlases, frames)`` for ``load_svg`` results, as ``pack_png`` but SVG"""
+    columns, per_atlas = grid(len(images), config)
+    documents = []
+    frames = []
+    for position, (root, view_width, view_height) in enumerate(images):
+        number, x, y = place(position, columns, per_atlas, config)
+        if number == len(documents):
+            count = min(per_atlas, len(images) - position)
+            width, height = atlas_size(count, columns, config)
+            documents.append(ElementTree.Element(f'{{{SVG_NAMESPACE}}}svg', {
+                'width': str(width), 'height': str(height), 'viewBox': f'0 0 {width} {height}',
+            }))
+        width, height = fit(view_width, view_height, config['CELL_SIZE'])
+        prefix_ids(root, f'f{position}-')
+        root.attrib.update({'x': str(x), 'y': str(y), 'width': str(width), 'height': str(height)})
+        documents[number].append(root)
+        frames.append((number, x, y, width, height))
+    atlases = [
+        (ElementTree.tostring(document, encoding='utf-8', xml_declaration=True), int(document.get('width')), int(document.get('height')))
+        for document in documents
+    ]
+    return atlases, frames
+
+
+def write_atlas(directory, body, image_format):
+    """Store an atlas under its content hash, returning the file name"""
+    name = f'{hashlib.sha256(body).hexdigest()[:20]}.{image_format}'
+    path = directory / name
+    if not path.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as stream:
+            stream.write(body)
+        # mkstemp creates the file private; atlases may be served by another user
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    return name
+
+
+def build_atlas(image_paths, config):
+    """Coordinate map for ``image_paths`` in order, writing its atlas files"""
+    loaded = {'png': [], 'svg': []}
+    # (format, position within that format) per image, or None
+    slots = []
+    for image_path in image_paths:
+        path = resolve_source(image_path, config)
+        try:
+            if path is None:
+                raise FileNotFoundError(image_path)
+            if path.suffix.lower() == '.svg':
+                source, image_format = load_svg(path), 'svg'
+            else:
+                # Only the header is read here; pack_png decodes the files one by one
+                with Image.open(path) as image:
+                    image.verify()
+                source, image_format = path, 'png'
+        except (OSError, ValueError, UnidentifiedImageError, ElementTree.ParseError) as error:
+            logger.warning('Leaving %s out of the atlas: %s', image_path, error)
+            slots.append(None)
+            continue
+        slots.append((image_format, len(loaded[image_format])))
+        loaded[image_format].append(source)
+
+    directory = Path(config['ATLAS_DIR'])
+    atlases = []
+    # Frame per (format, position within that format)
+    packed = {}
+    for image_format, pack in (('png', pack_png), ('svg', pack_svg)):
+        if not loaded[image_format]:
+            continue
+        bodies, frames = pack(loaded[image_format], config)
+        first = len(atlases)
+        atlases.extend(
+            {'file': write_atlas(directory, body, image_format), 'width': width, 'height': height}
+            for body, width, height in bodies
+        )
+        for position, (number, x, y, width, height) in enumerate(frames):
+            packed[image_format, position] = {'atlas': first + number, 'x': x, 'y': y, 'width': width, 'height': height}
+
+    return {'atlases': atlases, 'frames': [packed[slot] if slot else None for slot in slots]}
+
+
+def build_ring_atlas(ring, force=False):
+    """
+    Bring ``ring.image_atlas`` up to date with its images, returning True if
+    it was rebuilt. Rings without images get no atlas.
+    """
+    config = get_config()
+    if not config['ATLAS_DIR']:
+        return False
+    image_paths = list(RingImage.objects.filter(ring=ring).order_by('order', 'id').values_list('image_path', flat=True))
+    if not image_paths:
+        atlas = None
+    else:
+        digest = source_digest([(image_path, resolve_source(image_path, config)) for image_path in image_paths], config)
+        if not force and ring.image_atlas and ring.image_atlas.get('source') == digest:
+            return False
+        atlas = {'source': digest, **build_atlas(image_paths, config)}
+    if atlas == ring.image_atlas:
+        return False
+
+    # An update sends no signals, so this does not schedule another build. It
+    # does not apply auto_now either: updated_at is set here so the ring's
+    # detail validators change, and the dataset version is bumped for lists
+    ring.image_atlas = atlas
+    ring.updated_at = timezone.now()
+    Ring.objects.filter(pk=ring.pk).update(image_atlas=atlas, updated_at=ring.updated_at)
+    invalidate_ring_data()
+    return True
+
+
+def schedule_ring_atlas(ring_id):
+    """Rebuild a ring's atlas once the current transaction commits"""
+    def build():
+        ring = Ring.objects.filter(pk=ring_id).first()
+        if ring is not None:
+            build_ring_atlas(ring)
+    transaction.on_commit(build)
+
+
+def atlas_frames(ring, config=None):
+    """``ring.image_atlas`` as sent to clients, with atlas URLs instead of file names"""
+    atlas = ring.image_atlas
+    if not atlas:
+        return None
+    config = config or get_config()
+    return {
+        'atlases': [
+            {'url': atlas_url(entry['file'], config), 'width': entry['width'], 'height': entry['height']}
+            for entry in atlas['atlases']
+        ],
+        'frames': atlas['frames'],
+    }
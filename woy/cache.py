@@ -0,0 +1,279 @@
+"""
+Versioned response cache for the ring API.
+
+Rendered JSON bodies are stored under ``<key>:<dataset version>``. The version
+is a single ``DatasetVersion`` row, bumped by the signal handlers in
+``woy.signals`` whenever a Ring, RingEra or RingImage is saved or deleted (and
+by the bulk loaders and commands, which send no signals), so a lookup never
+has to check whether an entry is stale: old versions are simply never asked
+for again and age out of the backend.
+
+The row is bumped inside the writing transaction. Other connections see the
+new version when they see the new rows, a rolled back write leaves it as it
+was, and every worker process and management command shares it. Reading it
+is one primary key lookup per request.
+
+Compressed variants of a body (see ``woy.compression``) are stored next to it
+under ``<key>:<encoding>:<dataset version>``, so each one is produced once per
+version.
+
+The backend is chosen by ``settings.WOY_RESPONSE_CACHE['BACKEND']``:
+
+- ``'lru'``: an in-process LRU capped at ``MAX_ENTRIES`` bodies, counting each
+  compressed variant as one. Each process renders its own bodies, and drops
+  them all once it sees a newer version.
+- ``'django'``: Django's cache framework, using the ``CACHE_ALIAS`` cache.
+  Use this when several worker processes should share rendered bodies.
+"""
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+
+from .compression import precompress
+from .models import DatasetVersion
+
+DATASET_VERSION_ID = 1
+DEFAULT_CONFIG = {
+    'BACKEND': 'lru',
+    'MAX_ENTRIES': 384,
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': None,
+}
+
+
+class LocalLRUBackend:
+    """Process-local backend holding at most ``max_entries`` bodies"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def use_version(self, version):
+        """Note the current dataset version, dropping every body once it moves on"""
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._version = version
+                    # Everything stored so far belongs to an older version
+                    self._entries.clear()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def entry_count(self):
+        return len(self._entries)
+
+    # In memory and briefly locked, so safe to call from the event loop
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value):
+        self.set(key, value)
+
+
+class DjangoCacheBackend:
+    """Backend storing bodies in a Django cache"""
+
+    def __init__(self, alias='default', timeout=None):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def use_version(self, version):
+        # Entries of older versions expire on the cache's own terms
+        pass
+
+    def get(self, key):
+        return self.cache.get(f'woy:response:{key}')
+
+    def set(self, key, value):
+        self.cache.set(f'woy:response:{key}', value, timeout=self.timeout)
+
+    def entry_count(self):
+        # The shared cache cannot be counted cheaply
+        return None
+
+    # Django caches have no async methods before 4.0
+    async def aget(self, key):
+        return await sync_to_async(self.get)(key)
+
+    async def aset(self, key, value):
+        await sync_to_async(self.set)(key, value)
+
+
+def get_dataset_version():
+    """``(version, last modified)`` of the ring dataset, shared by every process"""
+    row = DatasetVersion.objects.filter(pk=DATASET_VERSION_ID).values_list('version', 'updated_at').first()
+    # The row is created by migration 0015; an emptied table starts over
+    return row or (0, None)
+
+
+def bump_dataset_version():
+    """Move to a new dataset version as part of the current transaction"""
+    versions = DatasetVersion.objects.filter(pk=DATASET_VERSION_ID)
+    if not versions.update(version=F('version') + 1, updated_at=timezone.now()):
+        DatasetVersion.objects.get_or_create(pk=DATASET_VERSION_ID)
+    return get_dataset_version()[0]
+
+
+class ResponseCache:
+    """Version-keyed store of rendered response bodies with hit/miss counters"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        version, _ = get_dataset_version()
+        self.backend.use_version(version)
+        return version
+
+    def _lookup(self, versioned_key, render):
+        body = self.backend.get(versioned_key)
+        if body is not None:
+            with self._lock:
+                self.hits += 1
+            return body
+
+        with self._lock:
+            self.misses += 1
+        body = render()
+        self.backend.set(versioned_key, body)
+        return body
+
+    def get_or_render(self, key, render, encoding=None):
+        """
+        Return the cached body for ``key``, calling ``render()`` on a miss.
+
+        With an ``encoding`` ('gzip' or 'br') the body is returned compressed,
+        from its own entry when that variant has been cached before.
+        """
+        # Read the version before rendering: if the data changes mid-render the
+        # body is filed under the old version and never served again.
+        version = self.version
+        if encoding is None:
+            return self._lookup(f'{key}:{version}', render)
+        return self._lookup(
+            f'{key}:{encoding}:{version}',
+            lambda: precompress(self._lookup(f'{key}:{version}', render), encoding),
+        )
+
+    def get_or_stream(self, key, render, max_bytes):
+        """
+        Iterate over the cached body for ``key`` or, on a miss, over the chunks
+        of ``render()``. Streamed chunks are stored as one body once the stream
+        ends, unless they add up to more than ``max_bytes``.
+        """
+        versioned_key = f'{key}:{self.version}'
+        body = self.backend.get(versioned_key)
+        if body is not None:
+            with self._lock:
+                self.hits += 1
+            return iter((body,))
+
+        with self._lock:
+            self.misses += 1
+        return self._stream_and_store(versioned_key, render(), max_bytes)
+
+    def _stream_and_store(self, versioned_key, chunks, max_bytes):
+        stored = []
+        size = 0
+        for chunk in chunks:
+            chunk = chunk.encode() if isinstance(chunk, str) else chunk
+            if stored is not None:
+                size += len(chunk)
+                stored.append(chunk)
+                if size > max_bytes:
+                    # Too large to keep; stop holding on to what was sent
+                    stored = None
+            yield chunk
+        # Only reached if the client read the whole stream
+        if stored is not None:
+            self.backend.set(versioned_key, b''.join(stored))
+
+    async def aget_version(self):
+        return await sync_to_async(lambda: self.version)()
+
+    async def _alookup(self, versioned_key, render):
+        body = await self.backend.aget(versioned_key)
+        if body is not None:
+            with self._lock:
+                self.hits += 1
+            return body
+
+        with self._lock:
+            self.misses += 1
+        body = await render()
+        await self.backend.aset(versioned_key, body)
+        return body
+
+    async def aget_or_render(self, key, render, encoding=None):
+        """Async ``get_or_render``; ``render`` is a coroutine function"""
+        version = await self.aget_version()
+        if encoding is None:
+            return await self._alookup(f'{key}:{version}', render)
+
+        async def encode():
+            body = await self._alookup(f'{key}:{version}', render)
+            # Compressing a large catalog would stall the event loop
+            return await sync_to_async(precompress, thread_sensitive=False)(body, encoding)
+
+        return await self._alookup(f'{key}:{encoding}:{version}', encode)
+
+    def invalidate(self):
+        """Move to a new dataset version; every stored body becomes stale"""
+        return bump_dataset_version()
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'version': self.version,
+            'entries': self.backend.entry_count(),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def build_response_cache(config=None):
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    if config['BACKEND'] == 'lru':
+        backend = LocalLRUBackend(max_entries=config['MAX_ENTRIES'])
+    elif config['BACKEND'] == 'django':
+        backend = DjangoCacheBackend(alias=config['CACHE_ALIAS'], timeout=config['TIMEOUT'])
+    else:
+        raise ValueError(f"Unknown WOY_RESPONSE_CACHE backend: {config['BACKEND']!r}")
+    return ResponseCache(backend)
+
+
+def get_response_cache():
+    """Return the process-wide response cache, building it on first use"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = build_response_cache(getattr(settings, 'WOY_RESPONSE_CACHE', None))
+    return _response_cache
@@ -0,0 +1,211 @@
+"""
+gzip and brotli response compression.
+
+Two paths, both negotiated from ``Accept-Encoding``:
+
+- Cached list bodies are compressed once per dataset version, at the slower
+  but tighter ``PRECOMPRESSED_LEVELS``, and the compressed variants are stored
+  in the response cache next to the identity body (see ``woy.cache``). A hit
+  sends the stored bytes as they are.
+- ``CompressionMiddleware`` compresses every other response per request, at
+  the cheaper ``STREAMING_LEVELS``. Streaming responses are compressed chunk
+  by chunk as they are sent.
+
+Both set ``Vary: Accept-Encoding``. Formats that are compressed already, like
+PNG, are sent as they are. ``br`` is only offered when the optional
+``brotli`` package is installed.
+
+A compressed body is not byte-identical to the one its ETag was computed for
+(RFC 7232 section 2.1), so the middleware weakens the ETag of every response
+negotiated with an encoding, 304s included: a revalidation then gets back the
+tag it sent, whichever path produced the body.
+
+Configured by ``settings.WOY_COMPRESSION``.
+"""
+import zlib
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .instrumentation import timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_CONFIG = {
+    # In order of preference when the client accepts several equally
+    'ENCODINGS': ['br', 'gzip'],
+    # Smaller bodies are not worth compressing per request
+    'MIN_LENGTH': 200,
+    'PRECOMPRESSED_LEVELS': {'br': 9, 'gzip': 9},
+    'STREAMING_LEVELS': {'br': 4, 'gzip': 6},
+}
+# Content types whose bodies are compressed already
+INCOMPRESSIBLE_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp')
+
+
+def get_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, 'WOY_COMPRESSION', {})}
+
+
+def available_encodings(config=None):
+    encodings = (config or get_config())['ENCODINGS']
+    return [encoding for encoding in encodings if encoding != 'br' or brotli is not None]
+
+
+def parse_accept_encoding(header):
+    """Map each coding in an ``Accept-Encoding`` header to its quality"""
+    qualities = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def negotiate_encoding(header, encodings=None):
+    """The encoding to send for an ``Accept-Encoding`` header, or None for identity"""
+    if not header:
+        return None
+    qualities = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in encodings if encodings is not None else available_encodings():
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        # Ties go to the earlier, preferred encoding
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class StreamCompressor:
+    """Incremental gzip or brotli compressor"""
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=level)
+        elif encoding == 'gzip':
+            # wbits=31 writes a gzip header and trailer around the deflate stream
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        else:
+            raise ValueError(f'Unsupported encoding: {encoding!r}')
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress(body, encoding, level):
+    compressor = StreamCompressor(encoding, level)
+    return compressor.compress(body) + compressor.finish()
+
+
+def precompress(body, encoding):
+    """Compress a cacheable body at the configured ``PRECOMPRESSED_LEVELS``"""
+    with timed('compress'):
+        return compress(body, encoding, get_config()['PRECOMPRESSED_LEVELS'][encoding])
+
+
+def compress_stream(chunks, encoding, level):
+    compressor = StreamCompressor(encoding, level)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, encoding, level):
+    compressor = StreamCompressor(encoding, level)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def weaken_etag(response):
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = f'W/{etag}'
+
+
+def encoded_response(body, content_type, encoding):
+    """Response for a body already compressed with ``encoding`` (None for identity)"""
+    response = HttpResponse(body, content_type=content_type)
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress responses that are not already encoded, by ``Accept-Encoding``"""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        config = get_config()
+        self.encodings = available_encodings(config)
+        self.min_length = config['MIN_LENGTH']
+        self.levels = config['STREAMING_LEVELS']
+
+    def process_response(self, request, response):
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'), self.encodings)
+        # Decided by negotiation alone, so the 304 for a representation carries
+        # the same tag as its 200, compressed or not; weak tags still match
+        # If-None-Match
+        if encoding is not None:
+            weaken_etag(response)
+
+        # Precompressed bodies from the response cache are sent as they are
+        if response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').startswith(INCOMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+
+        if encoding is None:
+            return response
+        level = self.levels[encoding]
+
+        if response.streaming:
+            if getattr(response, 'is_async', False):
+                response.streaming_content = acompress_stream(response.streaming_content, encoding, level)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding, level)
+            # The compressed length is not known until the stream ends
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        else:
+            with timed('compress'):
+                body = compress(response.content, encoding, level)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response['Content-Length'] = str(len(body))
+
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,101 @@
+"""
+Conditional GET (ETag / Last-Modified) support for the ring API.
+
+List validators are derived from the shared dataset version (see
+``woy.cache``), which every ring, era and image write bumps: one primary key
+lookup, however large the catalog. Its timestamp is the Last-Modified.
+
+Detail validators are derived from the state of the one row: the row count
+plus the newest ``updated_at`` of the ring and its eras and images, in indexed
+aggregate queries. Counting rows means a deletion changes the ETag even though
+it leaves no timestamp behind; Last-Modified cannot see deletions, so clients
+should prefer ``If-None-Match``.
+
+A matching ``If-None-Match`` is answered with ``304 Not Modified`` by Django's
+``condition`` decorator before the view runs any serialization.
+
+Compressed and identity bodies are different representations, so the ETag
+also covers the ``Content-Encoding`` negotiated from ``Accept-Encoding``; the
+compression middleware sends it weak when an encoding was negotiated.
+"""
+import hashlib
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .cache import get_dataset_version
+from .compression import negotiate_encoding
+from .models import Ring, RingEra, RingImage, UserRingPreferenceVersion
+
+
+def table_state(queryset):
+    """Return (row count, newest updated_at) for a queryset in one query"""
+    state = queryset.aggregate(count=Count('id'), last_modified=Max('updated_at'))
+    return state['count'], state['last_modified']
+
+
+def latest(*timestamps):
+    return max((timestamp for timestamp in timestamps if timestamp is not None), default=None)
+
+
+def ring_dataset_state(request, *args, **kwargs):
+    """State of every table the nested ring payload is built from"""
+    version, last_modified = get_dataset_version()
+    return [version], last_modified
+
+
+def ring_state(request, pk=None, *args, **kwargs):
+    """State of a single ring and its eras and images"""
+    states = [
+        table_state(Ring.objects.filter(pk=pk)),
+        table_state(RingEra.objects.filter(ring_id=pk)),
+        table_state(RingImage.objects.filter(ring_id=pk)),
+    ]
+    return states, latest(*(last_modified for _, last_modified in states))
+
+
+def user_ring_state(request, *args, **kwargs):
+    """State of the ring tables plus the current user's preference version"""
+    # For demo purposes, use the first user (matches UserRingViewSet)
+    user = User.objects.first()
+    states, last_modified = ring_dataset_state(request)
+    preference_version = UserRingPreferenceVersion.objects.filter(user=user).values_list('version', flat=True).first()
+    return [user.pk if user else None, preference_version, states], last_modified
+
+
+def model_state(model):
+    """Build state functions for a ring data model's list and detail routes"""
+    def state(request, pk=None, *args, **kwargs):
+        if pk is None:
+            return ring_dataset_state(request)
+        count, last_modified = table_state(model.objects.filter(pk=pk))
+        return [count, last_modified], last_modified
+    return state
+
+
+def conditional(state_func):
+    """
+    Method decorator adding strong ETag and Last-Modified headers to a viewset
+    action, answering matching conditional requests with 304.
+
+    ``state_func(request, *args, **kwargs)`` returns ``(parts, last_modified)``.
+    The ETag hashes ``parts`` together with the full path, negotiated format and
+    negotiated encoding, so different representations never share a tag.
+    """
+    def validators(request, *args, **kwargs):
+        # condition() asks for the ETag and Last-Modified separately; compute once
+        if not hasattr(request, '_ring_validators'):
+            parts, last_modified = state_func(request, *args, **kwargs)
+            renderer = getattr(request, 'accepted_renderer', None)
+            encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+            key = repr([request.get_full_path(), getattr(renderer, 'format', None), encoding, parts])
+            etag = hashlib.sha1(key.encode()).hexdigest()
+            request._ring_validators = (etag, last_modified)
+        return request._ring_validators
+
+    return method_decorator(condition(
+        etag_func=lambda request, *args, **kwargs: validators(request, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: validators(request, *args, **kwargs)[1],
+    ))
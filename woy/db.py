@@ -0,0 +1,53 @@
+"""
+Per-connection database setup.
+
+Django opens SQLite with the library defaults: a rollback journal, which
+blocks readers while a writer commits, and full fsyncs. ``configure_sqlite``
+applies ``settings.WOY_SQLITE_PRAGMAS`` to every new SQLite connection.
+
+Django 4.1 added ``CONN_HEALTH_CHECKS``; older versions ignore the setting and
+hand a persistent connection that the database server dropped to the next
+request, which fails. ``check_connections`` does the same check on them.
+"""
+import django
+from django.conf import settings
+from django.db import connections
+
+SQLITE_PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """``connection_created`` receiver applying the configured SQLite pragmas"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'WOY_SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name in SQLITE_PRAGMAS:
+            value = pragmas.get(name)
+            if value is None:
+                continue
+            # Pragmas take no bound parameters; only known names and
+            # integer or single-word values are sent
+            value = str(value)
+            if not value.isalnum():
+                raise ValueError(f'Invalid value {value!r} for SQLite pragma {name}')
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# Django 4.1+ checks connections with CONN_HEALTH_CHECKS itself
+NATIVE_HEALTH_CHECKS = django.VERSION >= (4, 1)
+
+
+def check_connections(**kwargs):
+    """
+    ``request_started`` receiver closing reused connections that no longer
+    answer, for databases with ``CONN_HEALTH_CHECKS``.
+
+    The request then opens a new connection instead of failing on the old one.
+    """
+    for connection in connections.all():
+        if connection.connection is None or not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        # is_usable() sends "SELECT 1" on PostgreSQL
+        if not connection.is_usable():
+            connection.close()
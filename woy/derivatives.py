@@ -0,0 +1,248 @@
+"""
+Width-bucketed derivatives of ring images.
+
+Every raster ``RingImage`` source is scaled down to each width in
+``WIDTHS`` below its own (plus its own width, capped at the largest bucket)
+and saved in each of ``FORMATS``. A client picks the bucket for the pixels an
+image takes on screen, so a phone drawing a thin ring does not download the
+full-size file.
+
+Derivatives are content-addressed: they live under
+``<DIR>/<digest[:2]>/<digest>/<width>.<format>``, where ``digest`` is the
+SHA-256 of the source file, so an image used by many rings (or under several
+paths) is converted and stored once. SVG sources scale without loss and are
+stored once as ``original.svg`` instead. A source's ``width`` and ``height``
+are kept on its ``RingImage`` with the digest, so URLs are worked out without
+touching the disk.
+
+``generate_derivatives`` converts the sources that are missing derivatives in
+a process pool. The ``build_derivatives`` command runs it for every image and
+a post-save hook runs it for each saved image.
+
+Configured by ``settings.WOY_DERIVATIVES``. URLs are served as immutable, so
+clear ``DIR`` after changing ``WIDTHS``, ``FORMATS`` or ``QUALITY``.
+"""
+import bisect
+import logging
+import math
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+
+from .atlas import file_digest, load_svg, resolve_source
+from .models import RingImage
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'webp': 'image/webp', 'png': 'image/png', 'svg': 'image/svg+xml'}
+# Derivative file names within a digest's directory
+DERIVATIVE_NAME = re.compile(r'^(?:[0-9]+\.(?:webp|png)|original\.svg)$')
+DIGEST = re.compile(r'^[0-9a-f]{64}$')
+VECTOR_NAME = 'original.svg'
+
+DEFAULT_CONFIG = {
+    # Directories that RingImage.image_path is relative to, searched in order
+    'SOURCE_DIRS': [],
+    'DIR': None,
+    'URL_PREFIX': '/api/ring-image-derivatives/',
+    'WIDTHS': [32, 64, 128, 256, 512, 1024],
+    # In order of preference, for clients that accept them all
+    'FORMATS': ['webp', 'png'],
+    'QUALITY': 80,
+}
+
+
+def get_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, 'WOY_DERIVATIVES', {})}
+
+
+def bucket_widths(source_width, widths):
+    """Derivative widths of a source: every bucket below its width, then its width capped at the largest"""
+    return sorted({min(width, source_width) for width in widths})
+
+
+def pick_width(available, wanted):
+    """The smallest available width of at least ``wanted`` pixels, else the largest"""
+    position = bisect.bisect_left(available, wanted)
+    return available[min(position, len(available) - 1)]
+
+
+def is_vector(image_path):
+    return image_path.lower().endswith('.svg')
+
+
+def derivative_dir(directory, digest):
+    return Path(directory) / digest[:2] / digest
+
+
+def derivative_url(digest, name, config=None):
+    return f"{(config or get_config())['URL_PREFIX']}{digest}/{name}"
+
+
+def image_variant(image, wanted, image_format, config=None):
+    """
+    ``(url, width, height)`` of the derivative of ``image`` (a RingImage with
+    derivatives) best suited to ``wanted`` pixels wide, or None if it has none.
+    """
+    if not image.content_hash:
+        return None
+    config = config or get_config()
+    if is_vector(image.image_path):
+        return derivative_url(image.content_hash, VECTOR_NAME, config), image.width, image.height
+    width = pick_width(bucket_widths(image.width, config['WIDTHS']), wanted)
+    height = max(1, round(image.height * width / image.width))
+    return derivative_url(image.content_hash, f'{width}.{image_format}', config), width, height
+
+
+def write_file(path, write):
+    """Create ``path`` by calling ``write(stream)`` on a temporary file and renaming it"""
+    handle, temporary = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as stream:
+            write(stream)
+        # mkstemp creates the file private; derivatives may be served by another user
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def convert(job):
+    """
+    Process pool entry point: write the missing derivatives of one source.
+
+    ``job`` is ``(source path, digest, config)``. Returns ``(digest, width,
+    height)`` of the source.
+    """
+    path, digest, config = job
+    directory = derivative_dir(config['DIR'], digest)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    if is_vector(path.name):
+        _, width, height = load_svg(path)
+        target = directory / VECTOR_NAME
+        if not target.exists():
+            write_file(target, lambda stream: stream.write(path.read_bytes()))
+        return digest, math.ceil(width), math.ceil(height)
+
+    with Image.open(path) as source:
+        width, height = source.size
+        widths = bucket_widths(width, config['WIDTHS'])
+        missing = [
+            (bucket, image_format) for bucket in widths for image_format in config['FORMATS']
+            if not (directory / f'{bucket}.{image_format}').exists()
+        ]
+        if not missing:
+            return digest, width, height
+        # Lets JPEG decode at a fraction of full size when every bucket is smaller
+        source.draft('RGB', (widths[-1], max(1, round(height * widths[-1] / width))))
+        image = source.convert('RGBA')
+
+    # Largest first, each scaled from the one before: cheaper than from the source every time
+    for bucket in reversed(widths):
+        size = (bucket, max(1, round(height * bucket / width)))
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+        for image_format in config['FORMATS']:
+            if (bucket, image_format) in missing:
+                write_file(
+                    directory / f'{bucket}.{image_format}',
+                    lambda stream: encode(image, image_format, config, stream),
+                )
+    return digest, width, height
+
+
+def encode(image, image_format, config, stream):
+    if image_format == 'webp':
+        image.save(stream, format='WEBP', quality=config['QUALITY'], method=4)
+    else:
+        image.save(stream, format='PNG', optimize=True)
+
+
+def generate_derivatives(images, workers=1):
+    """
+    Make sure every RingImage in ``images`` has its derivatives and stored
+    dimensions, converting each distinct source file once, in ``workers``
+    processes. Returns ``(sources converted, images updated)``.
+    """
+    config = get_config()
+    if not config['DIR']:
+        return 0, 0
+
+    # Images by the source file they resolve to
+    by_path = {}
+    for image in images:
+        path = resolve_source(image.image_path, config)
+        if path is None:
+            logger.warning('No source file for ring image %s (%s)', image.id, image.image_path)
+            continue
+        by_path.setdefault(path, []).append(image)
+
+    # One job per distinct file content, however many paths and images share it
+    digests = {}
+    jobs = {}
+    for path in by_path:
+        try:
+            digests[path] = file_digest(path)
+        except OSError as error:
+            logger.warning('Cannot read %s: %s', path, error)
+            continue
+        jobs.setdefault(digests[path], (path, digests[path], config))
+
+    # Sources whose derivatives all exist already are only measured
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(convert_or_log, jobs.values(), chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        outcomes = [convert_or_log(job) for job in jobs.values()]
+    results = {outcome[0]: outcome for outcome in outcomes if outcome}
+
+    changed = []
+    for path, path_images in by_path.items():
+        outcome = results.get(digests.get(path))
+        if outcome is None:
+            continue
+        digest, width, height = outcome
+        for image in path_images:
+            if (image.content_hash, image.width, image.height) != (digest, width, height):
+                image.content_hash, image.width, image.height = digest, width, height
+                changed.append(image)
+    # Not a save, so no signal schedules this again
+    RingImage.objects.bulk_update(changed, ['content_hash', 'width', 'height'], batch_size=500)
+    return len(results), len(changed)
+
+
+def convert_or_log(job):
+    try:
+        return convert(job)
+    except (OSError, ValueError, UnidentifiedImageError) as error:
+        logger.warning('Cannot convert %s: %s', job[0], error)
+        return None
+
+
+def schedule_image_derivatives(image_id):
+    """Generate a saved image's derivatives once the current transaction commits"""
+    def generate():
+        image = RingImage.objects.filter(pk=image_id).first()
+        if image is not None:
+            generate_derivatives([image])
+    transaction.on_commit(generate)
+
+
+def prune_derivatives(directory, used):
+    """Delete derivative directories whose digest is not in ``used``, returning how many"""
+    pruned = 0
+    for shard in Path(directory).iterdir() if Path(directory).is_dir() else ():
+        for entry in shard.iterdir() if shard.is_dir() else ():
+            if DIGEST.match(entry.name) and entry.name not in used:
+                shutil.rmtree(entry)
+                pruned += 1
+    return pruned
@@ -0,0 +1,147 @@
+"""
+Bulk writes of a ring's whole era set.
+
+``write_eras`` replaces (or patches) every era of a ring in one transaction:
+the resulting set is checked by ``era_layout_errors`` before anything is
+written, then applied with at most one delete, one bulk update and one bulk
+insert, however many eras the ring has.
+
+The layout check sorts the eras by start once and compares each start with
+the furthest end reached so far, as NumPy array operations, so overlaps,
+gaps and eras outside ``[0, number_of_ticks]`` are all found in one pass.
+Unlike declarative ring definitions (see ``RingDefinitionSerializer``), eras
+written here may not wrap past the end of the cycle.
+"""
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .loading import ERA_FIELDS
+from .models import RingEra, refresh_rounded_fields
+from .signals import bulk_ring_writes, invalidate_ring_data
+
+REQUIRED_FIELDS = ('name', 'start_day', 'end_day')
+
+
+def era_layout_errors(eras, number_of_ticks, allow_gaps=False):
+    """
+    Messages for every problem with the layout of ``eras`` (dicts with
+    ``name``, ``start_day`` and ``end_day``) within one cycle, or an empty
+    list if they tile ``[0, number_of_ticks]`` without overlapping.
+    """
+    names = [era['name'] for era in eras]
+    starts = np.array([float(era['start_day']) for era in eras], dtype=np.float64)
+    ends = np.array([float(era['end_day']) for era in eras], dtype=np.float64)
+    errors = []
+
+    outside = np.flatnonzero((starts < 0) | (ends > number_of_ticks) | (ends <= starts))
+    errors.extend(
+        f'Era {names[i]!r} must satisfy 0 <= start_day < end_day <= {number_of_ticks}'
+        for i in outside
+    )
+    if not len(eras):
+        return errors
+
+    order = np.lexsort((ends, starts))
+    starts, ends = starts[order], ends[order]
+    # reach[k]: furthest end among the first k + 1 eras; owner[k]: the era reaching it
+    reach = np.maximum.accumulate(ends)
+    positions = np.arange(len(order))
+    owner = np.maximum.accumulate(np.where(ends == reach, positions, 0))
+
+    overlaps = np.flatnonzero(starts[1:] < reach[:-1])
+    errors.extend(f'Era {names[order[k + 1]]!r} overlaps {names[order[owner[k]]]!r}' for k in overlaps)
+    if allow_gaps:
+        return errors
+
+    if starts[0] > 0:
+        errors.append(f'Gap from day 0 to {names[order[0]]!r}')
+    gaps = np.flatnonzero(starts[1:] > reach[:-1])
+    errors.extend(f'Gap between {names[order[owner[k]]]!r} and {names[order[k + 1]]!r}' for k in gaps)
+    if reach[-1] < number_of_ticks:
+        errors.append(f'Gap from {names[order[owner[-1]]]!r} to day {number_of_ticks}')
+    return errors
+
+
+def write_eras(ring, items, partial=False, allow_gaps=False):
+    """
+    Write a ring's era set from validated ``BulkEraSerializer`` data.
+
+    Items with an ``id`` update that era of the ring and items without one are
+    created. Without ``partial`` the items are the complete set and every other
+    era of the ring is deleted; with it, the other eras are kept and items may
+    leave fields out. Raises ``ValidationError`` before writing anything if an
+    item is invalid or the resulting set fails ``era_layout_errors``.
+    """
+    # The delete's per-row signals are muted: ring data is invalidated, and
+    # the search index refreshed, once for the whole write
+    with transaction.atomic(), bulk_ring_writes():
+        existing = {era.id: era for era in RingEra.objects.select_for_update().filter(ring=ring)}
+        now = timezone.now()
+        kept = dict(existing) if partial else {}
+        to_create = []
+        to_update = []
+        seen_ids = set()
+        errors = []
+
+        for position, item in enumerate(items):
+            era_id = item.get('id')
+            if era_id is None:
+                missing = [field for field in REQUIRED_FIELDS if field not in item]
+                if missing:
+                    errors.append(f"New era at position {position} is missing {', '.join(missing)}")
+                    continue
+                to_create.append(RingEra(ring=ring, **item))
+                continue
+
+            era = existing.get(era_id)
+            if era is None:
+                errors.append(f'Era {era_id} does not belong to ring {ring.id}')
+                continue
+            if era_id in seen_ids:
+                errors.append(f'Era {era_id} appears more than once')
+                continue
+            seen_ids.add(era_id)
+            kept[era_id] = era
+            fields = [field for field in ('name',) + ERA_FIELDS if field in item and getattr(era, field) != item[field]]
+            if fields:
+                for field in fields:
+                    setattr(era, field, item[field])
+                era.updated_at = now
+                to_update.append(era)
+        if errors:
+            raise ValidationError({'eras': errors})
+
+        eras = [*kept.values(), *to_create]
+        # Eras are matched by name when ring definitions are loaded
+        errors = [
+            f'Duplicate era name {name!r}'
+            for name, count in Counter(era.name for era in eras).items() if count > 1
+        ]
+        errors.extend(era_layout_errors(
+            [{'name': era.name, 'start_day': era.start_day, 'end_day': era.end_day} for era in eras],
+            ring.number_of_ticks,
+            allow_gaps=allow_gaps,
+        ))
+        if errors:
+            raise ValidationError({'eras': errors})
+
+        deleted = [era_id for era_id in existing if era_id not in kept]
+        if deleted:
+            RingEra.objects.filter(id__in=deleted).delete()
+        if to_update:
+            for era in to_update:
+                refresh_rounded_fields(era)
+            RingEra.objects.bulk_update(
+                to_update, ['name', *ERA_FIELDS, 'start_day_float', 'end_day_float', 'updated_at']
+            )
+        RingEra.objects.bulk_create(to_create)
+
+        if deleted or to_update or to_create:
+            # Bulk writes send no signals
+            invalidate_ring_data()
+
+    return list(RingEra.objects.filter(ring=ring).order_by('start_day', 'id'))
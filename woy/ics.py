@@ -0,0 +1,136 @@
+"""
+iCalendar (RFC 5545) export of era occurrences.
+
+Day 0 of every ring falls on the anchor date, as "today" is day 0 on the
+wheel, and each ring repeats every ``number_of_ticks`` days. Every occurrence
+of an era between the anchor and the end date becomes one VEVENT, including one
+already under way on the anchor date. Events are all-day when both boundaries
+fall on whole days and timed in UTC otherwise.
+
+``iter_calendar`` yields the feed in chunks of ``CHUNK_EVENTS`` events while
+reading the eras through a streamed query, so memory stays flat however many
+rings and years are exported.
+"""
+import math
+from datetime import datetime, time, timedelta, timezone
+
+from .models import RingEra
+
+CHUNK_EVENTS = 200
+MAX_YEARS = 20
+# Feeds larger than this are streamed but not kept in the response cache
+MAX_CACHED_BYTES = 16 * 1024 * 1024
+PRODUCT_ID = '-//woy//Wheel of the Year//EN'
+ERA_COLUMNS = ('id', 'ring__name', 'ring__number_of_ticks', 'name', 'description', 'start_day', 'end_day', 'updated_at')
+
+
+def add_years(day, years):
+    """``day`` moved ``years`` years on, with 29 February becoming 28 February"""
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:
+        return day.replace(year=day.year + years, day=28)
+
+
+def escape_text(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    """Fold a content line into CRLF-terminated lines of at most 75 octets"""
+    if len(line) <= 75 and line.isascii():
+        return line + '\r\n'
+    parts = []
+    current = ''
+    size = 0
+    for char in line:
+        width = len(char.encode())
+        # Continuation lines start with a space, which counts towards the limit
+        if size + width > 75:
+            parts.append(current)
+            current = ' '
+            size = 1
+        current += char
+        size += width
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def format_moment(anchor, day, all_day):
+    """(property parameters, value) for a day offset from the anchor date"""
+    if all_day:
+        return ';VALUE=DATE', (anchor + timedelta(days=int(day))).strftime('%Y%m%d')
+    moment = datetime.combine(anchor, time(), tzinfo=timezone.utc) + timedelta(days=day)
+    return '', moment.strftime('%Y%m%dT%H%M%SZ')
+
+
+def format_event(anchor, era, cycle, start, end):
+    era_id, ring_name, _, name, description, _, _, updated_at = era
+    # DTSTART and DTEND must have the same value type
+    all_day = start.is_integer() and end.is_integer()
+    start_parameters, start_value = format_moment(anchor, start, all_day)
+    end_parameters, end_value = format_moment(anchor, end, all_day)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:era-{era_id}-{anchor:%Y%m%d}-{cycle}@woy',
+        f'DTSTAMP:{updated_at.astimezone(timezone.utc):%Y%m%dT%H%M%SZ}',
+        f'DTSTART{start_parameters}:{start_value}',
+        f'DTEND{end_parameters}:{end_value}',
+        f'SUMMARY:{escape_text(name)} ({escape_text(ring_name)})',
+        f'CATEGORIES:{escape_text(ring_name)}',
+    ]
+    if description:
+        lines.append(f'DESCRIPTION:{escape_text(description)}')
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def iter_occurrences(era, days):
+    """Yield ``(cycle, start, end)`` day offsets of an era overlapping ``[0, days)``"""
+    _, _, number_of_ticks, _, _, start_day, end_day, _ = era
+    start_day = float(start_day)
+    end_day = float(end_day)
+    if number_of_ticks <= 0 or end_day <= start_day:
+        return
+    # The first cycle still running on day 0
+    cycle = math.floor(-end_day / number_of_ticks) + 1
+    while cycle * number_of_ticks + start_day < days:
+        offset = cycle * number_of_ticks
+        yield cycle, offset + start_day, offset + end_day
+        cycle += 1
+
+
+def calendar_eras(user=None):
+    """Era rows for a user's rings in display order, or for every ring if ``user`` is None"""
+    if user is None:
+        eras = RingEra.objects.order_by('ring__index', 'start_day', 'id')
+    else:
+        eras = RingEra.objects.filter(ring__user_preferences__user=user).order_by(
+            'ring__user_preferences__display_order', 'ring__index', 'start_day', 'id'
+        )
+    return eras.values_list(*ERA_COLUMNS)
+
+
+def iter_calendar(eras, anchor, end, name='Wheel of the Year'):
+    """
+    Yield an iCalendar feed of every occurrence of ``eras`` (``calendar_eras``
+    rows) from the ``anchor`` date up to, but not including, ``end``.
+    """
+    days = (end - anchor).days
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODUCT_ID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ))
+    chunk = []
+    for era in eras.iterator(chunk_size=1000):
+        for cycle, start, finish in iter_occurrences(era, days):
+            chunk.append(format_event(anchor, era, cycle, start, finish))
+            if len(chunk) >= CHUNK_EVENTS:
+                yield ''.join(chunk)
+                chunk = []
+    chunk.append('END:VCALENDAR\r\n')
+    yield ''.join(chunk)
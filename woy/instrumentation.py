@@ -0,0 +1,205 @@
+"""
+Per-request performance instrumentation.
+
+``ServerTimingMiddleware`` measures each request's SQL (query count and time,
+via a database execute wrapper installed on every connection), serializer
+``.data`` time and response render time. It reports them in a
+``Server-Timing`` header, which browser developer tools display, and as one
+JSON log line per request on the ``woy.performance`` logger.
+
+Outside a request the wrapper only looks up a context variable, so the
+instrumentation is cheap enough to leave on.
+
+Sampling is opt-in: with ``SAMPLE_RATE`` above zero, that fraction of the
+requests handled by ``SAMPLED_VIEWS`` also keep their slowest queries, which
+are then run through ``EXPLAIN`` and logged on ``woy.performance.explain``.
+
+Configured by ``settings.WOY_PERFORMANCE``.
+"""
+import heapq
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('woy.performance')
+explain_logger = logging.getLogger('woy.performance.explain')
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.0,
+    'SLOW_QUERY_COUNT': 3,
+    'SAMPLED_VIEWS': [
+        'woy.views.RingViewSet',
+        'woy.views.RingEraViewSet',
+        'woy.views.UserRingViewSet',
+    ],
+}
+
+_current_timings = ContextVar('woy_request_timings', default=None)
+
+
+def get_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, 'WOY_PERFORMANCE', {})}
+
+
+class RequestTimings:
+    """Accumulated timings (in seconds) for one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.phases = {}
+        # (duration, sql, params, alias) for sampled requests, else None
+        self.slow_queries = None
+        self.slow_query_count = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_query(self, seconds, sql, params, alias):
+        self.queries += 1
+        self.sql += seconds
+        if self.slow_queries is not None:
+            # Keep only the slowest few; the counter breaks ties between equal durations
+            entry = (seconds, self.queries, sql, params, alias)
+            if len(self.slow_queries) < self.slow_query_count:
+                heapq.heappush(self.slow_queries, entry)
+            else:
+                heapq.heappushpop(self.slow_queries, entry)
+
+    def server_timing(self, total):
+        entries = [f'db;dur={self.sql * 1000:.1f};desc="{self.queries} queries"']
+        entries.extend(f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in self.phases.items())
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to ``phase`` of the current request, if any"""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting and timing queries for the current request"""
+    timings = _current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(time.perf_counter() - started, sql, params, context['connection'].alias)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver adding ``record_query`` to new connections"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def explain_slow_queries(timings):
+    """Log the sampled slowest queries of a request with their query plans"""
+    for seconds, _, sql, params, alias in sorted(timings.slow_queries, reverse=True):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            plan = None
+        else:
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+        explain_logger.info(json.dumps({'duration_ms': round(seconds * 1000, 2), 'sql': sql, 'plan': plan}))
+
+
+class ServerTimingMiddleware:
+    """Add a ``Server-Timing`` header and a log line with each request's timings"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = get_config()
+        self.enabled = config['ENABLED']
+        self.sample_rate = config['SAMPLE_RATE']
+        self.slow_query_count = config['SLOW_QUERY_COUNT']
+        self.sampled_views = set(config['SAMPLED_VIEWS'])
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        self.report(request, response, timings, time.perf_counter() - started)
+        if timings.slow_queries:
+            explain_slow_queries(timings)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        self.report(request, response, timings, time.perf_counter() - started)
+        if timings.slow_queries:
+            await sync_to_async(explain_slow_queries)(timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current_timings.get()
+        if timings is None or not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        # DRF viewset views carry their class
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is not None and f'{view_class.__module__}.{view_class.__qualname__}' in self.sampled_views:
+            timings.slow_queries = []
+            timings.slow_query_count = self.slow_query_count
+        return None
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that too
+        timings = _current_timings.get()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda response: timings.add('render', time.perf_counter() - started))
+        return response
+
+    def report(self, request, response, timings, total):
+        response['Server-Timing'] = timings.server_timing(total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'queries': timings.queries,
+            'sql_ms': round(timings.sql * 1000, 2),
+            **{f'{phase}_ms': round(seconds * 1000, 2) for phase, seconds in timings.phases.items()},
+        }))
@@ -0,0 +1,171 @@
+"""
+In-memory interval index answering "which era is active on day N" per ring.
+
+Each ring's eras are flattened into a sorted array of boundaries within one
+cycle ``[0, number_of_ticks)`` and a parallel array holding the era active from
+each boundary up to the next, so a lookup is one ``day % number_of_ticks`` and
+one binary search. Eras that run past ``number_of_ticks`` (or whose end lies
+before their start) wrap around to the beginning of the cycle. Where eras
+overlap, the one that started most recently wins.
+
+The index is cached per process and rebuilt only when the dataset version from
+``woy.cache`` moves, i.e. after a Ring, RingEra or RingImage change.
+"""
+import heapq
+import threading
+from bisect import bisect_right
+
+from asgiref.sync import sync_to_async
+
+from .cache import get_response_cache
+from .models import Ring, RingEra
+
+
+class RingIntervals:
+    """Sorted era boundaries for one ring"""
+
+    __slots__ = ('ring_id', 'number_of_ticks', 'boundaries', 'era_ids')
+
+    def __init__(self, ring_id, number_of_ticks, eras):
+        """``eras`` is an iterable of ``(era_id, start_day, end_day)`` floats"""
+        self.ring_id = ring_id
+        self.number_of_ticks = number_of_ticks
+        self.boundaries = []
+        self.era_ids = []
+        if number_of_ticks > 0:
+            self._build(eras)
+
+    def _segments(self, eras):
+        # Yield (start, end, priority, era_id) pieces lying inside [0, ticks)
+        ticks = float(self.number_of_ticks)
+        for era_id, start_day, end_day in eras:
+            length = end_day - start_day
+            if length <= 0:
+                # An end before the start means the era wraps the cycle
+                length = length % ticks
+            if length == 0:
+                continue
+            if length >= ticks:
+                yield 0.0, ticks, start_day - ticks, era_id
+                continue
+            start = start_day % ticks
+            end = start + length
+            if end <= ticks:
+                yield start, end, start, era_id
+            else:
+                yield start, ticks, start, era_id
+                # The wrapped tail began in the previous cycle
+                yield 0.0, end - ticks, start - ticks, era_id
+
+    def _build(self, eras):
+        ticks = float(self.number_of_ticks)
+        segments = sorted(self._segments(eras))
+        points = sorted({0.0, ticks}.union(*((start, end) for start, end, _, _ in segments)))
+
+        # Sweep the elementary intervals, keeping the active segments in a heap
+        # ordered by most recent start; expired segments are dropped lazily.
+        active = []
+        next_segment = 0
+        for point in points[:-1]:
+            while next_segment < len(segments) and segments[next_segment][0] <= point:
+                start, end, priority, era_id = segments[next_segment]
+                heapq.heappush(active, (-priority, era_id, end))
+                next_segment += 1
+            while active and active[0][2] <= point:
+                heapq.heappop(active)
+            era_id = active[0][1] if active else None
+            if self.era_ids and self.era_ids[-1] == era_id:
+                continue
+            self.boundaries.append(point)
+            self.era_ids.append(era_id)
+
+    def position(self, day):
+        """Position of an absolute day within this ring's cycle"""
+        if self.number_of_ticks <= 0:
+            return day
+        return day % self.number_of_ticks
+
+    def era_at(self, day):
+        """ID of the era active on ``day``, or None if it falls in a gap"""
+        if not self.boundaries:
+            return None
+        i = bisect_right(self.boundaries, self.position(day)) - 1
+        return self.era_ids[i] if i >= 0 else None
+
+
+class EraIndex:
+    """Interval index over every ring, with era details for the response"""
+
+    def __init__(self, rings, eras):
+        """
+        ``rings`` is an ordered iterable of ``(ring_id, name, number_of_ticks)``;
+        ``eras`` an iterable of era dicts with ``id``, ``ring_id``, ``start_day``
+        and ``end_day`` keys.
+        """
+        self.eras = {}
+        eras_by_ring = {}
+        for era in eras:
+            self.eras[era['id']] = era
+            eras_by_ring.setdefault(era['ring_id'], []).append(
+                (era['id'], float(era['start_day']), float(era['end_day']))
+            )
+        self.ring_names = {}
+        self.rings = {}
+        for ring_id, name, number_of_ticks in rings:
+            self.ring_names[ring_id] = name
+            self.rings[ring_id] = RingIntervals(ring_id, number_of_ticks, eras_by_ring.get(ring_id, ()))
+
+    @classmethod
+    def from_database(cls):
+        rings = Ring.objects.order_by('index').values_list('id', 'name', 'number_of_ticks')
+        eras = RingEra.objects.values('id', 'ring_id', 'name', 'description', 'color', 'start_day', 'end_day')
+        return cls(rings, eras)
+
+    def snapshot(self, day, ring_ids=None):
+        """Active era for each ring on ``day``, in ring display order"""
+        if ring_ids is None:
+            ring_ids = self.rings.keys()
+        else:
+            wanted = set(ring_ids)
+            ring_ids = [ring_id for ring_id in self.rings if ring_id in wanted]
+
+        snapshot = []
+        for ring_id in ring_ids:
+            intervals = self.rings[ring_id]
+            era_id = intervals.era_at(day)
+            era = None
+            if era_id is not None:
+                era = {key: self.eras[era_id][key] for key in ('id', 'name', 'description', 'color')}
+            snapshot.append({
+                'ring': ring_id,
+                'name': self.ring_names[ring_id],
+                'number_of_ticks': intervals.number_of_ticks,
+                'day': intervals.position(day),
+                'era': era,
+            })
+        return snapshot
+
+
+_era_index = None
+_era_index_version = None
+_era_index_lock = threading.Lock()
+
+
+def get_era_index():
+    """Return the era index for the current dataset version, rebuilding if stale"""
+    global _era_index, _era_index_version
+    version = get_response_cache().version
+    if _era_index is None or _era_index_version != version:
+        with _era_index_lock:
+            if _era_index is None or _era_index_version != version:
+                _era_index = EraIndex.from_database()
+                _era_index_version = version
+    return _era_index
+
+
+async def aget_era_index():
+    """Async ``get_era_index``; only a rebuild leaves the event loop"""
+    version = await get_response_cache().aget_version()
+    if _era_index is not None and _era_index_version == version:
+        return _era_index
+    return await sync_to_async(get_era_index)()
@@ -0,0 +1,501 @@
+"""
+Streaming readers, a batched upsert engine and an exporter for declarative ring
+definitions.
+
+Definitions are dicts in the shape of ``RingDefinitionSerializer``. The readers
+yield them one at a time from JSON (a top-level array), NDJSON (one ring per
+line) or CSV (one row per era, consecutive rows sharing a ring ``name``), so
+memory stays flat however large the file is.
+
+``RingLoader`` upserts rings keyed on ``Ring.name`` and eras keyed on their
+name within the ring. Each batch is written in its own short transaction with
+bulk inserts, bulk updates and one delete per table, instead of wiping and
+re-creating everything, with per-row signal handlers muted: ring data is
+invalidated once, when a load or prune ends (see ``bulk_ring_writes``). Ring
+indexes are unique: a definition claiming an index held by a ring outside its
+batch is reported as invalid and skipped.
+
+With ``exported=True`` (``import_rings``) definitions are read with
+``ExportedRingSerializer``, which accepts anything ``export_rings`` writes.
+Rings or eras sharing a name, which the models allow, are then matched to the
+existing ones in ID (or display) order, the order they are exported in.
+
+``iter_ring_definitions`` goes the other way, yielding the catalog as
+definitions one chunk of rings at a time.
+"""
+import csv
+import json
+from collections import Counter, defaultdict
+from itertools import groupby
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .models import Ring, RingEra, RingImage, UserRingPreferenceVersion, refresh_rounded_fields
+from .serializers import ExportedRingSerializer, RingDefinitionSerializer
+from .signals import bulk_ring_writes, invalidate_ring_data
+
+RING_FIELDS = ('index', 'description', 'inner_radius', 'thickness', 'number_of_ticks',
+               'base_color', 'use_images', 'is_public')
+ERA_FIELDS = ('description', 'start_day', 'end_day', 'color')
+
+CSV_RING_COLUMNS = ('name',) + RING_FIELDS
+CSV_ERA_COLUMNS = {
+    'era_name': 'name',
+    'era_description': 'description',
+    'era_start_day': 'start_day',
+    'era_end_day': 'end_day',
+    'era_color': 'color',
+}
+
+
+def format_decimal(value):
+    """Exact, exponent-free string for a Decimal (e.g. ``'3.6'``, ``'100'``)"""
+    return format(value.normalize(), 'f')
+
+
+def insert_rows(model, fields, rows):
+    """
+    Insert tuples of database-ready values for ``fields`` with one prepared
+    INSERT run over every row. Unlike ``bulk_create`` nothing is converted,
+    defaulted or returned, so it suits generated data too large for building
+    model instances; no signals are sent.
+    """
+    quote = connection.ops.quote_name
+    opts = model._meta
+    columns = ', '.join(quote(opts.get_field(field).column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {quote(opts.db_table)} ({columns}) VALUES ({placeholders})', rows)
+
+
+def iter_ring_definitions(chunk_size=1000):
+    """
+    Yield a definition for every ring, in ID order.
+
+    Rings are read in keyset-paginated chunks of ``chunk_size``; each chunk's
+    eras and images come from one streamed ``values()`` query apiece, so only
+    one chunk is held in memory and no model instances are built.
+    """
+    last_id = 0
+    while True:
+        rings = list(
+            Ring.objects.filter(id__gt=last_id).order_by('id')
+            .values('id', 'name', *RING_FIELDS)[:chunk_size]
+        )
+        if not rings:
+            return
+        ring_ids = [ring['id'] for ring in rings]
+
+        eras = defaultdict(list)
+        era_rows = RingEra.objects.filter(ring_id__in=ring_ids).order_by('ring_id', 'start_day', 'id').values_list(
+            'ring_id', 'name', 'description', 'start_day', 'end_day', 'color'
+        )
+        for ring_id, name, description, start_day, end_day, color in era_rows.iterator(chunk_size=chunk_size):
+            eras[ring_id].append({
+                'name': name,
+                'description': description,
+                'start_day': format_decimal(start_day),
+                'end_day': format_decimal(end_day),
+                'color': color,
+            })
+        images = defaultdict(list)
+        image_rows = RingImage.objects.filter(ring_id__in=ring_ids).order_by('ring_id', 'order', 'id').values_list(
+            'ring_id', 'image_path'
+        )
+        for ring_id, image_path in image_rows.iterator(chunk_size=chunk_size):
+            images[ring_id].append(image_path)
+
+        for ring in rings:
+            ring_id = ring.pop('id')
+            ring['inner_radius'] = format_decimal(ring['inner_radius'])
+            ring['thickness'] = format_decimal(ring['thickness'])
+            ring['eras'] = eras[ring_id]
+            ring['images'] = images[ring_id]
+            yield ring
+        last_id = ring_ids[-1]
+
+
+def read_json(stream, chunk_size=1 << 16):
+    """Yield the items of a top-level JSON array without reading it all at once"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    opened = False
+    while True:
+        buffer = buffer.lstrip()
+        if opened and buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+
+        if not buffer or (opened and buffer[0] != ']' and not eof and len(buffer) < chunk_size):
+            # Top up the buffer before attempting to decode the next item
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            if buffer.strip() or not eof:
+                continue
+            if opened:
+                raise ValueError('Unexpected end of file inside JSON array')
+            return
+
+        if not opened:
+            if buffer[0] != '[':
+                raise ValueError('Expected a top-level JSON array of rings')
+            buffer = buffer[1:]
+            opened = True
+            continue
+        if buffer[0] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The item continues past the buffer
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def read_ndjson(stream):
+    """Yield one ring definition per non-blank line"""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    """
+    Yield ring definitions from CSV rows.
+
+    Ring columns are taken from the first row of each run of rows with the same
+    ``name``; every row with an ``era_name`` adds an era and every row with an
+    ``image_path`` appends an image.
+    """
+    rows = csv.DictReader(stream)
+    for _, ring_rows in groupby(rows, key=lambda row: row['name']):
+        ring = None
+        for row in ring_rows:
+            if ring is None:
+                ring = {column: row[column] for column in CSV_RING_COLUMNS if row.get(column) not in (None, '')}
+                ring['eras'] = []
+                ring['images'] = []
+            if row.get('era_name'):
+                ring['eras'].append({
+                    field: row[column] for column, field in CSV_ERA_COLUMNS.items()
+                    if row.get(column) not in (None, '')
+                })
+            if row.get('image_path'):
+                ring['images'].append(row['image_path'])
+        yield ring
+
+
+READERS = {
+    'json': read_json,
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+
+def detect_format(path):
+    """Guess the definition format from a file name"""
+    lowered = str(path).lower()
+    if lowered.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if lowered.endswith('.csv'):
+        return 'csv'
+    return 'json'
+
+
+class RingLoader:
+    """Validate ring definitions and upsert them in batched transactions"""
+
+    def __init__(self, batch_size=500, dry_run=False, exported=False):
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.exported = exported
+        self.serializer_class = ExportedRingSerializer if exported else RingDefinitionSerializer
+        self.stats = Counter()
+        self.errors = []
+        # Definitions loaded per ring name
+        self.seen_names = Counter()
+        # Every ring named in the source, valid or not, is kept by prune()
+        self.source_names = Counter()
+        self.seen_indexes = set()
+        self._next_index = None
+
+    def load(self, definitions):
+        """Validate and upsert every definition from an iterable"""
+        # One serializer validates every definition, as binding a new one
+        # deep-copies its fields each time
+        validator = self.serializer_class()
+        trim_name = validator.fields['name'].trim_whitespace
+        batch = []
+        # Ring data is invalidated once, after the last batch
+        with bulk_ring_writes():
+            for number, definition in enumerate(definitions, 1):
+                name = definition.get('name') if isinstance(definition, dict) else None
+                if isinstance(name, str):
+                    # As the serializer's CharField will read it
+                    self.source_names[name.strip() if trim_name else name] += 1
+                try:
+                    data = validator.run_validation(definition)
+                except ValidationError as exc:
+                    self.record_error(number, as_serializer_error(exc))
+                    continue
+                if data['name'] in self.seen_names and not self.exported:
+                    self.record_error(number, {'name': [f"Duplicate ring name {data['name']!r}"]})
+                    continue
+                if 'index' in data and data['index'] in self.seen_indexes:
+                    self.record_error(number, {'index': [f"Duplicate ring index {data['index']}"]})
+                    continue
+                # Which of the rings sharing this name the definition is matched to
+                data['occurrence'] = self.seen_names[data['name']]
+                self.seen_names[data['name']] += 1
+                if 'index' in data:
+                    self.seen_indexes.add(data['index'])
+
+                batch.append((number, data))
+                if len(batch) >= self.batch_size:
+                    self.apply(batch)
+                    batch = []
+            if batch:
+                self.apply(batch)
+        return self.stats
+
+    def summary_lines(self):
+        """Human-readable totals for the command output"""
+        prefix = 'Planned' if self.dry_run else 'Loaded'
+        stats = self.stats
+        return [
+            f"{prefix} rings: {stats['rings_inserted']} inserted, {stats['rings_updated']} updated, "
+            f"{stats['rings_unchanged']} unchanged, {stats['rings_deleted']} deleted, {stats['invalid']} invalid",
+            f"{prefix} eras: {stats['eras_inserted']} inserted, {stats['eras_updated']} updated, "
+            f"{stats['eras_deleted']} deleted; image sets replaced: {stats['image_sets_replaced']}",
+        ]
+
+    def record_error(self, number, errors):
+        self.stats['invalid'] += 1
+        self.errors.append((number, errors))
+
+    def allocate_index(self):
+        # New rings without an explicit index go after every existing ring
+        if self._next_index is None:
+            highest = Ring.objects.aggregate(highest=Max('index'))['highest']
+            self._next_index = highest + 1 if highest is not None else 0
+        while self._next_index in self.seen_indexes:
+            self._next_index += 1
+        index = self._next_index
+        self._next_index += 1
+        return index
+
+    def apply(self, batch):
+        """Upsert one batch of validated definitions in a single transaction"""
+        with transaction.atomic():
+            names = [data['name'] for _, data in batch]
+            existing = {}
+            # If names are duplicated in the database the oldest ring is the
+            # first match
+            occurrences = Counter()
+            for ring in Ring.objects.filter(name__in=names).order_by('id'):
+                existing[ring.name, occurrences[ring.name]] = ring
+                occurrences[ring.name] += 1
+            batch = self.drop_index_conflicts(batch, existing)
+
+            existing_eras = defaultdict(dict)
+            eras = RingEra.objects.filter(ring__in=list(existing.values())).order_by('ring_id', 'start_day', 'id')
+            for ring_id, ring_eras in groupby(eras, key=lambda era: era.ring_id):
+                occurrences = Counter()
+                for era in ring_eras:
+                    existing_eras[ring_id][era.name, occurrences[era.name]] = era
+                    occurrences[era.name] += 1
+            existing_images = defaultdict(list)
+            images = RingImage.objects.filter(ring__in=list(existing.values())).order_by('ring_id', 'order', 'id')
+            for ring_id, image_path in images.values_list('ring_id', 'image_path'):
+                existing_images[ring_id].append(image_path)
+
+            now = timezone.now()
+            new_rings = []
+            changed_rings = []
+            changed_fields = set()
+            eras_to_create = []
+            eras_to_update = []
+            era_ids_to_delete = []
+            image_rings = []
+
+            for _, data in batch:
+                ring = existing.get((data['name'], data['occurrence']))
+                if ring is None:
+                    fields = {field: data[field] for field in RING_FIELDS if field in data}
+                    if 'index' not in fields:
+                        fields['index'] = self.allocate_index()
+                    new_rings.append((Ring(name=data['name'], **fields), data))
+                    continue
+
+                fields = [
+                    field for field in RING_FIELDS
+                    if field in data and getattr(ring, field) != data[field]
+                ]
+                for field in fields:
+                    setattr(ring, field, data[field])
+
+                old_eras = existing_eras[ring.id]
+                new_era_keys = set()
+                occurrences = Counter()
+                eras_changed = False
+                for era_data in data['eras']:
+                    key = era_data['name'], occurrences[era_data['name']]
+                    occurrences[era_data['name']] += 1
+                    new_era_keys.add(key)
+                    era = old_eras.get(key)
+                    if era is None:
+                        eras_to_create.append(RingEra(ring=ring, **era_data))
+                        eras_changed = True
+                        continue
+                    era_fields = [field for field in ERA_FIELDS if getattr(era, field) != era_data[field]]
+                    if era_fields:
+                        for field in era_fields:
+                            setattr(era, field, era_data[field])
+                        era.updated_at = now
+                        eras_to_update.append(era)
+                        eras_changed = True
+                for key, era in old_eras.items():
+                    if key not in new_era_keys:
+                        era_ids_to_delete.append(era.id)
+                        eras_changed = True
+
+                images_changed = existing_images[ring.id] != data['images']
+                if images_changed:
+                    image_rings.append((ring, data['images']))
+
+                if fields:
+                    ring.updated_at = now
+                    changed_rings.append(ring)
+                    changed_fields.update(fields)
+                if fields or eras_changed or images_changed:
+                    self.stats['rings_updated'] += 1
+                else:
+                    self.stats['rings_unchanged'] += 1
+
+            self.stats['rings_inserted'] += len(new_rings)
+            for ring, data in new_rings:
+                eras_to_create.extend(RingEra(ring=ring, **era_data) for era_data in data['eras'])
+                if data['images']:
+                    image_rings.append((ring, data['images']))
+            self.stats['eras_inserted'] += len(eras_to_create)
+            self.stats['eras_updated'] += len(eras_to_update)
+            self.stats['eras_deleted'] += len(era_ids_to_delete)
+            self.stats['image_sets_replaced'] += len(image_rings)
+
+            if self.dry_run:
+                return
+
+            created = [ring for ring, _ in new_rings]
+            Ring.objects.bulk_create(created)
+            self.ensure_primary_keys(created)
+            if changed_rings:
+                for ring in changed_rings:
+                    refresh_rounded_fields(ring)
+                if 'index' in changed_fields:
+                    self.park_indexes(changed_rings)
+                Ring.objects.bulk_update(changed_rings, sorted(changed_fields) + ['inner_radius_float', 'updated_at'])
+
+            if era_ids_to_delete:
+                RingEra.objects.filter(id__in=era_ids_to_delete).delete()
+            RingEra.objects.bulk_create(eras_to_create, batch_size=self.batch_size)
+            if eras_to_update:
+                for era in eras_to_update:
+                    refresh_rounded_fields(era)
+                RingEra.objects.bulk_update(
+                    eras_to_update, list(ERA_FIELDS) + ['start_day_float', 'end_day_float', 'updated_at']
+                )
+
+            if image_rings:
+                RingImage.objects.filter(ring__in=[ring for ring, _ in image_rings]).delete()
+                RingImage.objects.bulk_create([
+                    RingImage(ring=ring, image_path=image_path, order=order)
+                    for ring, image_paths in image_rings
+                    for order, image_path in enumerate(image_paths)
+                ], batch_size=self.batch_size)
+
+            # Bulk writes send no signals; acted on once the load ends
+            invalidate_ring_data()
+
+    def drop_index_conflicts(self, batch, existing):
+        """Reject definitions claiming an index held by a ring outside the batch"""
+        claimed = {data['index'] for _, data in batch if 'index' in data}
+        if not claimed:
+            return batch
+        holders = dict(
+            Ring.objects.filter(index__in=claimed).exclude(name__in=[data['name'] for _, data in batch])
+            .values_list('index', 'name')
+        )
+        # A ring in the batch that keeps its current index also blocks the others
+        for _, data in batch:
+            ring = existing.get((data['name'], data['occurrence']))
+            if ring is not None and 'index' not in data:
+                holders.setdefault(ring.index, ring.name)
+        accepted = []
+        for number, data in batch:
+            holder = holders.get(data.get('index'))
+            if holder is not None and holder != data['name']:
+                self.record_error(number, {'index': [f"Index {data['index']} is already used by ring {holder!r}"]})
+            else:
+                accepted.append((number, data))
+        return accepted
+
+    def park_indexes(self, rings):
+        # The unique index is checked row by row, so rings swapping or shifting
+        # indexes within a batch are first moved below every existing index
+        # and every index they are about to take
+        lowest = Ring.objects.aggregate(lowest=Min('index'))['lowest']
+        floor = min(lowest, *(ring.index for ring in rings))
+        parked = [Ring(pk=ring.pk, index=floor - offset) for offset, ring in enumerate(rings, 1)]
+        Ring.objects.bulk_update(parked, ['index'])
+
+    def ensure_primary_keys(self, rings):
+        # Some backends do not return primary keys from bulk inserts; names
+        # may be shared but indexes are unique, so look them up by index
+        missing = [ring for ring in rings if ring.pk is None]
+        if not missing:
+            return
+        ids = dict(Ring.objects.filter(index__in=[ring.index for ring in missing]).values_list('index', 'id'))
+        for ring in missing:
+            ring.pk = ids[ring.index]
+
+    def prune(self, chunk_size=2000):
+        """
+        Delete rings whose names did not appear in any definition. A ring whose
+        definition was skipped as invalid is left as it is.
+        """
+        stale_ids = []
+        kept = Counter()
+        rings = Ring.objects.order_by('id').values_list('id', 'name')
+        for ring_id, name in rings.iterator(chunk_size=chunk_size):
+            # An export lists every ring sharing a name, so only as many of
+            # them as it has are kept
+            if name not in self.source_names or (self.exported and kept[name] >= self.source_names[name]):
+                stale_ids.append(ring_id)
+            else:
+                kept[name] += 1
+        self.stats['rings_deleted'] += len(stale_ids)
+        if self.dry_run or not stale_ids:
+            return
+        with bulk_ring_writes():
+            for start in range(0, len(stale_ids), chunk_size):
+                chunk = stale_ids[start:start + chunk_size]
+                with transaction.atomic():
+                    # Preference handlers are muted in bulk writes, so the
+                    # version of each user losing a preference is bumped here
+                    UserRingPreferenceVersion.objects.filter(
+                        user__ring_preferences__ring_id__in=chunk
+                    ).update(version=F('version') + 1)
+                    Ring.objects.filter(id__in=chunk).delete()
+                    invalidate_ring_data()
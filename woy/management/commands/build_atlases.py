@@ -0,0 +1,50 @@
+from pathlib import Path
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from woy.atlas import ATLAS_NAME, build_ring_atlas, get_config
+from woy.models import Ring
+
+class Command(BaseCommand):
+    help = "Packs each ring's images into sprite atlases, skipping rings whose images are unchanged"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ring', type=int, action='append', help='Only this ring ID; repeat for several')
+        parser.add_argument('--force', action='store_true', help='Rebuild even if the images are unchanged')
+        parser.add_argument('--prune', action='store_true', help='Delete atlas files no ring refers to')
+
+    def handle(self, *args, **options):
+        config = get_config()
+        if not config['ATLAS_DIR']:
+            raise CommandError("settings.WOY_ATLAS['ATLAS_DIR'] is not set, so there is nowhere to write atlases")
+
+        started = time.perf_counter()
+        # Rings with images, and rings whose images have all been removed since
+        rings = Ring.objects.filter(Q(images__isnull=False) | Q(image_atlas__isnull=False)).distinct().order_by('index')
+        if options['ring']:
+            rings = rings.filter(id__in=options['ring'])
+        checked = built = 0
+        for ring in rings.iterator():
+            checked += 1
+            if build_ring_atlas(ring, force=options['force']):
+                built += 1
+                self.stdout.write(f'Built {ring.name}: {len(ring.image_atlas["atlases"]) if ring.image_atlas else 0} atlases')
+
+        pruned = 0
+        if options['prune']:
+            used = {
+                atlas['file']
+                for image_atlas in Ring.objects.filter(image_atlas__isnull=False).values_list('image_atlas', flat=True)
+                for atlas in image_atlas['atlases']
+            }
+            directory = Path(config['ATLAS_DIR'])
+            for path in directory.iterdir() if directory.is_dir() else ():
+                if ATLAS_NAME.match(path.name) and path.name not in used:
+                    path.unlink()
+                    pruned += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} rings, rebuilt {built} and pruned {pruned} atlas files '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
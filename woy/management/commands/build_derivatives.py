@@ -0,0 +1,36 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from woy.derivatives import generate_derivatives, get_config, prune_derivatives
+from woy.models import RingImage
+
+class Command(BaseCommand):
+    help = 'Generates width-bucketed WebP/PNG derivatives of every ring image, in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ring', type=int, action='append', help='Only images of this ring ID; repeat for several')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Conversion processes (default: one per CPU)')
+        parser.add_argument('--prune', action='store_true', help='Delete derivatives no image refers to')
+
+    def handle(self, *args, **options):
+        config = get_config()
+        if not config['DIR']:
+            raise CommandError("settings.WOY_DERIVATIVES['DIR'] is not set, so there is nowhere to write derivatives")
+
+        started = time.perf_counter()
+        images = RingImage.objects.order_by('id')
+        if options['ring']:
+            images = images.filter(ring_id__in=options['ring'])
+        images = list(images)
+        sources, updated = generate_derivatives(images, workers=max(1, options['workers'] or 1))
+
+        pruned = 0
+        if options['prune']:
+            used = set(RingImage.objects.exclude(content_hash='').values_list('content_hash', flat=True))
+            pruned = prune_derivatives(config['DIR'], used)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {len(images)} images from {sources} distinct source files, updated {updated} '
+            f'and pruned {pruned} sources in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from woy.ics import MAX_YEARS, add_years, calendar_eras, iter_calendar
+import sys
+import time
+
+class Command(BaseCommand):
+    help = 'Exports era occurrences from an anchor date as an iCalendar (.ics) file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or '-' for standard output")
+        parser.add_argument('--anchor', type=date.fromisoformat, default=None, help='Date of day 0 as YYYY-MM-DD (default: today)')
+        parser.add_argument('--years', type=int, default=1, help=f'Number of years to export (1 to {MAX_YEARS})')
+        parser.add_argument('--user', default=None, help="Export only this user's rings (default: every ring)")
+
+    def handle(self, *args, **options):
+        if not 0 < options['years'] <= MAX_YEARS:
+            raise CommandError(f'--years must be from 1 to {MAX_YEARS}')
+        user = None
+        if options['user'] is not None:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']!r}")
+        anchor = options['anchor'] or timezone.now().date()
+
+        path = options['path']
+        started = time.perf_counter()
+        # newline='' keeps the CRLF line endings iCalendar requires
+        stream = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+        size = 0
+        try:
+            for chunk in iter_calendar(calendar_eras(user), anchor, add_years(anchor, options['years'])):
+                stream.write(chunk)
+                size += len(chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        # Keep standard output clean for piping
+        self.stderr.write(f'Exported {size} characters from {anchor} in {time.perf_counter() - started:.2f}s')
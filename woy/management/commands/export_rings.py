@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from woy.loading import iter_ring_definitions
+import json
+import sys
+import time
+
+class Command(BaseCommand):
+    help = 'Exports the ring catalog as NDJSON, one ring (with eras and images) per line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or '-' for standard output")
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of rings fetched per query')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.perf_counter()
+        stream = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8')
+        count = 0
+        try:
+            for definition in iter_ring_definitions(chunk_size=max(1, options['chunk_size'])):
+                stream.write(json.dumps(definition, separators=(',', ':')) + '\n')
+                count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        # Keep standard output clean for piping
+        self.stderr.write(f'Exported {count} rings in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from woy.loading import RingLoader, read_ndjson
+import json
+import sys
+import time
+
+class Command(BaseCommand):
+    help = 'Imports a ring catalog written by export_rings, upserting rings by name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file, or '-' for standard input")
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rings written per transaction')
+        parser.add_argument('--prune', action='store_true', help='Delete rings that are not in the export')
+        parser.add_argument('--dry-run', action='store_true', help='Report planned inserts, updates and deletes without writing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        loader = RingLoader(batch_size=options['batch_size'], dry_run=options['dry_run'], exported=True)
+
+        started = time.perf_counter()
+        try:
+            if path == '-':
+                loader.load(read_ndjson(sys.stdin))
+            else:
+                with open(path, encoding='utf-8') as stream:
+                    loader.load(read_ndjson(stream))
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        if options['prune']:
+            loader.prune()
+
+        for number, errors in loader.errors:
+            self.stderr.write(f'Skipped ring #{number}: {json.dumps(errors)}')
+        for line in loader.summary_lines():
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.2f}s'))
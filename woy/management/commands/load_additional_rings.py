@@ -1,20 +1,38 @@
 from django.core.management.base import BaseCommand
-from django.db import transaction
-from woy.models import Ring, RingEra, RingImage
+from django.db import connection, transaction
+from django.utils import timezone
+from woy.loading import insert_rows
+from woy.models import Ring, RingEra, round_significant
+from woy.signals import bulk_ring_writes, invalidate_ring_data
 import random
 import colorsys
+import time
+
+# Generated rows are inserted as they are, so these hold every column a save
+# would set (see insert_rows)
+RING_COLUMNS = ('index', 'name', 'description', 'inner_radius', 'inner_radius_float', 'thickness',
+                'number_of_ticks', 'base_color', 'use_images', 'is_public', 'updated_at')
+ERA_COLUMNS = ('ring', 'name', 'description', 'start_day', 'start_day_float', 'end_day', 'end_day_float',
+               'color', 'updated_at')
+
+
+def decimal_value(value):
+    # As a DecimalField with decimal_places=10 is saved
+    return f'{value:.10f}'
 
 class Command(BaseCommand):
     help = 'Loads additional public rings data with diverse characteristics'
 
     def add_arguments(self, parser):
         parser.add_argument('--count', type=int, default=10, help='Number of rings to generate')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rings inserted per bulk_create batch')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible output')
 
     def generate_random_color(self):
         # Generate a pleasing random color in HSV, then convert to RGB
-        h = random.random()  # random hue
-        s = 0.6 + random.random() * 0.4  # saturation 0.6-1.0
-        v = 0.6 + random.random() * 0.4  # value 0.6-1.0
+        h = self.random.random()  # random hue
+        s = 0.6 + self.random.random() * 0.4  # saturation 0.6-1.0
+        v = 0.6 + self.random.random() * 0.4  # value 0.6-1.0
         
         r, g, b = colorsys.hsv_to_rgb(h, s, v)
         # Convert to hex string
@@ -58,7 +76,7 @@ class Command(BaseCommand):
         # Convert to hex
         return f'#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}'
 
-    def create_diverse_eras(self, ring, num_eras):
+    def build_diverse_eras(self, ring_id, ring_name, number_of_ticks, base_color, num_eras):
         # Generate a different number of eras for each ring
         era_names = [
             "Beginning", "Growth", "Peak", "Decline", "Renewal",
@@ -72,43 +90,89 @@ class Command(BaseCommand):
             "Water", "Wood", "Fire", "Earth", "Metal"
         ]
         
-        # Shuffle and pick names for this ring
-        random.shuffle(era_names)
-        selected_names = era_names[:num_eras]
+        # Pick names for this ring
+        selected_names = self.random.sample(era_names, num_eras)
         
         # Calculate days per era
-        days_per_era = ring.number_of_ticks / num_eras
+        days_per_era = number_of_ticks / num_eras
         
-        # Get base color for variations
-        base_color = ring.base_color
+        # Alternate between lighter and darker variations of base color
+        colors = (
+            self.generate_lighter_color(base_color, 0.3),
+            base_color,
+            self.generate_darker_color(base_color, 0.3),
+        )
         
-        # Create eras
-        for i in range(num_eras):
+        # Build era rows in ERA_COLUMNS order
+        eras = []
+        for i, era_name in enumerate(selected_names):
             start_day = i * days_per_era
             end_day = (i + 1) * days_per_era
-            
-            # Alternate between lighter and darker variations of base color
-            if i % 3 == 0:
-                color = self.generate_lighter_color(base_color, 0.3)
-            elif i % 3 == 1:
-                color = base_color
-            else:
-                color = self.generate_darker_color(base_color, 0.3)
-            
-            RingEra.objects.create(
-                ring=ring,
-                name=selected_names[i],
-                description=f"{selected_names[i]} phase of the {ring.name}",
-                start_day=start_day,
-                end_day=end_day,
-                color=color
-            )
+            eras.append((
+                ring_id,
+                era_name,
+                f"{era_name} phase of the {ring_name}",
+                decimal_value(start_day),
+                round_significant(start_day),
+                decimal_value(end_day),
+                round_significant(end_day),
+                colors[i % 3],
+                self.updated_at,
+            ))
+        return eras
+
+    def load_name_registry(self):
+        # Count existing rings per two-word base name (e.g. "Lunar Cycle 3" counts
+        # towards "Lunar Cycle"), replacing a name__startswith query per ring
+        self.name_counts = {}
+        self.used_names = set(Ring.objects.values_list('name', flat=True))
+        for name in self.used_names:
+            base = ' '.join(name.split()[:2])
+            self.name_counts[base] = self.name_counts.get(base, 0) + 1
+
+    def unique_name(self, name):
+        # Make name unique if it already exists
+        existing_count = self.name_counts.get(name, 0)
+        unique = f"{name} {existing_count + 1}" if existing_count > 0 else name
+        while unique in self.used_names:
+            existing_count += 1
+            unique = f"{name} {existing_count + 1}"
+        self.name_counts[name] = self.name_counts.get(name, 0) + 1
+        self.used_names.add(unique)
+        return unique
+
+    def insert_batch(self, rings, num_eras_by_index):
+        # Building model instances and compiling bulk_create's SQL would take
+        # longer than the inserts themselves, so rows go in as tuples
+        insert_rows(Ring, RING_COLUMNS, rings)
+        # The new indexes lie above every existing one, so look the rings'
+        # primary keys up by index
+        ids = dict(Ring.objects.filter(
+            index__gte=rings[0][0], index__lte=rings[-1][0]
+        ).values_list('index', 'id'))
+
+        eras = []
+        for index, name, _, _, _, _, number_of_ticks, base_color, *_ in rings:
+            eras.extend(self.build_diverse_eras(ids[index], name, number_of_ticks, base_color, num_eras_by_index[index]))
+        for start in range(0, len(eras), self.batch_size):
+            insert_rows(RingEra, ERA_COLUMNS, eras[start:start + self.batch_size])
+        return len(eras)
 
-    @transaction.atomic
     def handle(self, *args, **options):
+        # One transaction, with ring data invalidated once at the end
+        with transaction.atomic(), bulk_ring_writes():
+            self.generate(options)
+
+    def generate(self, options):
         ring_count = options['count']
+        self.batch_size = max(1, options['batch_size'])
+        self.random = random.Random(options['seed'])
+        self.updated_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        verbosity = options['verbosity']
         
         self.stdout.write(f'Generating {ring_count} additional public rings...')
+        started = time.perf_counter()
+        self.load_name_registry()
         
         # Get the highest existing index
         highest_index = Ring.objects.order_by('-index').first()
@@ -182,26 +246,26 @@ class Command(BaseCommand):
         suffixes = ["Cycle", "Calendar", "Phase", "System", "Period", "Rhythm", "Rotation", "Revolution", "Flow", "Wave"]
         variations = ["Traditional", "Modern", "Ancient", "Celestial", "Natural", "Spiritual", "Harmonic", "Balanced", "Mystic", "Eternal"]
         
+        batch = []
+        num_eras_by_index = {}
+        created_rings = 0
+        created_eras = 0
         for i in range(ring_count):
             # Choose a random ring type
-            ring_type = random.choice(ring_types)
+            ring_type = self.random.choice(ring_types)
             
             # Generate unique name
-            if random.random() < 0.5:
+            if self.random.random() < 0.5:
                 # Use suffix
-                name = f"{ring_type['name_prefix']} {random.choice(suffixes)}"
+                name = f"{ring_type['name_prefix']} {self.random.choice(suffixes)}"
             else:
                 # Use variation
-                name = f"{random.choice(variations)} {ring_type['name_prefix']}"
-            
-            # Make name unique if it already exists
-            existing_count = Ring.objects.filter(name__startswith=name).count()
-            if existing_count > 0:
-                name = f"{name} {existing_count + 1}"
+                name = f"{self.random.choice(variations)} {ring_type['name_prefix']}"
+            name = self.unique_name(name)
             
             # Generate random parameters within the type's range
-            number_of_ticks = random.randint(ring_type['days_range'][0], ring_type['days_range'][1])
-            num_eras = random.randint(ring_type['eras_range'][0], ring_type['eras_range'][1])
+            number_of_ticks = self.random.randint(ring_type['days_range'][0], ring_type['days_range'][1])
+            num_eras = self.random.randint(ring_type['eras_range'][0], ring_type['eras_range'][1])
             
             # Generate pleasing color
             base_color = self.generate_random_color()
@@ -210,22 +274,42 @@ class Command(BaseCommand):
             inner_radius = 50.0 + i * 30.0
             thickness = 20.0
             
-            # Create ring with the calculated values
-            ring = Ring.objects.create(
-                index=start_index + i,
-                name=name,
-                description=f"{ring_type['desc']}",
-                inner_radius=inner_radius,
-                thickness=thickness,
-                number_of_ticks=number_of_ticks,
-                base_color=base_color,
-                use_images=False,
-                is_public=True  # Make all rings public
+            # Build the ring's row (RING_COLUMNS); it is inserted with its batch
+            ring = (
+                start_index + i,
+                name,
+                f"{ring_type['desc']}",
+                decimal_value(inner_radius),
+                round_significant(inner_radius),
+                decimal_value(thickness),
+                number_of_ticks,
+                base_color,
+                False,
+                True,  # Make all rings public
+                self.updated_at,
             )
             
-            # Create eras for the ring
-            self.create_diverse_eras(ring, num_eras)
+            batch.append(ring)
+            num_eras_by_index[start_index + i] = num_eras
             
-            self.stdout.write(f'Created: {name} with {num_eras} eras and {number_of_ticks} days')
+            if verbosity >= 2:
+                self.stdout.write(f'Created: {name} with {num_eras} eras and {number_of_ticks} days')
+
+            if len(batch) >= self.batch_size or i == ring_count - 1:
+                created_eras += self.insert_batch(batch, num_eras_by_index)
+                created_rings += len(batch)
+                batch = []
+                num_eras_by_index = {}
+                self.report_progress(created_rings, created_eras, ring_count, started)
+
+        # Raw inserts send no post_save signals
+        invalidate_ring_data()
         
-        self.stdout.write(self.style.SUCCESS(f'Successfully created {ring_count} additional public rings')) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'Successfully created {ring_count} additional public rings'))
+
+    def report_progress(self, created_rings, created_eras, ring_count, started):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(
+            f'{created_rings}/{ring_count} rings, {created_eras} eras in {elapsed:.2f}s '
+            f'({created_rings / elapsed:.0f} rings/s, {created_eras / elapsed:.0f} eras/s)'
+        ) 
\ No newline at end of file
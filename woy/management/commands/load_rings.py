@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from woy.loading import READERS, RingLoader, detect_format
+import json
+import sys
+import time
+
+class Command(BaseCommand):
+    help = 'Upserts ring definitions from a JSON, NDJSON or CSV file, keyed on ring name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Definition file, or '-' for standard input")
+        parser.add_argument('--format', choices=sorted(READERS), help='Input format (default: guessed from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of rings upserted per transaction')
+        parser.add_argument('--prune', action='store_true', help='Delete rings that are not in the file')
+        parser.add_argument('--dry-run', action='store_true', help='Report planned inserts, updates and deletes without writing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or detect_format(path)
+        loader = RingLoader(batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        started = time.perf_counter()
+        try:
+            if path == '-':
+                loader.load(READERS[data_format](sys.stdin))
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    loader.load(READERS[data_format](stream))
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        if options['prune']:
+            loader.prune()
+
+        for number, errors in loader.errors:
+            self.stderr.write(f'Skipped ring #{number}: {json.dumps(errors)}')
+
+        for line in loader.summary_lines():
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.2f}s'))
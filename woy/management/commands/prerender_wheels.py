@@ -0,0 +1,86 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from woy.models import UserRingPreference
+from woy.rendering import (
+    FORMATS, MIN_SIZE, get_config, get_render_store, render_job, round_day, round_size, spec_hash,
+    wheel_spec,
+)
+
+class Command(BaseCommand):
+    help = "Pre-renders the most common users' wheels into the render store, in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Number of most common ring sets to render')
+        parser.add_argument('--days', default='0', help="Days to render, as a comma-separated list or a range like '0-364'")
+        parser.add_argument('--sizes', default='512', help='Comma-separated image sizes in pixels')
+        parser.add_argument('--formats', default=','.join(FORMATS), help='Comma-separated formats')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Render processes (default: one per CPU)')
+        parser.add_argument('--force', action='store_true', help='Render again even if already stored')
+
+    def parse_days(self, value):
+        days = []
+        for part in value.split(','):
+            first, _, last = part.partition('-')
+            try:
+                days.extend(range(int(first), int(last) + 1) if last else [float(first)])
+            except ValueError:
+                raise CommandError(f'Invalid --days entry {part!r}')
+        return days
+
+    def handle(self, *args, **options):
+        store = get_render_store()
+        if store.directory is None:
+            raise CommandError("settings.WOY_RENDER['CACHE_DIR'] is not set, so there is nowhere to store renders")
+        days = self.parse_days(options['days'])
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        if any(not MIN_SIZE <= size <= get_config()['MAX_SIZE'] for size in sizes):
+            raise CommandError(f"Sizes must be from {MIN_SIZE} to {get_config()['MAX_SIZE']}")
+        # Rounded like requests, so they find these renders
+        days = list(dict.fromkeys(round_day(day) for day in days))
+        sizes = list(dict.fromkeys(round_size(size) for size in sizes))
+        formats = options['formats'].split(',')
+        unknown = [image_format for image_format in formats if image_format not in FORMATS]
+        if unknown:
+            raise CommandError(f"Unknown formats: {', '.join(unknown)}")
+
+        # Each user's ring IDs in display order; identical wheels are rendered once
+        wheels = {}
+        for user_id, ring_id in UserRingPreference.objects.order_by('user_id', 'display_order').values_list('user_id', 'ring_id'):
+            wheels.setdefault(user_id, []).append(ring_id)
+        popular = Counter(tuple(ring_ids) for ring_ids in wheels.values()).most_common(options['top'])
+
+        # Specs are built here, so the workers never touch the database
+        jobs = {}
+        for ring_ids, _ in popular:
+            for day in days:
+                spec = wheel_spec(list(ring_ids), day)
+                for size in sizes:
+                    for image_format in formats:
+                        digest = spec_hash(spec, size, image_format)
+                        if digest not in jobs and (options['force'] or store.get(digest, image_format) is None):
+                            jobs[digest] = (spec, size, image_format)
+        if not jobs:
+            self.stdout.write('Everything is already rendered')
+            return
+
+        started = time.perf_counter()
+        workers = max(1, options['workers'] or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(render_job, jobs.values(), chunksize=max(1, len(jobs) // (workers * 4)))
+            for (digest, body), (_, _, image_format) in zip(results, jobs.values()):
+                store.set(digest, image_format, body)
+        elapsed = time.perf_counter() - started
+        # Stay within MAX_BYTES even if less than a sweep's worth was written
+        store.evict()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {len(jobs)} images of {len(popular)} wheels with {workers} workers in {elapsed:.2f}s '
+            f'({len(jobs) / elapsed / workers:.1f} renders/s per worker)'
+        ))
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.6 on 2025-03-14 18:05
+
+from django.db import migrations
+
+import woy.models
+
+
+def round_significant(value, digits=5):
+    return float("{:.{}g}".format(float(value), digits))
+
+
+def populate_rounded_floats(apps, schema_editor):
+    Ring = apps.get_model("woy", "Ring")
+    RingEra = apps.get_model("woy", "RingEra")
+
+    rings = list(Ring.objects.only("id", "inner_radius"))
+    for ring in rings:
+        ring.inner_radius_float = round_significant(ring.inner_radius)
+    Ring.objects.bulk_update(rings, ["inner_radius_float"], batch_size=1000)
+
+    eras = list(RingEra.objects.only("id", "start_day", "end_day"))
+    for era in eras:
+        era.start_day_float = round_significant(era.start_day)
+        era.end_day_float = round_significant(era.end_day)
+    RingEra.objects.bulk_update(
+        eras, ["start_day_float", "end_day_float"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("woy", "0009_userringpreferenceversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ring",
+            name="inner_radius_float",
+            field=woy.models.RoundedFloatField(default=50, source="inner_radius"),
+        ),
+        migrations.AddField(
+            model_name="ringera",
+            name="end_day_float",
+            field=woy.models.RoundedFloatField(default=365, source="end_day"),
+        ),
+        migrations.AddField(
+            model_name="ringera",
+            name="start_day_float",
+            field=woy.models.RoundedFloatField(default=0, source="start_day"),
+        ),
+        migrations.RunPython(populate_rounded_floats, migrations.RunPython.noop),
+    ]
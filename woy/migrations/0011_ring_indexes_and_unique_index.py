@@ -0,0 +1,54 @@
+# Generated by Django 5.1.6 on 2025-03-15 09:20
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def renumber_duplicate_indexes(apps, schema_editor):
+    # The oldest ring keeps a shared index; the others move to the end
+    Ring = apps.get_model("woy", "Ring")
+    next_index = (Ring.objects.aggregate(highest=Max("index"))["highest"] or 0) + 1
+    seen = set()
+    duplicates = []
+    for ring in Ring.objects.order_by("index", "id").only("id", "index"):
+        if ring.index in seen:
+            ring.index = next_index
+            next_index += 1
+            duplicates.append(ring)
+        else:
+            seen.add(ring.index)
+    Ring.objects.bulk_update(duplicates, ["index"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("woy", "0010_rounded_float_columns"),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_duplicate_indexes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="ring",
+            index=models.Index(
+                fields=["is_public", "index"], name="woy_ring_public_index_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ringera",
+            index=models.Index(
+                fields=["ring", "start_day"], name="woy_ringera_ring_start_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ringimage",
+            index=models.Index(
+                fields=["ring", "order"], name="woy_ringimage_ring_order_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="ring",
+            constraint=models.UniqueConstraint(
+                fields=("index",), name="woy_ring_unique_index"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("woy", "0011_ring_indexes_and_unique_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ring",
+            name="image_atlas",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
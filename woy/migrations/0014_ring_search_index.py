@@ -0,0 +1,160 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:10
+
+from django.db import migrations
+
+# One search document per ring, rebuilt from the ring and its eras by
+# triggers, so bulk writes and raw SQL keep it in sync as well as saves.
+
+SQLITE_REFRESH = """
+    DELETE FROM woy_ring_search WHERE rowid = {ring_id};
+    INSERT INTO woy_ring_search (rowid, name, description, era_names, era_descriptions)
+    SELECT r.id, r.name, coalesce(r.description, ''),
+        coalesce((SELECT group_concat(e.name, ' ') FROM woy_ringera e WHERE e.ring_id = r.id), ''),
+        coalesce((SELECT group_concat(e.description, ' ') FROM woy_ringera e WHERE e.ring_id = r.id), '')
+    FROM woy_ring r WHERE r.id = {ring_id};
+"""
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE woy_ring_search USING fts5(
+        name, description, era_names, era_descriptions,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO woy_ring_search (rowid, name, description, era_names, era_descriptions)
+    SELECT r.id, r.name, coalesce(r.description, ''),
+        coalesce((SELECT group_concat(e.name, ' ') FROM woy_ringera e WHERE e.ring_id = r.id), ''),
+        coalesce((SELECT group_concat(e.description, ' ') FROM woy_ringera e WHERE e.ring_id = r.id), '')
+    FROM woy_ring r
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_ring_insert AFTER INSERT ON woy_ring BEGIN
+        {SQLITE_REFRESH.format(ring_id='new.id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_ring_update AFTER UPDATE OF name, description ON woy_ring BEGIN
+        {SQLITE_REFRESH.format(ring_id='new.id')}
+    END
+    """,
+    """
+    CREATE TRIGGER woy_ring_search_ring_delete AFTER DELETE ON woy_ring BEGIN
+        DELETE FROM woy_ring_search WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_era_insert AFTER INSERT ON woy_ringera BEGIN
+        {SQLITE_REFRESH.format(ring_id='new.ring_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_era_update AFTER UPDATE OF name, description, ring_id ON woy_ringera BEGIN
+        {SQLITE_REFRESH.format(ring_id='new.ring_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_era_move AFTER UPDATE OF ring_id ON woy_ringera
+    WHEN old.ring_id <> new.ring_id BEGIN
+        {SQLITE_REFRESH.format(ring_id='old.ring_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_era_delete AFTER DELETE ON woy_ringera BEGIN
+        {SQLITE_REFRESH.format(ring_id='old.ring_id')}
+    END
+    """,
+]
+
+SQLITE_BACKWARD = [
+    f'DROP TRIGGER IF EXISTS woy_ring_search_{name}'
+    for name in ('ring_insert', 'ring_update', 'ring_delete', 'era_insert', 'era_update', 'era_move', 'era_delete')
+] + ['DROP TABLE IF EXISTS woy_ring_search']
+
+# Names weigh A, era names B, the ring description C and era descriptions D
+POSTGRESQL_FORWARD = [
+    """
+    CREATE TABLE woy_ring_search (
+        ring_id bigint PRIMARY KEY,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX woy_ring_search_document_idx ON woy_ring_search USING GIN (document)",
+    """
+    CREATE FUNCTION woy_ring_search_refresh(target bigint) RETURNS void AS $$
+        DELETE FROM woy_ring_search WHERE ring_id = target;
+        INSERT INTO woy_ring_search (ring_id, document)
+        SELECT r.id,
+            setweight(to_tsvector('simple', r.name), 'A')
+            || setweight(to_tsvector('simple', coalesce(string_agg(e.name, ' '), '')), 'B')
+            || setweight(to_tsvector('simple', coalesce(r.description, '')), 'C')
+            || setweight(to_tsvector('simple', coalesce(string_agg(e.description, ' '), '')), 'D')
+        FROM woy_ring r LEFT JOIN woy_ringera e ON e.ring_id = r.id
+        WHERE r.id = target
+        GROUP BY r.id;
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE FUNCTION woy_ring_search_ring_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM woy_ring_search WHERE ring_id = OLD.id;
+        ELSE
+            PERFORM woy_ring_search_refresh(NEW.id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE FUNCTION woy_ring_search_era_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM woy_ring_search_refresh(OLD.ring_id);
+        END IF;
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.ring_id <> OLD.ring_id) THEN
+            PERFORM woy_ring_search_refresh(NEW.ring_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER woy_ring_search_ring AFTER INSERT OR DELETE OR UPDATE OF name, description ON woy_ring
+    FOR EACH ROW EXECUTE FUNCTION woy_ring_search_ring_changed()
+    """,
+    """
+    CREATE TRIGGER woy_ring_search_era AFTER INSERT OR DELETE OR UPDATE OF name, description, ring_id ON woy_ringera
+    FOR EACH ROW EXECUTE FUNCTION woy_ring_search_era_changed()
+    """,
+    "SELECT woy_ring_search_refresh(id) FROM woy_ring",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP TRIGGER IF EXISTS woy_ring_search_era ON woy_ringera",
+    "DROP TRIGGER IF EXISTS woy_ring_search_ring ON woy_ring",
+    "DROP FUNCTION IF EXISTS woy_ring_search_era_changed()",
+    "DROP FUNCTION IF EXISTS woy_ring_search_ring_changed()",
+    "DROP FUNCTION IF EXISTS woy_ring_search_refresh(bigint)",
+    "DROP TABLE IF EXISTS woy_ring_search",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("woy", "0013_ringimage_derivatives"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD}),
+            run_statements({"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRESQL_BACKWARD}),
+        ),
+    ]
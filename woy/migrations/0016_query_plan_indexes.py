@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("woy", "0015_datasetversion"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ringera",
+            index=models.Index(fields=["start_day"], name="woy_ringera_start_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="ringimage",
+            index=models.Index(fields=["order"], name="woy_ringimage_order_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="userringpreference",
+            index=models.Index(
+                fields=["user", "display_order"], name="woy_ringpref_user_order_idx"
+            ),
+        ),
+    ]
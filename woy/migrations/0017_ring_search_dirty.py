@@ -0,0 +1,142 @@
+# Generated by Django 5.1.6 on 2026-10-20 09:30
+
+from importlib import import_module
+
+from django.db import migrations
+
+# Rebuilding a ring's whole document for every era row made bulk era writes
+# quadratic in the number of eras per ring. The triggers now only note which
+# rings changed, in woy_ring_search_dirty, and woy.search.refresh_search_index
+# rebuilds each of them once, when the writer invalidates ring data.
+
+search_index = import_module("woy.migrations.0014_ring_search_index")
+
+SQLITE_TRIGGERS = ("ring_insert", "ring_update", "ring_delete", "era_insert", "era_update", "era_move", "era_delete")
+
+SQLITE_MARK = "INSERT OR IGNORE INTO woy_ring_search_dirty (ring_id) VALUES ({ring_id});"
+
+SQLITE_FLUSH = [
+    "DELETE FROM woy_ring_search WHERE rowid IN (SELECT ring_id FROM woy_ring_search_dirty)",
+    """
+    INSERT INTO woy_ring_search (rowid, name, description, era_names, era_descriptions)
+    SELECT r.id, r.name, coalesce(r.description, ''),
+        coalesce((SELECT group_concat(e.name, ' ') FROM woy_ringera e WHERE e.ring_id = r.id), ''),
+        coalesce((SELECT group_concat(e.description, ' ') FROM woy_ringera e WHERE e.ring_id = r.id), '')
+    FROM woy_ring r WHERE r.id IN (SELECT ring_id FROM woy_ring_search_dirty)
+    """,
+    "DELETE FROM woy_ring_search_dirty",
+]
+
+SQLITE_FORWARD = [f"DROP TRIGGER IF EXISTS woy_ring_search_{name}" for name in SQLITE_TRIGGERS] + [
+    "CREATE TABLE woy_ring_search_dirty (ring_id integer PRIMARY KEY)",
+    f"""
+    CREATE TRIGGER woy_ring_search_ring_insert AFTER INSERT ON woy_ring BEGIN
+        {SQLITE_MARK.format(ring_id='new.id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_ring_update AFTER UPDATE OF name, description ON woy_ring BEGIN
+        {SQLITE_MARK.format(ring_id='new.id')}
+    END
+    """,
+    """
+    CREATE TRIGGER woy_ring_search_ring_delete AFTER DELETE ON woy_ring BEGIN
+        DELETE FROM woy_ring_search WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_era_insert AFTER INSERT ON woy_ringera BEGIN
+        {SQLITE_MARK.format(ring_id='new.ring_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_era_update AFTER UPDATE OF name, description, ring_id ON woy_ringera BEGIN
+        {SQLITE_MARK.format(ring_id='new.ring_id')}
+        {SQLITE_MARK.format(ring_id='old.ring_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER woy_ring_search_era_delete AFTER DELETE ON woy_ringera BEGIN
+        {SQLITE_MARK.format(ring_id='old.ring_id')}
+    END
+    """,
+]
+
+# Rebuild whatever is still marked, then put back the per-row triggers
+SQLITE_BACKWARD = SQLITE_FLUSH + [f"DROP TRIGGER IF EXISTS woy_ring_search_{name}" for name in SQLITE_TRIGGERS] + [
+    "DROP TABLE IF EXISTS woy_ring_search_dirty",
+] + [statement for statement in search_index.SQLITE_FORWARD if "CREATE TRIGGER" in statement]
+
+POSTGRESQL_FORWARD = [
+    "CREATE TABLE woy_ring_search_dirty (ring_id bigint PRIMARY KEY)",
+    """
+    CREATE FUNCTION woy_ring_search_mark(target bigint) RETURNS void AS $$
+        INSERT INTO woy_ring_search_dirty (ring_id) VALUES (target) ON CONFLICT DO NOTHING;
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE FUNCTION woy_ring_search_flush() RETURNS void AS $$
+        DELETE FROM woy_ring_search WHERE ring_id IN (SELECT ring_id FROM woy_ring_search_dirty);
+        INSERT INTO woy_ring_search (ring_id, document)
+        SELECT r.id,
+            setweight(to_tsvector('simple', r.name), 'A')
+            || setweight(to_tsvector('simple', coalesce(string_agg(e.name, ' '), '')), 'B')
+            || setweight(to_tsvector('simple', coalesce(r.description, '')), 'C')
+            || setweight(to_tsvector('simple', coalesce(string_agg(e.description, ' '), '')), 'D')
+        FROM woy_ring r LEFT JOIN woy_ringera e ON e.ring_id = r.id
+        WHERE r.id IN (SELECT ring_id FROM woy_ring_search_dirty)
+        GROUP BY r.id;
+        DELETE FROM woy_ring_search_dirty;
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION woy_ring_search_ring_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM woy_ring_search WHERE ring_id = OLD.id;
+        ELSE
+            PERFORM woy_ring_search_mark(NEW.id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION woy_ring_search_era_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM woy_ring_search_mark(OLD.ring_id);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM woy_ring_search_mark(NEW.ring_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    "SELECT woy_ring_search_flush()",
+] + [
+    statement.replace("CREATE FUNCTION", "CREATE OR REPLACE FUNCTION")
+    for statement in search_index.POSTGRESQL_FORWARD
+    if "_changed() RETURNS trigger" in statement
+] + [
+    "DROP FUNCTION IF EXISTS woy_ring_search_flush()",
+    "DROP FUNCTION IF EXISTS woy_ring_search_mark(bigint)",
+    "DROP TABLE IF EXISTS woy_ring_search_dirty",
+]
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("woy", "0016_query_plan_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            search_index.run_statements({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD}),
+            search_index.run_statements({"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRESQL_BACKWARD}),
+        ),
+    ]
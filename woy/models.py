@@ -2,6 +2,51 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+def round_significant(value, digits=5):
+    """Float rounded to ``digits`` significant digits, the precision the API sends"""
+    return float('{:.{}g}'.format(float(value), digits))
+
+class RoundedFloatField(models.FloatField):
+    """
+    Read-optimised float copy of another (decimal) field, rounded with
+    ``round_significant`` whenever the model is saved or bulk created.
+
+    ``bulk_update`` and ``QuerySet.update`` bypass it; call
+    ``refresh_rounded_fields`` before ``bulk_update``.
+    """
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs['editable'] = False
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs['editable']
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = round_significant(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+def refresh_rounded_fields(instance):
+    """Recompute an instance's RoundedFloatFields from their sources"""
+    for field in instance._meta.concrete_fields:
+        if isinstance(field, RoundedFloatField):
+            field.pre_save(instance, add=False)
+
+class RingQuerySet(models.QuerySet):
+    def with_eras_and_images(self):
+        """Prefetch eras and images in display order (one query each, however many rings)"""
+        # Leading with ring_id lets the (ring, start_day) and (ring, order)
+        # indexes return rows already sorted; the order within a ring is unchanged
+        return self.prefetch_related(
+            models.Prefetch('eras', queryset=RingEra.objects.order_by('ring_id', 'start_day', 'id')),
+            models.Prefetch('images', queryset=RingImage.objects.order_by('ring_id', 'order', 'id')),
+        )
+
 class Ring(models.Model):
     # By default, Django models have an 'id' auto-increment field
     # We'll keep this as our primary key
@@ -9,12 +54,27 @@ class Ring(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True, help_text="Description of the ring")
     inner_radius = models.DecimalField(null=False, default=50, max_digits=20, decimal_places=10)
+    inner_radius_float = RoundedFloatField(source='inner_radius', default=50)
     thickness = models.DecimalField(null=False, default=20, max_digits=20, decimal_places=10)
     number_of_ticks = models.IntegerField(default=365)
     base_color = models.CharField(max_length=7, default="#00FF00")
     use_images = models.BooleanField(default=False)
+    # Sprite atlas coordinate map of the ring's images, kept up to date by woy.atlas
+    image_atlas = models.JSONField(null=True, blank=True, editable=False)
     is_public = models.BooleanField(default=True)
     created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='created_rings')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = RingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Public ring listing: WHERE is_public ORDER BY index
+            models.Index(fields=['is_public', 'index'], name='woy_ring_public_index_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['index'], name='woy_ring_unique_index'),
+        ]
 
     def __str__(self):
         return f"{self.name} (ID: {self.id}, Index: {self.index})"
@@ -26,7 +86,18 @@ class RingEra(models.Model):
     description = models.TextField(blank=True)
     start_day = models.DecimalField(null=False, default=0, max_digits=20, decimal_places=10)
     end_day = models.DecimalField(null=False, default=365, max_digits=20, decimal_places=10)
+    start_day_float = RoundedFloatField(source='start_day', default=0)
+    end_day_float = RoundedFloatField(source='end_day', default=365)
     color = models.CharField(max_length=7, default="#FF00FF")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Eras of a ring in display order
+            models.Index(fields=['ring', 'start_day'], name='woy_ringera_ring_start_idx'),
+            # The era list: ORDER BY start_day
+            models.Index(fields=['start_day'], name='woy_ringera_start_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} (Ring: {self.ring.name})"
@@ -36,6 +107,19 @@ class RingImage(models.Model):
     ring = models.ForeignKey(Ring, on_delete=models.CASCADE, related_name='images')
     image_path = models.CharField(max_length=255)
     order = models.IntegerField(default=0)
+    # SHA-256 and size of the source file, filled in by woy.derivatives
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Images of a ring in display order
+            models.Index(fields=['ring', 'order'], name='woy_ringimage_ring_order_idx'),
+            # The image list: ORDER BY order
+            models.Index(fields=['order'], name='woy_ringimage_order_idx'),
+        ]
     
     def __str__(self):
         return f"Image for {self.ring.name} (Order: {self.order})"
@@ -49,6 +133,28 @@ class UserRingPreference(models.Model):
     class Meta:
         unique_together = ('user', 'ring')
         ordering = ['display_order']
+        indexes = [
+            # A user's wheel in display order
+            models.Index(fields=['user', 'display_order'], name='woy_ringpref_user_order_idx'),
+        ]
         
     def __str__(self):
         return f"{self.user.username}'s preference for {self.ring.name} (Order: {self.display_order})"
+
+class UserRingPreferenceVersion(models.Model):
+    # Bumped on every change to a user's ring preferences so that concurrent
+    # updates can be detected instead of silently overwriting each other
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='ring_preference_version')
+    version = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}'s ring preferences (Version: {self.version})"
+
+class DatasetVersion(models.Model):
+    # A single row, bumped with every change to rings, eras or images (see
+    # woy.cache), so that every process and command shares one dataset version
+    version = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Ring dataset (Version: {self.version})"
@@ -0,0 +1,12 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class LeanJSONRenderer(JSONRenderer):
+    """
+    JSON renderer selected with ``?format=lean``.
+
+    Views switch to the compact ``LeanRingSerializer`` representation when this
+    renderer is chosen; the version is part of the media type.
+    """
+    media_type = 'application/vnd.woy.lean.v1+json'
+    format = 'lean'
@@ -0,0 +1,338 @@
+"""
+Server-side wheel rendering to SVG and PNG.
+
+A wheel is drawn the way the Flutter ``RingPainter`` lays it out: each ring is
+a band from ``inner_radius`` to ``inner_radius + thickness`` (in the app's
+logical pixels, scaled to fit the requested size), eras are arcs starting at
+the top and running clockwise, and tick marks are drawn every
+``ceil(number_of_ticks / 60)`` ticks. Eras are filled with their own colors.
+Each ring is rotated so that the given day sits under the marker at the top.
+
+Rendering works on a ``WheelSpec``: plain tuples holding only what is drawn,
+with each ring's position in its cycle instead of the day. Specs are cheap to
+pickle for a process pool, and two requests that draw the same picture (e.g.
+days a whole number of cycles apart) have the same ``spec_hash``.
+
+Requests round the day to ``DAY_STEP`` and the size up to one of ``SIZES``
+(``round_day``, ``round_size``) before anything is hashed, so the number of
+distinct renders is bounded however callers vary them.
+
+Renders are kept in two layers:
+
+- the versioned response cache, keyed on the request (see ``woy.cache``), so
+  repeated requests skip the database;
+- ``RenderStore``, files under ``settings.WOY_RENDER['CACHE_DIR']`` named by
+  the content hash of the spec, size and format. They are shared by every
+  process, including the ``prerender_wheels`` command, and never go stale:
+  changed rings give a different hash. Past ``MAX_BYTES`` the least recently
+  used files are deleted; reads refresh a file's modification time.
+"""
+import hashlib
+import io
+import math
+import os
+import tempfile
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from PIL import Image, ImageDraw
+
+from .models import Ring
+
+# Bump when the drawing changes, so stored renders are not reused
+RENDER_VERSION = 1
+FORMATS = {'svg': 'image/svg+xml', 'png': 'image/png'}
+MIN_SIZE = 16
+MAX_RINGS = 100
+# Logical pixels left around the outermost ring, and tick and marker lengths
+MARGIN = 8.0
+TICK_LENGTH = 4.0
+MARKER_COLOR = '#333333'
+# PNGs are drawn this many times larger and scaled down, for antialiasing
+SUPERSAMPLE = 2
+
+DEFAULT_CONFIG = {
+    'CACHE_DIR': None,
+    # Stored renders are trimmed back to this many bytes (None for no limit)
+    'MAX_BYTES': None,
+    'MAX_SIZE': 2048,
+    # Requested sizes are rounded up to one of these (or MAX_SIZE)
+    'SIZES': [16, 32, 64, 128, 256, 512, 1024, 2048],
+    # Days are rounded to a multiple of this
+    'DAY_STEP': 1 / 24,
+}
+# A store sweeps itself after this share of MAX_BYTES was written, down to
+# EVICT_TO of it
+SWEEP_FRACTION = 0.1
+EVICT_TO = 0.9
+
+RingSpec = namedtuple('RingSpec', 'inner_radius thickness number_of_ticks base_color position eras')
+EraSpec = namedtuple('EraSpec', 'start_day end_day color')
+WheelSpec = namedtuple('WheelSpec', 'rings')
+
+
+def get_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, 'WOY_RENDER', {})}
+
+
+def round_day(day):
+    """``day`` rounded to the nearest multiple of ``DAY_STEP``"""
+    step = get_config()['DAY_STEP']
+    return round(day / step) * step if step else day
+
+
+def round_size(size):
+    """``size`` rounded up to the nearest of ``SIZES``, or ``MAX_SIZE``"""
+    config = get_config()
+    max_size = config['MAX_SIZE']
+    return min((allowed for allowed in config['SIZES'] if size <= allowed <= max_size), default=max_size)
+
+
+def ring_spec(ring, day):
+    """``RingSpec`` for a Ring with prefetched eras, positioned on ``day``"""
+    ticks = ring.number_of_ticks
+    eras = sorted(ring.eras.all(), key=lambda era: (era.start_day, era.id))
+    return RingSpec(
+        inner_radius=float(ring.inner_radius),
+        thickness=float(ring.thickness),
+        number_of_ticks=ticks,
+        base_color=ring.base_color,
+        position=float(day % ticks) if ticks > 0 else 0.0,
+        eras=tuple(EraSpec(float(era.start_day), float(era.end_day), era.color) for era in eras),
+    )
+
+
+def wheel_spec(ring_ids, day):
+    """``WheelSpec`` for the given rings, drawn in the given order"""
+    rings = Ring.objects.filter(id__in=ring_ids).with_eras_and_images()
+    by_id = {ring.id: ring for ring in rings}
+    return WheelSpec(tuple(ring_spec(by_id[ring_id], day) for ring_id in ring_ids if ring_id in by_id))
+
+
+def spec_hash(spec, size, image_format):
+    return hashlib.sha256(repr((RENDER_VERSION, spec, size, image_format)).encode()).hexdigest()
+
+
+def layout(spec, size):
+    """(center, scale) fitting every ring inside a ``size`` square"""
+    outer = max((ring.inner_radius + ring.thickness for ring in spec.rings), default=0.0)
+    return size / 2, size / 2 / (outer + MARGIN) if outer > 0 else 1.0
+
+
+def turn(ring, day):
+    """Clockwise angle from the top, in radians, of a cycle day on a rotated ring"""
+    return (day - ring.position) / ring.number_of_ticks * 2 * math.pi
+
+
+def tick_days(ring):
+    return range(0, ring.number_of_ticks, max(1, math.ceil(ring.number_of_ticks / 60)))
+
+
+def drawable_eras(ring):
+    """Yield (era, start angle, sweep) for eras that cover some of the ring"""
+    if ring.number_of_ticks <= 0:
+        return
+    for era in ring.eras:
+        sweep = min((era.end_day - era.start_day) / ring.number_of_ticks * 2 * math.pi, 2 * math.pi)
+        if sweep > 0:
+            yield era, turn(ring, era.start_day), sweep
+
+
+def svg_point(center, radius, angle):
+    return f'{center + radius * math.sin(angle):.2f},{center - radius * math.cos(angle):.2f}'
+
+
+def svg_band(center, inner, outer, start, sweep, color):
+    if sweep >= 2 * math.pi - 1e-9:
+        # A full band cannot be one arc; stroke a circle down its middle instead
+        middle = (inner + outer) / 2
+        return (
+            f'<circle cx="{center:.2f}" cy="{center:.2f}" r="{middle:.2f}" fill="none" '
+            f'stroke="{color}" stroke-width="{outer - inner:.2f}"/>'
+        )
+    end = start + sweep
+    large = 1 if sweep > math.pi else 0
+    return (
+        f'<path d="M{svg_point(center, outer, start)} '
+        f'A{outer:.2f},{outer:.2f} 0 {large} 1 {svg_point(center, outer, end)} '
+        f'L{svg_point(center, inner, end)} '
+        f'A{inner:.2f},{inner:.2f} 0 {large} 0 {svg_point(center, inner, start)}Z" fill="{color}"/>'
+    )
+
+
+def render_svg(spec, size):
+    center, scale = layout(spec, size)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}">'
+    ]
+    for ring in spec.rings:
+        inner = ring.inner_radius * scale
+        outer = (ring.inner_radius + ring.thickness) * scale
+        for era, start, sweep in drawable_eras(ring):
+            parts.append(svg_band(center, inner, outer, start, sweep, era.color))
+        if tick_days(ring):
+            ticks = ' '.join(
+                f'M{svg_point(center, outer - TICK_LENGTH * scale, turn(ring, day))}'
+                f'L{svg_point(center, outer, turn(ring, day))}'
+                for day in tick_days(ring)
+            )
+            parts.append(
+                f'<path d="{ticks}" stroke="{ring.base_color}" stroke-opacity="0.5" '
+                f'stroke-width="{0.8 * scale:.2f}" fill="none"/>'
+            )
+    points = ' '.join(f'{x:.2f},{y:.2f}' for x, y in marker(center, scale))
+    parts.append(f'<polygon points="{points}" fill="{MARKER_COLOR}"/>')
+    parts.append('</svg>')
+    return ''.join(parts).encode()
+
+
+def marker(center, scale):
+    """Triangle above the outermost ring, pointing down at the top of every ring"""
+    half = MARGIN / 2 * scale
+    return [(center - half, 0.0), (center + half, 0.0), (center, MARGIN * scale)]
+
+
+def rgba(color, alpha=255):
+    return (int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16), alpha)
+
+
+def render_png(spec, size):
+    canvas = size * SUPERSAMPLE
+    center, scale = layout(spec, canvas)
+    image = Image.new('RGBA', (canvas, canvas), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image, 'RGBA')
+    for ring in spec.rings:
+        inner = ring.inner_radius * scale
+        outer = (ring.inner_radius + ring.thickness) * scale
+        box = (center - outer, center - outer, center + outer, center + outer)
+        width = max(1, round(outer - inner))
+        for era, start, sweep in drawable_eras(ring):
+            # Pillow measures degrees clockwise from three o'clock
+            start_degrees = math.degrees(start) - 90
+            draw.arc(box, start_degrees, start_degrees + math.degrees(sweep), fill=rgba(era.color), width=width)
+        tick_color = rgba(ring.base_color, 128)
+        tick_width = max(1, round(0.8 * scale))
+        for day in tick_days(ring):
+            angle = turn(ring, day)
+            sin, cos = math.sin(angle), math.cos(angle)
+            inner_tick = outer - TICK_LENGTH * scale
+            draw.line(
+                (center + inner_tick * sin, center - inner_tick * cos, center + outer * sin, center - outer * cos),
+                fill=tick_color, width=tick_width,
+            )
+    draw.polygon(marker(center, scale), fill=rgba(MARKER_COLOR))
+
+    if SUPERSAMPLE > 1:
+        image = image.resize((size, size), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format='PNG', optimize=False)
+    return output.getvalue()
+
+
+RENDERERS = {'svg': render_svg, 'png': render_png}
+
+
+def render(spec, size, image_format):
+    return RENDERERS[image_format](spec, size)
+
+
+def render_job(job):
+    """Process pool entry point: ``(spec, size, format)`` to ``(hash, body)``"""
+    spec, size, image_format = job
+    return spec_hash(spec, size, image_format), render(spec, size, image_format)
+
+
+class RenderStore:
+    """Rendered wheels as files named by content hash, shared between processes"""
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = Path(directory) if directory else None
+        self.max_bytes = max_bytes
+        # Bytes this process stored since its last sweep
+        self.written = 0
+
+    def path(self, digest, image_format):
+        return self.directory / digest[:2] / f'{digest}.{image_format}'
+
+    def get(self, digest, image_format):
+        if self.directory is None:
+            return None
+        path = self.path(digest, image_format)
+        try:
+            body = path.read_bytes()
+            # Mark as recently used; access times are often not kept
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return body
+
+    def set(self, digest, image_format, body):
+        if self.directory is None:
+            return
+        path = self.path(digest, image_format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        handle, temporary = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as stream:
+            stream.write(body)
+        os.replace(temporary, path)
+
+        if self.max_bytes:
+            self.written += len(body)
+            if self.written >= self.max_bytes * SWEEP_FRACTION:
+                self.evict()
+
+    def evict(self):
+        """Delete the least recently used renders while the store is over ``max_bytes``"""
+        self.written = 0
+        if self.directory is None or not self.max_bytes:
+            return 0
+        files = []
+        for path in self.directory.glob('*/*'):
+            if path.suffix[1:] not in FORMATS:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return 0
+        evicted = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        return evicted
+
+
+_render_store = None
+
+
+def get_render_store():
+    """Return the process-wide render store, rebuilt if its settings change"""
+    global _render_store
+    config = get_config()
+    directory = Path(config['CACHE_DIR']) if config['CACHE_DIR'] else None
+    if _render_store is None or (_render_store.directory, _render_store.max_bytes) != (directory, config['MAX_BYTES']):
+        _render_store = RenderStore(directory, config['MAX_BYTES'])
+    return _render_store
+
+
+def render_wheel(ring_ids, day, size, image_format):
+    """Rendered wheel from the render store, drawing and storing it on a miss"""
+    spec = wheel_spec(ring_ids, day)
+    digest = spec_hash(spec, size, image_format)
+    store = get_render_store()
+    body = store.get(digest, image_format)
+    if body is None:
+        body = render(spec, size, image_format)
+        store.set(digest, image_format, body)
+    return body
@@ -0,0 +1,118 @@
+"""
+Full-text search over rings and their eras.
+
+Each ring has one search document holding its name, description, era names
+and era descriptions, kept in ``woy_ring_search``. Database triggers (see
+migrations 0014 and 0017) note every ring whose row or eras change, bulk
+creates, bulk updates and raw SQL included, in ``woy_ring_search_dirty``, and
+``refresh_search_index`` rebuilds each noted ring's document once; it runs
+whenever ring data is invalidated, so a bulk load of many eras costs one
+rebuild per ring rather than one per era. On SQLite the table is an FTS5 index ranked by BM25; on
+PostgreSQL it holds a weighted ``tsvector`` with a GIN index, ranked by
+``ts_rank_cd``. Matches in ring names rank above era names, then ring
+descriptions, then era descriptions.
+
+Ranking scores every match, so a word found in most rings costs a few
+microseconds per ring; the search endpoint keeps results in the response
+cache.
+
+Queries are split into words and every word must match, as a prefix, so
+partial input such as ``moo pha`` finds "Moon Phases". Words are passed as
+quoted terms, never as query syntax.
+"""
+import re
+
+from django.db import connection
+
+MAX_LIMIT = 100
+MAX_WORDS = 10
+WORD = re.compile(r'\w+')
+# Per-column BM25 weights: name, description, era names, era descriptions
+SQLITE_WEIGHTS = (10.0, 2.0, 5.0, 1.0)
+SQLITE_REFRESH = (
+    'DELETE FROM woy_ring_search WHERE rowid IN (SELECT ring_id FROM woy_ring_search_dirty)',
+    '''
+        INSERT INTO woy_ring_search (rowid, name, description, era_names, era_descriptions)
+        SELECT r.id, r.name, coalesce(r.description, ''),
+            coalesce((SELECT group_concat(e.name, ' ') FROM woy_ringera e WHERE e.ring_id = r.id), ''),
+            coalesce((SELECT group_concat(e.description, ' ') FROM woy_ringera e WHERE e.ring_id = r.id), '')
+        FROM woy_ring r WHERE r.id IN (SELECT ring_id FROM woy_ring_search_dirty)
+    ''',
+    'DELETE FROM woy_ring_search_dirty',
+)
+
+
+def refresh_search_index():
+    """Rebuild the search documents of rings changed since the last refresh, in the current transaction"""
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM woy_ring_search_dirty LIMIT 1')
+        if cursor.fetchone() is None:
+            return
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT woy_ring_search_flush()')
+            return
+        for statement in SQLITE_REFRESH:
+            cursor.execute(statement)
+
+
+def query_words(text):
+    return WORD.findall(text.lower())[:MAX_WORDS]
+
+
+def match_expression(words, vendor):
+    """The backend's query for rings matching every word as a prefix"""
+    if vendor == 'postgresql':
+        return ' & '.join(f"'{word}':*" for word in words)
+    # One-letter prefixes are not indexed and would scan every term
+    return ' '.join(f'"{word}"*' if len(word) > 1 else f'"{word}"' for word in words)
+
+
+def matching_ids_sql(text):
+    """``(sql, params)`` selecting the IDs of rings matching ``text``, or None if it has no words"""
+    words = query_words(text)
+    if not words:
+        return None
+    match = match_expression(words, connection.vendor)
+    if connection.vendor == 'postgresql':
+        return "SELECT ring_id FROM woy_ring_search WHERE document @@ to_tsquery('simple', %s)", [match]
+    return 'SELECT rowid FROM woy_ring_search WHERE woy_ring_search MATCH %s', [match]
+
+
+def search_rings(text, offset=0, limit=20):
+    """
+    Rings matching ``text``, best first, as dicts of ``id``, ``index``,
+    ``name``, ``description`` and ``score`` (higher is better). One more than
+    ``limit`` rows are read, so callers can tell whether there is a next page.
+    """
+    words = query_words(text)
+    if not words:
+        return []
+    match = match_expression(words, connection.vendor)
+    if connection.vendor == 'postgresql':
+        sql = '''
+            SELECT r.id, r."index", r.name, r.description, ts_rank_cd(s.document, query) AS score
+            FROM woy_ring_search s, to_tsquery('simple', %s) query, woy_ring r
+            WHERE s.document @@ query AND r.id = s.ring_id
+            ORDER BY score DESC, r."index"
+            LIMIT %s OFFSET %s
+        '''
+    else:
+        # Ranked inside FTS5 (bm25() is lower for better matches), then only
+        # the page is joined to the rings
+        sql = f'''
+            SELECT r.id, r."index", r.name, r.description, -page.weight AS score
+            FROM (
+                SELECT rowid, bm25(woy_ring_search, {', '.join(map(str, SQLITE_WEIGHTS))}) AS weight
+                FROM woy_ring_search
+                WHERE woy_ring_search MATCH %s
+                ORDER BY weight, rowid
+                LIMIT %s OFFSET %s
+            ) page JOIN woy_ring r ON r.id = page.rowid
+            ORDER BY page.weight, page.rowid
+        '''
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit + 1, offset])
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -1,40 +1,104 @@
 # serializers.py
+from decimal import ROUND_HALF_UP
+
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from .atlas import atlas_frames
+from .instrumentation import timed
 from .models import Ring, RingEra, RingImage, UserRingPreference
 
-class RingEraSerializer(serializers.ModelSerializer):
-    # Add fields for formatted values
-    start_day_float = serializers.SerializerMethodField()
-    end_day_float = serializers.SerializerMethodField()
+def requested_fields(context):
+    """Field names from the request's ``?fields=a,b`` parameter, or None for all"""
+    request = context.get('request')
+    requested = request.query_params.get('fields') if request is not None else None
+    if not requested:
+        return None
+    return {name.strip() for name in requested.split(',') if name.strip()}
+
+def wants_image_atlas(context):
+    """Whether the request opted in to image atlases with ``?images=atlas``"""
+    request = context.get('request')
+    return request is not None and request.query_params.get('images') == 'atlas'
+
+class SparseFieldsMixin:
+    """Drop the top-level fields not listed in ``?fields=``"""
+    sparse = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self.context)
+        if wanted:
+            self.sparse = True
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+class TimedDataMixin:
+    """Count ``.data`` towards the request's serializer time (see woy.instrumentation)"""
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+class RingEraSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    # Formatted values (5 significant digits) are stored at write time, so
+    # they are passed through untouched
+    start_day_float = serializers.ReadOnlyField()
+    end_day_float = serializers.ReadOnlyField()
     
     class Meta:
         model = RingEra
         fields = ['id', 'ring', 'name', 'description', 'start_day', 'end_day', 'color', 'start_day_float', 'end_day_float']
-        
-    def get_start_day_float(self, obj):
-        # Convert to float and limit to 5 significant digits
-        value = float(obj.start_day)
-        return float('{:.5g}'.format(value))
-        
-    def get_end_day_float(self, obj):
-        # Convert to float and limit to 5 significant digits
-        value = float(obj.end_day)
-        return float('{:.5g}'.format(value))
-
-class RingImageSerializer(serializers.ModelSerializer):
+        list_serializer_class = TimedListSerializer
+
+    def to_representation(self, instance):
+        if self.sparse:
+            return super().to_representation(instance)
+        # Fast path for the full field set: same output as the generic
+        # field-by-field loop, without its per-field dispatch
+        fields = self.fields
+        return {
+            'id': instance.id,
+            'ring': instance.ring_id,
+            'name': instance.name,
+            'description': instance.description,
+            'start_day': fields['start_day'].to_representation(instance.start_day),
+            'end_day': fields['end_day'].to_representation(instance.end_day),
+            'color': instance.color,
+            'start_day_float': instance.start_day_float,
+            'end_day_float': instance.end_day_float,
+        }
+
+class RingImageSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = RingImage
         fields = ['id', 'ring', 'image_path', 'order']
+        list_serializer_class = TimedListSerializer
+
+    def to_representation(self, instance):
+        if self.sparse:
+            return super().to_representation(instance)
+        # Fast path for the full field set (see RingEraSerializer)
+        return {
+            'id': instance.id,
+            'ring': instance.ring_id,
+            'image_path': instance.image_path,
+            'order': instance.order,
+        }
 
-class RingSerializer(serializers.ModelSerializer):
+class RingSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
     eras = RingEraSerializer(many=True, read_only=True)
     images = RingImageSerializer(many=True, read_only=True)
     
-    # For Flutter compatibility
-    baseColor = serializers.SerializerMethodField()
-    innerRadius = serializers.SerializerMethodField()
-    numberOfTicks = serializers.SerializerMethodField()
-    useImages = serializers.SerializerMethodField()
+    # For Flutter compatibility; plain copies are read straight off the model
+    # instead of going through SerializerMethodField dispatch
+    baseColor = serializers.ReadOnlyField(source='base_color')
+    innerRadius = serializers.ReadOnlyField(source='inner_radius_float')
+    numberOfTicks = serializers.ReadOnlyField(source='number_of_ticks')
+    useImages = serializers.ReadOnlyField(source='use_images')
     imageAssets = serializers.SerializerMethodField()
     
     class Meta:
@@ -42,25 +106,99 @@ class RingSerializer(serializers.ModelSerializer):
         fields = ['id', 'index', 'name', 'inner_radius', 'thickness', 'number_of_ticks', 
                   'base_color', 'use_images', 'eras', 'images', 'baseColor', 'innerRadius', 
                   'numberOfTicks', 'useImages', 'imageAssets']
+        list_serializer_class = TimedListSerializer
+        # This DRF release does not turn UniqueConstraints into validators, so
+        # a taken index would otherwise fail with an IntegrityError
+        extra_kwargs = {'index': {'validators': [UniqueValidator(queryset=Ring.objects.all())]}}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image_atlas = wants_image_atlas(self.context)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance) if self.sparse else self.full_representation(instance)
+        # With ?images=atlas, rings that have an atlas send it instead of one path per image
+        if self.image_atlas and 'imageAssets' in data and instance.image_atlas:
+            del data['imageAssets']
+            data['imageAtlas'] = atlas_frames(instance)
+        return data
+
+    def full_representation(self, instance):
+        # Fast path for the full field set (see RingEraSerializer)
+        fields = self.fields
+        return {
+            'id': instance.id,
+            'index': instance.index,
+            'name': instance.name,
+            'inner_radius': fields['inner_radius'].to_representation(instance.inner_radius),
+            'thickness': fields['thickness'].to_representation(instance.thickness),
+            'number_of_ticks': instance.number_of_ticks,
+            'base_color': instance.base_color,
+            'use_images': instance.use_images,
+            'eras': fields['eras'].to_representation(instance.eras),
+            'images': fields['images'].to_representation(instance.images),
+            'baseColor': instance.base_color,
+            'innerRadius': instance.inner_radius_float,
+            'numberOfTicks': instance.number_of_ticks,
+            'useImages': instance.use_images,
+            'imageAssets': self.get_imageAssets(instance),
+        }
 
-    def get_baseColor(self, obj):
-        return obj.base_color
-        
-    def get_innerRadius(self, obj):
-        # Convert to float and limit to 5 significant digits
-        value = float(obj.inner_radius)
-        # Format to 5 significant digits and convert back to float
-        return float('{:.5g}'.format(value))
-        
-    def get_numberOfTicks(self, obj):
-        return obj.number_of_ticks
-        
-    def get_useImages(self, obj):
-        return obj.use_images
-        
     def get_imageAssets(self, obj):
-        image_paths = obj.images.all().order_by('order').values_list('image_path', flat=True)
-        return list(image_paths)
+        # Sort in Python so a prefetched images list is reused instead of re-queried
+        images = sorted(obj.images.all(), key=lambda image: (image.order, image.id))
+        return [image.image_path for image in images]
+
+class LeanRingSerializer(TimedDataMixin, serializers.BaseSerializer):
+    """
+    Compact, read-only ring representation used with ``?format=lean``.
+
+    Every value appears once in snake_case: radii and days are plain numbers,
+    eras omit their ring ID and images are an ordered list of paths, or an
+    ``image_atlas`` with ``?images=atlas`` (see ``RingSerializer``).
+    """
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wanted = requested_fields(self.context)
+        self.image_atlas = wants_image_atlas(self.context)
+
+    def to_representation(self, ring):
+        data = {
+            'id': ring.id,
+            'index': ring.index,
+            'name': ring.name,
+            'description': ring.description,
+            'inner_radius': float(ring.inner_radius),
+            'thickness': float(ring.thickness),
+            'number_of_ticks': ring.number_of_ticks,
+            'base_color': ring.base_color,
+            'use_images': ring.use_images,
+            'eras': [
+                {
+                    'id': era.id,
+                    'name': era.name,
+                    'description': era.description,
+                    'start_day': float(era.start_day),
+                    'end_day': float(era.end_day),
+                    'color': era.color,
+                }
+                for era in ring.eras.all()
+            ],
+            'images': [
+                image.image_path
+                for image in sorted(ring.images.all(), key=lambda image: (image.order, image.id))
+            ],
+        }
+        if self.image_atlas and ring.image_atlas:
+            del data['images']
+            data['image_atlas'] = atlas_frames(ring)
+        if self.wanted:
+            data = {name: value for name, value in data.items() if name in self.wanted}
+        return data
 
 class UserRingPreferenceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -72,3 +210,94 @@ class UserRingUpdateSerializer(serializers.Serializer):
         child=serializers.IntegerField(),
         required=True
     )
+    # Preference version the client last saw; omit to overwrite unconditionally
+    version = serializers.IntegerField(required=False, min_value=0)
+
+class EraDefinitionSerializer(serializers.Serializer):
+    """One era inside a declarative ring definition"""
+    name = serializers.CharField(max_length=200)
+    description = serializers.CharField(allow_blank=True, default='')
+    start_day = serializers.DecimalField(max_digits=20, decimal_places=10, rounding=ROUND_HALF_UP)
+    end_day = serializers.DecimalField(max_digits=20, decimal_places=10, rounding=ROUND_HALF_UP)
+    color = serializers.RegexField(r'^#[0-9A-Fa-f]{6}$', default='#FF00FF')
+
+class BulkEraSerializer(EraDefinitionSerializer):
+    """One era in a bulk era write; ``id`` names an existing era of the ring to change"""
+    id = serializers.IntegerField(required=False)
+
+class RingEraSetSerializer(serializers.Serializer):
+    """
+    Body of ``PUT``/``PATCH /api/rings/{id}/eras/``.
+
+    Gaps between eras are rejected unless ``allow_gaps`` is set.
+    """
+    eras = BulkEraSerializer(many=True)
+    allow_gaps = serializers.BooleanField(default=False)
+
+class RingDefinitionSerializer(serializers.Serializer):
+    """
+    Declarative ring definition read by the ring loading commands.
+
+    Rings are identified by ``name`` and eras by their name within the ring;
+    ``images`` is the ordered list of image paths.
+    """
+    name = serializers.CharField(max_length=200)
+    index = serializers.IntegerField(required=False)
+    description = serializers.CharField(allow_blank=True, allow_null=True, default=None)
+    inner_radius = serializers.DecimalField(max_digits=20, decimal_places=10, rounding=ROUND_HALF_UP, default=50)
+    thickness = serializers.DecimalField(max_digits=20, decimal_places=10, rounding=ROUND_HALF_UP, default=20)
+    number_of_ticks = serializers.IntegerField(min_value=1, default=365)
+    base_color = serializers.RegexField(r'^#[0-9A-Fa-f]{6}$', default='#00FF00')
+    use_images = serializers.BooleanField(default=False)
+    is_public = serializers.BooleanField(default=True)
+    eras = EraDefinitionSerializer(many=True, default=list)
+    images = serializers.ListField(child=serializers.CharField(max_length=255), default=list)
+
+    def validate(self, data):
+        number_of_ticks = data['number_of_ticks']
+        era_names = set()
+        for era in data['eras']:
+            if era['name'] in era_names:
+                raise serializers.ValidationError({'eras': f"Duplicate era name {era['name']!r}"})
+            era_names.add(era['name'])
+
+            # Eras may run past number_of_ticks (they wrap) but not span more
+            # than one full cycle
+            if not 0 <= era['start_day'] < number_of_ticks:
+                raise serializers.ValidationError(
+                    {'eras': f"Era {era['name']!r} must start within [0, {number_of_ticks})"}
+                )
+            if not era['start_day'] < era['end_day'] <= era['start_day'] + number_of_ticks:
+                raise serializers.ValidationError(
+                    {'eras': f"Era {era['name']!r} must end after its start and within one cycle"}
+                )
+        return data
+
+class ExportedEraSerializer(serializers.Serializer):
+    """One era as written by ``export_rings``: any value the model can hold"""
+    name = serializers.CharField(max_length=200, allow_blank=True, trim_whitespace=False)
+    description = serializers.CharField(allow_blank=True, trim_whitespace=False, default='')
+    start_day = serializers.DecimalField(max_digits=20, decimal_places=10, rounding=ROUND_HALF_UP)
+    end_day = serializers.DecimalField(max_digits=20, decimal_places=10, rounding=ROUND_HALF_UP)
+    color = serializers.CharField(max_length=7, allow_blank=True, trim_whitespace=False, default='#FF00FF')
+
+class ExportedRingSerializer(RingDefinitionSerializer):
+    """
+    Ring definition as written by ``export_rings``, read by ``import_rings``.
+
+    Accepts any value the models can hold, so whatever is exported imports
+    back unchanged: values are not trimmed, and the layout rules for
+    hand-written definitions (eras within one cycle, unique era names) are
+    not applied.
+    """
+    name = serializers.CharField(max_length=200, allow_blank=True, trim_whitespace=False)
+    description = serializers.CharField(allow_blank=True, allow_null=True, trim_whitespace=False, default=None)
+    number_of_ticks = serializers.IntegerField(default=365)
+    base_color = serializers.CharField(max_length=7, allow_blank=True, trim_whitespace=False, default='#00FF00')
+    eras = ExportedEraSerializer(many=True, default=list)
+    images = serializers.ListField(
+        child=serializers.CharField(max_length=255, allow_blank=True, trim_whitespace=False), default=list
+    )
+
+    def validate(self, data):
+        return data
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,6 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its total covers every other middleware (see woy/instrumentation.py)
+    'woy.instrumentation.ServerTimingMiddleware',
+    # Before anything that reads or writes response bodies (see woy/compression.py)
+    'woy.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -76,12 +83,55 @@ WSGI_APPLICATION = 'woy.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# Configured from the environment. WOY_DB_ENGINE is 'sqlite' (the default) or
+# 'postgresql'; connections are kept open for WOY_DB_CONN_MAX_AGE seconds
+# instead of being opened for every request.
+
+DB_ENGINE = os.environ.get('WOY_DB_ENGINE', 'sqlite')
+# The small sample database kept in git
+SAMPLE_DATABASE = BASE_DIR / 'db.sqlite3'
+DB_CONN_MAX_AGE = int(os.environ.get('WOY_DB_CONN_MAX_AGE', '60'))
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('WOY_DB_NAME', SAMPLE_DATABASE),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
+    }
+elif DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('WOY_DB_NAME', 'woy'),
+            'USER': os.environ.get('WOY_DB_USER', ''),
+            'PASSWORD': os.environ.get('WOY_DB_PASSWORD', ''),
+            'HOST': os.environ.get('WOY_DB_HOST', ''),
+            'PORT': os.environ.get('WOY_DB_PORT', ''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # Check a reused connection before the request that picks it up,
+            # so a server restart does not fail the first request per worker
+            # (done by woy/db.py before Django 4.1)
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
+else:
+    raise ImproperlyConfigured(f"WOY_DB_ENGINE must be 'sqlite' or 'postgresql', not {DB_ENGINE!r}")
+
+# Applied to every new SQLite connection (see woy/db.py). WAL lets readers
+# carry on while update_rings writes; synchronous=NORMAL is durable in WAL
+# mode except across a power loss. WAL is recorded in the database file, so
+# the sample db.sqlite3 kept in git stays in rollback journal mode unless
+# WOY_SQLITE_JOURNAL_MODE asks otherwise.
+WOY_SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get(
+        'WOY_SQLITE_JOURNAL_MODE', None if Path(DATABASES['default']['NAME']).resolve() == SAMPLE_DATABASE else 'wal'
+    ),
+    'synchronous': os.environ.get('WOY_SQLITE_SYNCHRONOUS', 'normal'),
+    'busy_timeout': int(os.environ.get('WOY_SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': int(os.environ.get('WOY_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
 }
 
 
@@ -128,3 +178,87 @@ STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Versioned response cache for the ring list endpoints (see woy/cache.py).
+# 'lru' keeps rendered bodies in process; 'django' stores them in CACHE_ALIAS
+# so that several workers share entries. Either way the dataset version is a
+# database row, so every worker and management command shares invalidations.
+# Compressed variants count as entries of their own.
+WOY_RESPONSE_CACHE = {
+    'BACKEND': 'lru',
+    'MAX_ENTRIES': 384,
+    'CACHE_ALIAS': 'default',
+}
+
+# Response compression (see woy/compression.py). Cached list bodies are
+# compressed once per dataset version at PRECOMPRESSED_LEVELS, everything else
+# per request at STREAMING_LEVELS. 'br' needs the brotli package.
+WOY_COMPRESSION = {
+    'ENCODINGS': ['br', 'gzip'],
+    'MIN_LENGTH': 200,
+    'PRECOMPRESSED_LEVELS': {'br': 9, 'gzip': 9},
+    'STREAMING_LEVELS': {'br': 4, 'gzip': 6},
+}
+
+# Wheel images (see woy/rendering.py). Renders are stored as files under
+# CACHE_DIR, named by a hash of what they draw, and shared by every process;
+# set WOY_RENDER_CACHE_DIR to an empty string to use the response cache only.
+# The least recently used are deleted once they take more than MAX_BYTES.
+# Requested days are rounded to DAY_STEP and sizes up to one of SIZES.
+WOY_RENDER = {
+    'CACHE_DIR': os.environ.get('WOY_RENDER_CACHE_DIR', str(BASE_DIR / 'render-cache')),
+    'MAX_BYTES': int(os.environ.get('WOY_RENDER_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+    'MAX_SIZE': 2048,
+    'SIZES': [16, 32, 64, 128, 256, 512, 1024, 2048],
+    'DAY_STEP': 1 / 24,
+}
+
+# Where RingImage.image_path values (Flutter asset paths) are found
+IMAGE_SOURCE_DIRS = [BASE_DIR / 'frontend']
+
+# Sprite atlases of ring images (see woy/atlas.py). Image paths are relative
+# to the Flutter project; atlases are written to ATLAS_DIR under content-hashed
+# names and served from URL_PREFIX. An empty ATLAS_DIR disables them.
+WOY_ATLAS = {
+    'SOURCE_DIRS': IMAGE_SOURCE_DIRS,
+    'ATLAS_DIR': os.environ.get('WOY_ATLAS_DIR', str(BASE_DIR / 'atlases')),
+    'URL_PREFIX': '/api/ring-image-atlases/',
+    'CELL_SIZE': 128,
+    'MAX_ATLAS_SIZE': 2048,
+}
+
+# Width-bucketed WebP/PNG copies of ring images (see woy/derivatives.py),
+# stored under DIR by the hash of their source file and served as immutable.
+WOY_DERIVATIVES = {
+    'SOURCE_DIRS': IMAGE_SOURCE_DIRS,
+    'DIR': os.environ.get('WOY_DERIVATIVES_DIR', str(BASE_DIR / 'derivatives')),
+    'URL_PREFIX': '/api/ring-image-derivatives/',
+    'WIDTHS': [32, 64, 128, 256, 512, 1024],
+    'FORMATS': ['webp', 'png'],
+    'QUALITY': 80,
+}
+
+# Per-request Server-Timing header and woy.performance log lines. Set
+# SAMPLE_RATE (0 to 1) to also EXPLAIN the slowest queries of that fraction of
+# SAMPLED_VIEWS requests, logged on woy.performance.explain.
+WOY_PERFORMANCE = {
+    'ENABLED': True,
+    'SAMPLE_RATE': float(os.environ.get('WOY_PERFORMANCE_SAMPLE_RATE', '0')),
+    'SLOW_QUERY_COUNT': 3,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # One JSON line per request, at INFO: set WOY_PERFORMANCE_LOG_LEVEL=INFO to see them
+        'woy.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('WOY_PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import get_response_cache
+from .models import Ring, RingEra, RingImage, UserRingPreference, UserRingPreferenceVersion
+from .search import refresh_search_index
+
+
+# What the current bulk_ring_writes block has changed, if one is open
+_bulk_write = ContextVar('woy_bulk_write', default=None)
+
+
+class BulkWrite:
+    def __init__(self):
+        self.ring_data_changed = False
+        self.atlas_ring_ids = set()
+        self.derivative_image_ids = set()
+
+
+@contextmanager
+def bulk_ring_writes():
+    """
+    Mute the per-row signal handlers for a bulk write of rings, eras, images
+    or ring preferences, and act on what changed once, when the outermost
+    block exits: ring data is invalidated (``invalidate_ring_data`` inside the
+    block only notes the change) and atlases and derivatives are scheduled once
+    per ring or image. The block may span several transactions. Preference
+    versions are left to the caller.
+    """
+    if _bulk_write.get() is not None:
+        # Nested: the outermost block acts on everything
+        yield
+        return
+    state = BulkWrite()
+    token = _bulk_write.set(state)
+    try:
+        yield
+    finally:
+        _bulk_write.reset(token)
+        # Even after an error, as earlier transactions may have committed,
+        # unless an enclosing transaction is about to roll everything back
+        if not connection.needs_rollback:
+            finish_bulk_write(state)
+
+
+def finish_bulk_write(state):
+    if not (state.ring_data_changed or state.atlas_ring_ids or state.derivative_image_ids):
+        return
+    # Imported here, as woy.atlas uses invalidate_ring_data from this module
+    from .atlas import schedule_ring_atlas
+    from .derivatives import schedule_image_derivatives
+    with transaction.atomic():
+        if state.ring_data_changed:
+            invalidate_ring_data()
+        for ring_id in sorted(state.atlas_ring_ids):
+            schedule_ring_atlas(ring_id)
+        for image_id in sorted(state.derivative_image_ids):
+            schedule_image_derivatives(image_id)
+
+
+def invalidate_ring_data():
+    """Rebuild changed search documents and bump the dataset version, as part of the current transaction"""
+    state = _bulk_write.get()
+    if state is not None:
+        state.ring_data_changed = True
+        return
+    refresh_search_index()
+    # Committed with the rows it covers, so no reader can see the new version
+    # with the old rows
+    get_response_cache().invalidate()
+
+
+@receiver(post_save, sender=Ring)
+@receiver(post_delete, sender=Ring)
+@receiver(post_save, sender=RingEra)
+@receiver(post_delete, sender=RingEra)
+@receiver(post_save, sender=RingImage)
+@receiver(post_delete, sender=RingImage)
+def ring_data_changed(sender, **kwargs):
+    invalidate_ring_data()
+
+
+@receiver(post_save, sender=RingImage)
+@receiver(post_delete, sender=RingImage)
+def ring_image_changed(sender, instance, **kwargs):
+    state = _bulk_write.get()
+    if state is not None:
+        state.atlas_ring_ids.add(instance.ring_id)
+        return
+    from .atlas import schedule_ring_atlas
+    schedule_ring_atlas(instance.ring_id)
+
+
+@receiver(post_save, sender=RingImage)
+def ring_image_saved(sender, instance, **kwargs):
+    state = _bulk_write.get()
+    if state is not None:
+        state.derivative_image_ids.add(instance.id)
+        return
+    from .derivatives import schedule_image_derivatives
+    schedule_image_derivatives(instance.id)
+
+
+@receiver(post_save, sender=UserRingPreference)
+def ring_preference_saved(sender, instance, **kwargs):
+    if _bulk_write.get() is not None:
+        return
+    # Covers edits made outside update_rings (e.g. the admin), so per-user
+    # caches keyed on the preference version do not go stale
+    bumped = UserRingPreferenceVersion.objects.filter(user_id=instance.user_id).update(version=F('version') + 1)
+    if not bumped:
+        UserRingPreferenceVersion.objects.get_or_create(user_id=instance.user_id, defaults={'version': 1})
+
+
+@receiver(post_delete, sender=UserRingPreference)
+def ring_preference_deleted(sender, instance, **kwargs):
+    if _bulk_write.get() is not None:
+        return
+    # Never create a version row here: the user itself may be being deleted
+    UserRingPreferenceVersion.objects.filter(user_id=instance.user_id).update(version=F('version') + 1)
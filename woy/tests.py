@@ -0,0 +1,782 @@
+import importlib.util
+import io
+import os
+import re
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from .atlas import build_ring_atlas, get_config as get_atlas_config, resolve_source
+from .cache import DjangoCacheBackend, build_response_cache, get_dataset_version, get_response_cache
+from .db import check_connections
+from .loading import RingLoader
+from .rendering import RenderStore
+from .search import search_rings
+from .models import Ring, RingEra, RingImage, UserRingPreference, UserRingPreferenceVersion, round_significant
+from .serializers import RingEraSerializer, RingSerializer
+from .signals import invalidate_ring_data
+
+
+def create_rings(count, start=0, eras=3, images=2):
+    """``count`` rings of 12 ticks, each with ``eras`` eras and ``images`` images"""
+    rings = []
+    for number in range(start, start + count):
+        ring = Ring.objects.create(index=number, name=f'Ring {number}', number_of_ticks=12, is_public=number % 2 == 0)
+        for era in range(eras):
+            RingEra.objects.create(ring=ring, name=f'Era {era}', start_day=era * 4, end_day=era * 4 + 4)
+        for order in range(images):
+            RingImage.objects.create(ring=ring, image_path=f'assets/rings/{number}/{order}.png', order=order)
+        rings.append(ring)
+    return rings
+
+
+def prefer(user, rings):
+    """Add ``rings`` to the end of the user's wheel"""
+    offset = UserRingPreference.objects.filter(user=user).count()
+    UserRingPreference.objects.bulk_create(
+        UserRingPreference(user=user, ring=ring, display_order=offset + order) for order, ring in enumerate(rings)
+    )
+
+
+class RingListQueryCountTests(TestCase):
+    """Ring list endpoints fetch rings, eras and images in a fixed number of queries"""
+
+    paths = ['/api/rings/', '/api/rings/public/', '/api/user/rings/']
+
+    def setUp(self):
+        self.user = User.objects.create(username='demo')
+
+    def get(self, path):
+        response = self.client.get(path, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_grow_with_rings(self):
+        prefer(self.user, create_rings(2))
+        counts = {}
+        for path in self.paths:
+            # Rendered bodies are cached per dataset version; start from a miss
+            get_response_cache().invalidate()
+            with CaptureQueriesContext(connection) as queries:
+                self.get(path)
+            counts[path] = len(queries)
+
+        prefer(self.user, create_rings(20, start=2))
+        for path in self.paths:
+            with self.subTest(path=path):
+                get_response_cache().invalidate()
+                with self.assertNumQueries(counts[path]):
+                    response = self.get(path)
+                self.assertGreaterEqual(len(response.json()), 11)
+
+
+class ResponseCacheTests(TestCase):
+    """Bodies are cached per dataset version, which every process shares"""
+
+    def test_write_from_another_process_invalidates(self):
+        # A management command or another worker has a cache of its own
+        server, command = build_response_cache(), build_response_cache()
+        self.assertEqual(server.get_or_render('rings', lambda: b'old'), b'old')
+        self.assertEqual(server.get_or_render('rings', lambda: b'new'), b'old')
+
+        command.invalidate()
+        self.assertEqual(server.get_or_render('rings', lambda: b'new'), b'new')
+        self.assertEqual(server.backend.entry_count(), 1)
+
+    def test_django_cache_backend_async_access(self):
+        backend = DjangoCacheBackend()
+        async_to_sync(backend.aset)('rings', b'body')
+        self.assertEqual(async_to_sync(backend.aget)('rings'), b'body')
+        self.assertEqual(backend.get('rings'), b'body')
+
+    def test_ring_changes_bump_the_version(self):
+        cache = build_response_cache()
+        version = cache.version
+        ring, = create_rings(1, eras=1, images=0)
+        self.assertGreater(cache.version, version)
+
+        version = cache.version
+        ring.eras.first().delete()
+        self.assertGreater(cache.version, version)
+
+    def test_rolled_back_write_keeps_the_version(self):
+        cache = build_response_cache()
+        version = cache.version
+        try:
+            with transaction.atomic():
+                create_rings(1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(cache.version, version)
+
+
+class ConditionalTests(TestCase):
+    """List validators come from the dataset version, not from scanning the tables"""
+
+    def setUp(self):
+        create_rings(3)
+
+    def test_cache_hit_and_not_modified_read_only_the_version(self):
+        etag = self.client.get('/api/rings/', HTTP_ACCEPT='application/json')['ETag']
+        # One lookup for the validators and one for the cached body
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/rings/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/rings/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_sends_the_etag_of_the_compressed_body(self):
+        # /api/ring-eras/ is compressed by the middleware, /api/rings/ precompressed in the cache
+        for path in ('/api/ring-eras/', '/api/rings/'):
+            with self.subTest(path=path):
+                response = self.client.get(path, HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+                etag = response['ETag']
+                self.assertTrue(etag.startswith('W/"'), etag)
+
+                response = self.client.get(
+                    path, HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag,
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_writes_change_the_validators(self):
+        for path in ('/api/rings/', '/api/ring-eras/', '/api/ring-images/'):
+            with self.subTest(path=path):
+                etag = self.client.get(path, HTTP_ACCEPT='application/json')['ETag']
+                RingEra.objects.filter(ring__index=1).first().delete()
+                response = self.client.get(path, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+class QueryPlanTests(TestCase):
+    """API reads find and order their rows through indexes"""
+
+    # Ring search is left out: ranking by bm25() sorts the matches by score,
+    # which no index can provide
+    paths = [
+        '/api/rings/',
+        '/api/rings/public/',
+        '/api/rings/{ring}/',
+        '/api/rings/{ring}/images/?width=64',
+        '/api/rings/snapshot/?day=3',
+        '/api/rings/timeline/?start=0&days=7',
+        '/api/rings/alignments/?eras={era}',
+        '/api/ring-eras/',
+        '/api/ring-eras/{era}/',
+        '/api/ring-images/',
+        '/api/ring-images/{image}/',
+        '/api/user/rings/',
+        '/api/user/rings/preferences/',
+        '/api/user/rings/snapshot/?day=3',
+        '/api/user/rings/timeline/?start=0&days=7',
+        '/api/user/rings/calendar.ics?anchor=2025-01-01',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create(username='demo')
+        rings = create_rings(4)
+        prefer(self.user, rings[:3])
+        self.pks = {
+            'ring': rings[0].pk,
+            'era': rings[0].eras.first().pk,
+            'image': rings[0].images.first().pk,
+        }
+
+    def unindexed_steps(self, sql):
+        """Plan steps that sort in a temporary B-tree, or scan a whole table to filter it"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            steps = [row[-1] for row in cursor.fetchall()]
+        # Reading every row (the era index behind snapshots) is a scan by design
+        filtered = ' WHERE ' in sql
+        return [
+            step for step in steps
+            if step.startswith('USE TEMP B-TREE FOR ORDER BY') or (filtered and re.fullmatch(r'SCAN \w+', step))
+        ]
+
+    def test_endpoints_use_indexes(self):
+        for path in self.paths:
+            path = path.format(**self.pks)
+            with self.subTest(path=path):
+                get_response_cache().invalidate()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path, HTTP_ACCEPT='application/json')
+                self.assertEqual(response.status_code, 200)
+                for query in queries:
+                    if query['sql'].startswith('SELECT'):
+                        self.assertEqual(self.unindexed_steps(query['sql']), [], query['sql'])
+
+
+def load_settings(**environ):
+    """A fresh copy of woy/settings.py read with the given WOY_* environment"""
+    spec = importlib.util.spec_from_file_location('woy_settings_copy', Path(settings.BASE_DIR) / 'woy' / 'settings.py')
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(os.environ, environ):
+        spec.loader.exec_module(module)
+    return module
+
+
+class RingSearchTests(TestCase):
+    """Changed rings are reindexed once, when ring data is invalidated"""
+
+    def search(self, text):
+        return [row['name'] for row in search_rings(text)]
+
+    def test_bulk_created_eras_are_indexed_on_invalidation(self):
+        first, _ = create_rings(2, eras=0, images=0)
+        RingEra.objects.bulk_create(
+            RingEra(ring=first, name=f'Zebra {number}', start_day=number, end_day=number + 1) for number in range(50)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM woy_ring_search_dirty')
+            self.assertEqual(cursor.fetchone(), (1,))
+
+        invalidate_ring_data()
+
+        self.assertEqual(self.search('zebra'), ['Ring 0'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM woy_ring_search_dirty')
+            self.assertEqual(cursor.fetchone(), (0,))
+
+    def test_moved_eras_and_deleted_rings_leave_the_index(self):
+        first, second = create_rings(2, eras=0, images=0)
+        era = RingEra.objects.create(ring=first, name='Quokka', start_day=0, end_day=1)
+        self.assertEqual(self.search('quokka'), ['Ring 0'])
+
+        era.ring = second
+        era.save()
+        self.assertEqual(self.search('quokka'), ['Ring 1'])
+
+        second.delete()
+        self.assertEqual(self.search('quokka'), [])
+        self.assertEqual(self.search('ring'), ['Ring 0'])
+
+
+class DatabaseSettingsTests(TestCase):
+    """Connections are configured for the selected engine and checked before reuse"""
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+    @override_settings(WOY_SQLITE_PRAGMAS={**settings.WOY_SQLITE_PRAGMAS, 'journal_mode': 'wal'})
+    def test_sqlite_connections_use_the_configured_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # A file database of its own: in-memory test databases have no WAL
+            wrapper = connections['default'].__class__({**connection.settings_dict, 'NAME': str(Path(directory) / 'db.sqlite3')})
+            try:
+                with wrapper.cursor() as cursor:
+                    values = {}
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                        cursor.execute(f'PRAGMA {name}')
+                        values[name] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000})
+
+    def test_sqlite_settings(self):
+        database = load_settings(WOY_DB_ENGINE='sqlite', WOY_DB_NAME='woy.sqlite3', WOY_DB_CONN_MAX_AGE='30').DATABASES['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['NAME'], 'woy.sqlite3')
+        self.assertEqual(database['CONN_MAX_AGE'], 30)
+
+    def test_the_sample_database_keeps_its_journal_mode(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('WOY_DB_NAME', None)
+            os.environ.pop('WOY_SQLITE_JOURNAL_MODE', None)
+            self.assertIsNone(load_settings(WOY_DB_ENGINE='sqlite').WOY_SQLITE_PRAGMAS['journal_mode'])
+            self.assertEqual(
+                load_settings(WOY_DB_ENGINE='sqlite', WOY_DB_NAME='woy.sqlite3').WOY_SQLITE_PRAGMAS['journal_mode'], 'wal'
+            )
+            self.assertEqual(
+                load_settings(WOY_DB_ENGINE='sqlite', WOY_SQLITE_JOURNAL_MODE='wal').WOY_SQLITE_PRAGMAS['journal_mode'], 'wal'
+            )
+
+    def test_postgresql_settings(self):
+        environ = {
+            'WOY_DB_ENGINE': 'postgresql', 'WOY_DB_NAME': 'wheel', 'WOY_DB_USER': 'woy', 'WOY_DB_PASSWORD': 'secret',
+            'WOY_DB_HOST': 'db', 'WOY_DB_PORT': '6432', 'WOY_DB_CONN_MAX_AGE': '0',
+        }
+        database = load_settings(**environ).DATABASES['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(
+            {key: database[key] for key in ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT', 'CONN_MAX_AGE')},
+            {'NAME': 'wheel', 'USER': 'woy', 'PASSWORD': 'secret', 'HOST': 'db', 'PORT': '6432', 'CONN_MAX_AGE': 0},
+        )
+        self.assertIs(database['CONN_HEALTH_CHECKS'], True)
+
+    def test_health_check_closes_dropped_connections(self):
+        connection.ensure_connection()
+        for usable, closed in ((True, False), (False, True)):
+            with self.subTest(usable=usable), \
+                    mock.patch.dict(connection.settings_dict, CONN_HEALTH_CHECKS=True), \
+                    mock.patch.object(connection, 'is_usable', return_value=usable), \
+                    mock.patch.object(connection, 'close') as close:
+                check_connections(sender=None)
+            self.assertEqual(close.called, closed)
+
+    def test_health_check_closes_only_dropped_connections_that_opted_in(self):
+        # Stand-in connections, so the check is exercised whatever the backend
+        def fake_connection(is_open=True, checks=True, usable=True):
+            return mock.Mock(
+                connection=mock.sentinel.connection if is_open else None,
+                settings_dict={'CONN_HEALTH_CHECKS': checks},
+                **{'is_usable.return_value': usable},
+            )
+        dropped = fake_connection(usable=False)
+        alive = fake_connection()
+        not_open = fake_connection(is_open=False, usable=False)
+        opted_out = fake_connection(checks=False, usable=False)
+        with mock.patch('woy.db.connections') as handler:
+            handler.all.return_value = [dropped, alive, not_open, opted_out]
+            check_connections(sender=None)
+
+        dropped.close.assert_called_once_with()
+        for kept in (alive, not_open, opted_out):
+            kept.close.assert_not_called()
+        not_open.is_usable.assert_not_called()
+        opted_out.is_usable.assert_not_called()
+
+    def test_health_check_is_opt_in(self):
+        connection.ensure_connection()
+        with mock.patch.dict(connection.settings_dict, CONN_HEALTH_CHECKS=False), \
+                mock.patch.object(connection, 'is_usable', return_value=False) as is_usable, \
+                mock.patch.object(connection, 'close') as close:
+            check_connections(sender=None)
+        is_usable.assert_not_called()
+        close.assert_not_called()
+
+
+class AsyncViewTests(TestCase):
+    """The async views answer like their DRF counterparts"""
+
+    routes = [
+        ('rings/', {}), ('rings/public/', {}), ('rings/snapshot/', {'day': 3}),
+        ('user/rings/', {}), ('user/rings/snapshot/', {'day': 3}),
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create(username='demo')
+        prefer(self.user, create_rings(3))
+
+    async def test_routes_match_the_drf_endpoints(self):
+        client = AsyncClient()
+        for route, params in self.routes:
+            for renderer_format in ('json', 'lean'):
+                # In the path: Django 3.2's AsyncClient drops GET data and HTTP_* headers
+                path = f"{route}?{urlencode({**params, 'format': renderer_format})}"
+                with self.subTest(path=path):
+                    response = await client.get(f'/api/async/{path}')
+                    self.assertEqual(response.status_code, 200)
+                    expected = await sync_to_async(self.client.get)(f'/api/{path}')
+                    self.assertEqual(response.content, expected.content)
+                    self.assertEqual(response['Content-Type'], expected['Content-Type'])
+
+    async def test_only_get_is_allowed(self):
+        response = await AsyncClient().post('/api/async/rings/')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET')
+
+
+class RingLoaderTests(TestCase):
+    """Declarative loading upserts rings by name"""
+
+    def test_prune_keeps_rings_with_invalid_definitions(self):
+        create_rings(3)
+        loader = RingLoader()
+        loader.load([
+            {'name': 'Ring 0', 'index': 0, 'number_of_ticks': 12},
+            # Ends before it starts: skipped, but still in the source
+            {'name': ' Ring 1 ', 'index': 1, 'number_of_ticks': 12,
+             'eras': [{'name': 'Backwards', 'start_day': '6', 'end_day': '2'}]},
+        ])
+        loader.prune()
+
+        self.assertEqual(loader.stats['invalid'], 1)
+        self.assertEqual(loader.stats['rings_deleted'], 1)
+        self.assertEqual(sorted(Ring.objects.values_list('name', flat=True)), ['Ring 0', 'Ring 1'])
+        self.assertEqual(RingEra.objects.filter(ring__name='Ring 1').count(), 3)
+
+    def test_rings_can_move_onto_indexes_freed_in_the_same_batch(self):
+        create_rings(2, eras=0, images=0)
+        RingLoader().load([
+            {'name': 'Ring 0', 'index': 3, 'number_of_ticks': 12},
+            {'name': 'Ring 1', 'index': 2, 'number_of_ticks': 12},
+        ])
+        RingLoader().load([
+            {'name': 'Ring 0', 'index': 2, 'number_of_ticks': 12},
+            {'name': 'Ring 1', 'index': 3, 'number_of_ticks': 12},
+        ])
+
+        self.assertEqual(list(Ring.objects.order_by('name').values_list('index', flat=True)), [2, 3])
+
+    def test_a_load_invalidates_ring_data_once(self):
+        create_rings(3)
+        version, _ = get_dataset_version()
+        loader = RingLoader(batch_size=1)
+        with CaptureQueriesContext(connection) as queries:
+            loader.load([
+                # Drops two eras each and replaces the images, across three batches
+                {'name': f'Ring {number}', 'index': number, 'number_of_ticks': 12,
+                 'eras': [{'name': 'Era 0', 'start_day': '0', 'end_day': '4'}], 'images': ['a.png']}
+                for number in range(3)
+            ])
+
+        self.assertEqual(loader.stats['eras_deleted'], 6)
+        self.assertEqual(get_dataset_version()[0], version + 1)
+        bumps = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "woy_datasetversion"')]
+        self.assertEqual(len(bumps), 1)
+
+    def test_prune_bumps_the_preference_version_of_affected_users(self):
+        rings = create_rings(3, eras=0, images=0)
+        user = User.objects.create(username='pruned')
+        prefer(user, rings[1:])
+        UserRingPreferenceVersion.objects.create(user=user, version=4)
+        loader = RingLoader()
+        loader.load([{'name': 'Ring 0', 'index': 0, 'number_of_ticks': 12}])
+        loader.prune()
+
+        self.assertEqual(loader.stats['rings_deleted'], 2)
+        self.assertFalse(UserRingPreference.objects.filter(user=user).exists())
+        self.assertEqual(UserRingPreferenceVersion.objects.get(user=user).version, 5)
+
+
+class LoadAdditionalRingsTests(TestCase):
+    """Generated rings are inserted as raw rows"""
+
+    def test_rows_read_back_as_saved_rings(self):
+        create_rings(1, eras=0, images=0)
+        version, _ = get_dataset_version()
+        call_command('load_additional_rings', count=5, seed=1, stdout=io.StringIO())
+
+        self.assertEqual(get_dataset_version()[0], version + 1)
+        rings = list(Ring.objects.filter(index__gte=1).order_by('index'))
+        self.assertEqual(len(rings), 5)
+        for ring in rings:
+            self.assertEqual(ring.inner_radius_float, round_significant(ring.inner_radius))
+            eras = list(ring.eras.order_by('start_day'))
+            self.assertEqual(eras[0].start_day, 0)
+            self.assertEqual(eras[-1].end_day, ring.number_of_ticks)
+            for era in eras:
+                self.assertEqual(era.start_day_float, round_significant(era.start_day))
+                self.assertEqual(era.end_day_float, round_significant(era.end_day))
+            self.assertIn(ring.id, [row['id'] for row in search_rings(ring.name, limit=100)])
+
+
+class ExportImportTests(TestCase):
+    """import_rings reads back whatever export_rings writes"""
+
+    def setUp(self):
+        create_rings(3)
+        # Shapes the models allow though hand-written definitions may not use them
+        moon = Ring.objects.create(index=10, name='Moon Phases', number_of_ticks=8, description=' padded ')
+        RingEra.objects.create(ring=moon, name='hmm', start_day=0, end_day=365)
+        RingEra.objects.create(ring=moon, name='hmm', start_day=2, end_day=3, color='#abc')
+        RingImage.objects.create(ring=moon, image_path='assets/moon.png')
+        Ring.objects.create(index=11, name='Moon Phases', base_color='')
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = str(Path(directory.name) / 'rings.ndjson')
+
+    def export(self):
+        call_command('export_rings', self.path, stderr=io.StringIO())
+        return Path(self.path).read_text()
+
+    def import_rings(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_rings', self.path, *args, stdout=stdout, stderr=stderr)
+        self.assertEqual(stderr.getvalue(), '')
+        return stdout.getvalue()
+
+    def test_round_trip_into_an_empty_database(self):
+        exported = self.export()
+        Ring.objects.all().delete()
+
+        self.assertIn('Loaded rings: 5 inserted', self.import_rings())
+        self.assertEqual(self.export(), exported)
+
+    def test_reimport_with_prune_changes_nothing(self):
+        exported = self.export()
+        ids = sorted(Ring.objects.values_list('id', flat=True))
+
+        output = self.import_rings('--prune')
+        self.assertIn('Loaded rings: 0 inserted, 0 updated, 5 unchanged, 0 deleted, 0 invalid', output)
+        self.assertEqual(sorted(Ring.objects.values_list('id', flat=True)), ids)
+        self.assertEqual(self.export(), exported)
+
+
+class RingPreferenceUpdateTests(TestCase):
+    """update_rings writes a diff and bumps the preference version once"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='demo')
+        self.rings = create_rings(5, eras=0, images=0)
+
+    def update(self, ring_ids, version=None):
+        data = {'ring_ids': ring_ids} if version is None else {'ring_ids': ring_ids, 'version': version}
+        response = self.client.post('/api/user/rings/update/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['version']
+
+    def test_removing_rings_bumps_the_version_once(self):
+        ids = [ring.id for ring in self.rings]
+        self.assertEqual(self.update(ids), 1)
+
+        self.assertEqual(self.update([ids[4], ids[0]], version=1), 2)
+        self.assertEqual(UserRingPreferenceVersion.objects.get(user=self.user).version, 2)
+        self.assertEqual(
+            list(UserRingPreference.objects.filter(user=self.user).values_list('ring_id', flat=True)),
+            [ids[4], ids[0]],
+        )
+
+    def test_admin_style_delete_still_bumps_the_version(self):
+        self.update([ring.id for ring in self.rings])
+        UserRingPreference.objects.filter(user=self.user).first().delete()
+        self.assertEqual(UserRingPreferenceVersion.objects.get(user=self.user).version, 2)
+
+
+def significant(value):
+    return float('{:.5g}'.format(float(value)))
+
+
+class ReferenceRingEraSerializer(serializers.ModelSerializer):
+    """RingEraSerializer as it was: method fields rounding the decimals on every read"""
+    start_day_float = serializers.SerializerMethodField()
+    end_day_float = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RingEra
+        fields = ['id', 'ring', 'name', 'description', 'start_day', 'end_day', 'color', 'start_day_float', 'end_day_float']
+
+    def get_start_day_float(self, obj):
+        return significant(obj.start_day)
+
+    def get_end_day_float(self, obj):
+        return significant(obj.end_day)
+
+
+class ReferenceRingSerializer(serializers.ModelSerializer):
+    """RingSerializer as it was, before the stored float columns and fast path"""
+    eras = ReferenceRingEraSerializer(many=True, read_only=True)
+    images = serializers.SerializerMethodField()
+    baseColor = serializers.SerializerMethodField()
+    innerRadius = serializers.SerializerMethodField()
+    numberOfTicks = serializers.SerializerMethodField()
+    useImages = serializers.SerializerMethodField()
+    imageAssets = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Ring
+        fields = ['id', 'index', 'name', 'inner_radius', 'thickness', 'number_of_ticks',
+                  'base_color', 'use_images', 'eras', 'images', 'baseColor', 'innerRadius',
+                  'numberOfTicks', 'useImages', 'imageAssets']
+
+    def get_images(self, obj):
+        return [
+            {'id': image.id, 'ring': image.ring_id, 'image_path': image.image_path, 'order': image.order}
+            for image in obj.images.order_by('order')
+        ]
+
+    def get_baseColor(self, obj):
+        return obj.base_color
+
+    def get_innerRadius(self, obj):
+        return significant(obj.inner_radius)
+
+    def get_numberOfTicks(self, obj):
+        return obj.number_of_ticks
+
+    def get_useImages(self, obj):
+        return obj.use_images
+
+    def get_imageAssets(self, obj):
+        return list(obj.images.order_by('order').values_list('image_path', flat=True))
+
+
+class SerializerOutputTests(TestCase):
+    """The serializer fast path renders exactly what the method fields did"""
+
+    # Values whose 5 significant digit rounding is easy to get wrong
+    days = ['0', '0.0000123456789', '1.000005', '99.999949', '123.456789', '364.9999999999', '12345.678', '99999.99999']
+
+    def setUp(self):
+        radii = ['50', '0.333333333', '123.4567890123', '99999.5']
+        for number, radius in enumerate(radii):
+            ring = Ring.objects.create(index=number, name=f'Ring {number}', inner_radius=Decimal(radius), thickness=Decimal('7.25'))
+            for era, (start, end) in enumerate(zip(self.days, self.days[1:])):
+                RingEra.objects.create(ring=ring, name=f'Era {era}', start_day=Decimal(start), end_day=Decimal(end))
+            for order in (2, 0, 1):
+                RingImage.objects.create(ring=ring, image_path=f'assets/{number}/{order}.png', order=order)
+
+    def assertSameJSON(self, data, expected):
+        self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(expected))
+
+    def test_rings_match_the_method_fields(self):
+        rings = Ring.objects.order_by('index')
+        self.assertSameJSON(
+            RingSerializer(rings.with_eras_and_images(), many=True).data,
+            ReferenceRingSerializer(rings, many=True).data,
+        )
+
+    def test_eras_match_the_method_fields(self):
+        eras = RingEra.objects.order_by('id')
+        self.assertSameJSON(RingEraSerializer(eras, many=True).data, ReferenceRingEraSerializer(eras, many=True).data)
+
+    def test_sparse_fields_match_the_full_representation(self):
+        fields = ['id', 'innerRadius', 'eras', 'imageAssets']
+        full = self.client.get('/api/rings/', HTTP_ACCEPT='application/json').json()
+        sparse = self.client.get(f"/api/rings/?fields={','.join(fields)}", HTTP_ACCEPT='application/json').json()
+        self.assertEqual(sparse, [{name: ring[name] for name in fields} for ring in full])
+
+    def test_loader_updates_keep_the_rounded_columns(self):
+        loader = RingLoader()
+        loader.load([{
+            'name': 'Ring 0', 'index': 0, 'inner_radius': '61.234567', 'number_of_ticks': 365,
+            'eras': [{'name': 'Era 0', 'start_day': '1.2345678', 'end_day': '200.00049'}],
+        }])
+        self.assertEqual(loader.stats['rings_updated'], 1)
+        ring = Ring.objects.filter(name='Ring 0')
+        self.assertSameJSON(
+            RingSerializer(ring.with_eras_and_images(), many=True).data,
+            ReferenceRingSerializer(ring, many=True).data,
+        )
+
+
+class RingIndexTests(TestCase):
+    """Ring indexes are unique"""
+
+    def test_creating_a_ring_with_a_taken_index_is_rejected(self):
+        create_rings(1, eras=0, images=0)
+        response = self.client.post('/api/rings/', {'index': 0, 'name': 'Clash'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('index', response.json())
+        self.assertEqual(Ring.objects.count(), 1)
+
+    def test_updating_a_ring_keeps_its_own_index(self):
+        ring, = create_rings(1, eras=0, images=0)
+        response = self.client.put(
+            f'/api/rings/{ring.id}/', {'index': 0, 'name': 'Renamed'}, content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Ring.objects.get().name, 'Renamed')
+
+
+class RingEraSetTests(TestCase):
+    """A ring's whole era set is written in one request"""
+
+    def test_replacing_eras_invalidates_ring_data_once(self):
+        ring, = create_rings(1, eras=3, images=0)
+        version, _ = get_dataset_version()
+        eras = [{'name': 'Wombat', 'start_day': '0', 'end_day': '6'}, {'name': 'Numbat', 'start_day': '6', 'end_day': '12'}]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f'/api/rings/{ring.id}/eras/', eras, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([era['name'] for era in response.json()], ['Wombat', 'Numbat'])
+        self.assertEqual(get_dataset_version()[0], version + 1)
+        bumps = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "woy_datasetversion"')]
+        self.assertEqual(len(bumps), 1)
+        self.assertEqual([row['id'] for row in search_rings('numbat')], [ring.id])
+        self.assertEqual(search_rings('era'), [])
+
+
+class RenderStoreTests(TestCase):
+    """Wheel renders are bounded in number and in bytes"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_days_and_sizes_are_rounded_before_rendering(self):
+        ring, = create_rings(1)
+        render = {**settings.WOY_RENDER, 'CACHE_DIR': str(self.directory)}
+        with override_settings(WOY_RENDER=render):
+            bodies = {
+                self.client.get(f'/api/rings/wheel.svg?rings={ring.pk}&day={day}&size={size}').content
+                for day, size in ((3, 512), (3.001, 512), (2.99, 300), (3 + 1 / 24 / 3, 257))
+            }
+        self.assertEqual(len(bodies), 1)
+        self.assertIn(b'width="512"', bodies.pop())
+        self.assertEqual(len(list(self.directory.glob('*/*.svg'))), 1)
+
+    def test_least_recently_used_renders_are_evicted(self):
+        store = RenderStore(self.directory)
+        for number in range(4):
+            store.set(f'{number:064x}', 'png', bytes(1000))
+            # Modification times one second apart, oldest first
+            os.utime(store.path(f'{number:064x}', 'png'), (number, number))
+        # Reading the oldest render makes it the most recently used
+        self.assertEqual(store.get(f'{0:064x}', 'png'), bytes(1000))
+
+        store.max_bytes = 3000
+        self.assertEqual(store.evict(), 2)
+        kept = {path.stem for path in self.directory.glob('*/*.png')}
+        self.assertEqual(kept, {f'{0:064x}', f'{3:064x}'})
+
+    def test_writes_sweep_the_store(self):
+        store = RenderStore(self.directory, max_bytes=3000)
+        for number in range(10):
+            store.set(f'{number:064x}', 'svg', bytes(1000))
+        self.assertLessEqual(sum(path.stat().st_size for path in self.directory.glob('*/*.svg')), 3000)
+
+
+class RingAtlasTests(TestCase):
+    """Building a ring's atlas changes what its endpoints send, so it changes their validators"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        self.ring, = create_rings(1)
+        for image in self.ring.images.all():
+            path = root / 'frontend' / image.image_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            Image.new('RGBA', (8, 8), (255, 0, 0, 255)).save(path)
+        self.root = root
+        atlas = {**settings.WOY_ATLAS, 'SOURCE_DIRS': [root / 'frontend'], 'ATLAS_DIR': str(root / 'atlases')}
+        override = override_settings(WOY_ATLAS=atlas)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_building_an_atlas_changes_the_validators(self):
+        paths = [f'/api/rings/{self.ring.pk}/?images=atlas', '/api/rings/?images=atlas']
+        etags = {path: self.client.get(path, HTTP_ACCEPT='application/json')['ETag'] for path in paths}
+        updated_at = self.ring.updated_at
+
+        self.assertTrue(build_ring_atlas(self.ring))
+        self.ring.refresh_from_db()
+        self.assertGreater(self.ring.updated_at, updated_at)
+        for path in paths:
+            with self.subTest(path=path):
+                response = self.client.get(path, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etags[path])
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('imageAtlas', response.content.decode())
+
+    def test_sources_outside_the_source_directories_are_ignored(self):
+        Image.new('RGBA', (8, 8)).save(self.root / 'outside.png')
+        config = get_atlas_config()
+        image_path = self.ring.images.first().image_path
+
+        self.assertEqual(resolve_source(image_path, config), (self.root / 'frontend' / image_path).resolve())
+        self.assertIsNone(resolve_source('../outside.png', config))
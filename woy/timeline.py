@@ -0,0 +1,119 @@
+"""
+Vectorized multi-day timelines: a day x ring matrix of active era IDs.
+
+The per-ring boundary arrays from ``woy.intervals`` are concatenated into one
+sorted NumPy array by shifting each ring's boundaries by a per-ring offset
+larger than any cycle. A whole day x ring grid of in-cycle positions is then
+shifted the same way and resolved with a single ``searchsorted`` call.
+
+The matrix holds era IDs, with ``-1`` where a day falls in a gap between eras.
+Era names and colors are returned once in a lookup table instead of being
+repeated for every day.
+"""
+import threading
+
+import numpy as np
+
+from .intervals import get_era_index
+
+NO_ERA = -1
+MAX_DAYS = 36600
+
+
+class TimelineIndex:
+    """Concatenated era boundaries for every ring in an EraIndex"""
+
+    def __init__(self, era_index):
+        self.era_index = era_index
+        self.ring_ids = list(era_index.rings)
+        self.columns = {ring_id: column for column, ring_id in enumerate(self.ring_ids)}
+
+        rings = [era_index.rings[ring_id] for ring_id in self.ring_ids]
+        self.ticks = np.array([ring.number_of_ticks for ring in rings], dtype=np.float64)
+        # Offsets leave room for a full cycle per ring, so shifted boundaries of
+        # consecutive rings never interleave
+        span = max(float(self.ticks.max(initial=0)), 0.0) + 1.0
+        self.offsets = np.arange(len(rings), dtype=np.float64) * span
+
+        boundaries = []
+        era_ids = []
+        for ring, offset in zip(rings, self.offsets):
+            # Rings without a usable cycle still get one "no era" segment
+            ring_boundaries = ring.boundaries or [0.0]
+            ring_era_ids = ring.era_ids or [None]
+            boundaries.append(np.asarray(ring_boundaries, dtype=np.float64) + offset)
+            era_ids.append(np.array([NO_ERA if era_id is None else era_id for era_id in ring_era_ids], dtype=np.int64))
+        self.boundaries = np.concatenate(boundaries) if boundaries else np.empty(0)
+        self.era_ids = np.concatenate(era_ids) if era_ids else np.empty(0, dtype=np.int64)
+
+    def matrix(self, start, days, ring_ids=None):
+        """
+        Return ``(ring_ids, matrix)`` where ``matrix[d, r]`` is the era active on
+        day ``start + d`` in ring ``ring_ids[r]``.
+        """
+        if ring_ids is None:
+            columns = np.arange(len(self.ring_ids))
+        else:
+            # Keep ring display order, like EraIndex.snapshot
+            wanted = set(ring_ids)
+            columns = np.array([column for column, ring_id in enumerate(self.ring_ids) if ring_id in wanted], dtype=np.int64)
+        selected_ids = [self.ring_ids[column] for column in columns]
+        if len(columns) == 0 or days <= 0:
+            return selected_ids, np.empty((max(days, 0), len(columns)), dtype=np.int64)
+
+        # Work ring-major so each searchsorted run scans one ring's boundaries,
+        # then hand back the day-major view
+        ticks = self.ticks[columns][:, None]
+        has_cycle = ticks > 0
+        day_numbers = start + np.arange(days, dtype=np.float64)
+        positions = np.where(has_cycle, np.mod(day_numbers, np.where(has_cycle, ticks, 1.0)), 0.0)
+        positions += self.offsets[columns][:, None]
+
+        slots = np.searchsorted(self.boundaries, positions, side='right') - 1
+        return selected_ids, self.era_ids[slots].T
+
+    def era_table(self, matrix):
+        """Lookup table for the eras that appear in ``matrix``"""
+        eras = self.era_index.eras
+        table = {}
+        for era_id in np.unique(matrix).tolist():
+            if era_id == NO_ERA:
+                continue
+            era = eras[era_id]
+            table[str(era_id)] = {
+                'ring': era['ring_id'],
+                'name': era['name'],
+                'color': era['color'],
+            }
+        return table
+
+    def timeline(self, start, days, ring_ids=None):
+        """Compact, JSON-ready timeline for ``days`` days from ``start``"""
+        selected_ids, matrix = self.matrix(start, days, ring_ids)
+        return {
+            'start': start,
+            'days': days,
+            'rings': selected_ids,
+            'eras': self.era_table(matrix),
+            'timeline': matrix.tolist(),
+        }
+
+
+_timeline_index = None
+_timeline_index_lock = threading.Lock()
+
+
+def get_timeline_index():
+    """Return the timeline index matching the current era index"""
+    global _timeline_index
+    era_index = get_era_index()
+    if _timeline_index is None or _timeline_index.era_index is not era_index:
+        with _timeline_index_lock:
+            if _timeline_index is None or _timeline_index.era_index is not era_index:
+                _timeline_index = TimelineIndex(era_index)
+    return _timeline_index
+
+
+def build_timeline(start, days, ring_ids=None):
+    """Timeline of active era IDs for ``days`` days from absolute day ``start``"""
+    return get_timeline_index().timeline(start, days, ring_ids)
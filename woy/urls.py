@@ -16,7 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RingViewSet, RingEraViewSet, RingImageViewSet, UserRingViewSet, UserViewSet
+from . import async_views
+from .views import (
+    RingViewSet, RingEraViewSet, RingImageViewSet, UserRingViewSet, UserViewSet, CacheViewSet,
+    ring_image_atlas, ring_image_derivative, user_ring_calendar, user_wheel_image, wheel_image,
+)
 
 router = DefaultRouter()
 router.register(r'rings', RingViewSet)
@@ -24,8 +28,25 @@ router.register(r'ring-eras', RingEraViewSet)
 router.register(r'ring-images', RingImageViewSet)
 router.register(r'user/rings', UserRingViewSet, basename='user-rings')
 router.register(r'user', UserViewSet, basename='user')
+router.register(r'cache', CacheViewSet, basename='cache')
+
+# Async read endpoints for ASGI deployments (see woy/async_views.py)
+async_urlpatterns = [
+    path('rings/', async_views.ring_list, name='async-ring-list'),
+    path('rings/public/', async_views.public_rings, name='async-ring-public'),
+    path('rings/snapshot/', async_views.ring_snapshot, name='async-ring-snapshot'),
+    path('user/rings/', async_views.user_ring_list, name='async-user-rings-list'),
+    path('user/rings/snapshot/', async_views.user_ring_snapshot, name='async-user-rings-snapshot'),
+]
 
 urlpatterns = [
+    path('api/async/', include(async_urlpatterns)),
+    # Outside the router, which would add a trailing slash and content negotiation
+    path('api/user/rings/calendar.ics', user_ring_calendar, name='user-rings-calendar'),
+    path('api/rings/wheel.<str:image_format>', wheel_image, name='ring-wheel'),
+    path('api/user/rings/wheel.<str:image_format>', user_wheel_image, name='user-rings-wheel'),
+    path('api/ring-image-atlases/<str:name>', ring_image_atlas, name='ring-image-atlas'),
+    path('api/ring-image-derivatives/<str:digest>/<str:name>', ring_image_derivative, name='ring-image-derivative'),
     path('api/', include(router.urls)),
     path('admin/', admin.site.urls),
 ]
@@ -1,18 +1,50 @@
 # views.py
+import math
+from datetime import date
+from pathlib import Path
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from django.http import FileResponse, Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import require_GET
 from django.contrib.auth.models import User
 from django.db import transaction
-from .models import Ring, RingEra, RingImage, UserRingPreference
+from django.db.models import F
+from .alignment import MAX_COUNT, MAX_HORIZON, find_alignments
+from .atlas import ATLAS_NAME, FORMATS as ATLAS_FORMATS, get_config as get_atlas_config
+from .cache import get_response_cache
+from .compression import encoded_response, negotiate_encoding
+from .derivatives import (
+    DERIVATIVE_NAME, DIGEST, FORMATS as DERIVATIVE_FORMATS, derivative_dir,
+    get_config as get_derivative_config, image_variant,
+)
+from .instrumentation import timed
+from .conditional import conditional, model_state, ring_dataset_state, ring_state, user_ring_state
+from .eras import write_eras
+from .ics import MAX_CACHED_BYTES, MAX_YEARS, add_years, calendar_eras, iter_calendar
+from .intervals import get_era_index
+from .timeline import MAX_DAYS, build_timeline
+from .models import Ring, RingEra, RingImage, UserRingPreference, UserRingPreferenceVersion
+from .renderers import LeanJSONRenderer
+from .search import MAX_LIMIT as MAX_SEARCH_LIMIT, query_words, search_rings
+from .rendering import (
+    FORMATS, MAX_RINGS, MIN_SIZE, get_config as get_render_config, render_wheel, round_day, round_size,
+)
 from .serializers import (
+    LeanRingSerializer,
     RingSerializer, 
     RingEraSerializer, 
     RingImageSerializer,
+    RingEraSetSerializer,
     UserRingPreferenceSerializer,
     UserRingUpdateSerializer
 )
+from .signals import bulk_ring_writes
 
 # Add a simple user serializer
 from rest_framework import serializers
@@ -34,44 +66,435 @@ class UserViewSet(viewsets.ViewSet):
         serializer = UserSerializer(user)
         return Response(serializer.data)
 
-class RingViewSet(viewsets.ModelViewSet):
-    queryset = Ring.objects.all().order_by('index')
+def get_preference_version(user):
+    """Current ring preference version for a user (0 before the first update)"""
+    version = UserRingPreferenceVersion.objects.filter(user=user).values_list('version', flat=True).first()
+    return version or 0
+
+def parse_day(request):
+    """Read the (possibly fractional) ``day`` query parameter, or None if invalid"""
+    try:
+        day = float(request.query_params.get('day', 0))
+    except ValueError:
+        return None
+    return day if math.isfinite(day) else None
+
+def parse_timeline_range(request):
+    """Read ``start`` and ``days`` for a timeline, or None if invalid"""
+    try:
+        start = float(request.query_params.get('start', 0))
+        days = int(request.query_params.get('days', 365))
+    except ValueError:
+        return None
+    if not math.isfinite(start) or not 0 < days <= MAX_DAYS:
+        return None
+    return start, days
+
+def parse_alignment_query(request):
+    """Read ``start``, ``count`` and ``horizon`` for alignments, or None if invalid"""
+    try:
+        start = float(request.query_params.get('start', 0))
+        count = int(request.query_params.get('count', 10))
+        horizon = float(request.query_params.get('horizon', 36525))
+    except ValueError:
+        return None
+    if not math.isfinite(start) or not 0 < count <= MAX_COUNT or not 0 < horizon <= MAX_HORIZON:
+        return None
+    return start, count, horizon
+
+def parse_search_query(request):
+    """Read ``q``, ``offset`` and ``limit`` for a search, or None if invalid"""
+    text = request.query_params.get('q', '')
+    try:
+        offset = int(request.query_params.get('offset', 0))
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        return None
+    if not query_words(text) or offset < 0 or not 0 < limit <= MAX_SEARCH_LIMIT:
+        return None
+    return text, offset, limit
+
+def parse_calendar_range(params):
+    """Read the ``anchor`` date (default today) and ``years`` for a calendar, or None if invalid"""
+    try:
+        anchor = date.fromisoformat(params['anchor']) if params.get('anchor') else timezone.now().date()
+        years = int(params.get('years', 1))
+    except ValueError:
+        return None
+    if not 0 < years <= MAX_YEARS:
+        return None
+    return anchor, years
+
+def parse_wheel_query(params):
+    """Read ``day`` and ``size`` for a wheel image, rounded as rendered, or None if invalid"""
+    try:
+        day = float(params.get('day', 0))
+        size = int(params.get('size', 512))
+    except ValueError:
+        return None
+    if not math.isfinite(day) or not MIN_SIZE <= size <= get_render_config()['MAX_SIZE']:
+        return None
+    return round_day(day), round_size(size)
+
+# Widest image a client may ask for, in pixels
+MAX_IMAGE_WIDTH = 4096
+
+def parse_image_query(request, thickness):
+    """
+    Read the on-screen ``width`` an image needs (or ``scale``, pixels per unit
+    of ring ``thickness``) and the ``image_format``, or None if invalid. The
+    format defaults to the first configured one the client's Accept allows.
+    """
+    params = request.query_params
+    try:
+        if 'width' in params:
+            width = int(params['width'])
+        else:
+            width = math.ceil(float(thickness) * float(params.get('scale', 1)))
+    except (ValueError, OverflowError):
+        return None
+    if not 0 < width <= MAX_IMAGE_WIDTH:
+        return None
+
+    formats = get_derivative_config()['FORMATS']
+    image_format = params.get('image_format')
+    if image_format is None:
+        accept = request.headers.get('Accept', '')
+        # PNG is the fallback every client can draw
+        image_format = next((name for name in formats if DERIVATIVE_FORMATS[name] in accept), formats[-1])
+    return (width, image_format) if image_format in formats else None
+
+def image_query_error():
+    return Response(
+        {'error': f'width must be an integer from 1 to {MAX_IMAGE_WIDTH} (or scale a positive number) '
+                  f"and image_format one of {', '.join(get_derivative_config()['FORMATS'])}"},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+def list_cache_key(key, renderer_format):
+    """Response cache key for a list body; ``?format=`` alone does not cover Accept negotiation"""
+    return f'{key}:format={renderer_format}'
+
+class CachedListMixin:
+    """Serve JSON list responses, precompressed, from the versioned response cache"""
+
+    def cached_list_response(self, request, queryset, key=None):
+        """
+        Serialize ``queryset`` through ``self.get_serializer``, caching the JSON
+        body under ``key`` (default: the request path) and the dataset version.
+        """
+        # The browsable API and other renderers bypass the cache
+        if request.accepted_renderer.format not in ('json', 'lean'):
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+
+        def render():
+            data = self.get_serializer(queryset, many=True).data
+            with timed('render'):
+                return JSONRenderer().render(data)
+
+        key = list_cache_key(key or request.get_full_path(), request.accepted_renderer.format)
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        body = get_response_cache().get_or_render(key, render, encoding=encoding)
+        return encoded_response(body, request.accepted_renderer.media_type, encoding)
+
+class RingViewSet(CachedListMixin, viewsets.ModelViewSet):
+    queryset = Ring.objects.all().order_by('index').with_eras_and_images()
     serializer_class = RingSerializer
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, LeanJSONRenderer]
+
+    def get_serializer_class(self):
+        # ?format=lean selects the compact read-only representation
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if self.request.method == 'GET' and getattr(renderer, 'format', None) == 'lean':
+            return LeanRingSerializer
+        return super().get_serializer_class()
+
+    @conditional(ring_dataset_state)
+    def list(self, request, *args, **kwargs):
+        return self.cached_list_response(request, self.get_queryset())
+
+    @conditional(ring_state)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
     
     @action(detail=False, methods=['get'])
+    @conditional(ring_dataset_state)
     def public(self, request):
-        public_rings = Ring.objects.filter(is_public=True).order_by('index')
-        serializer = self.get_serializer(public_rings, many=True)
-        return Response(serializer.data)
+        public_rings = Ring.objects.filter(is_public=True).order_by('index').with_eras_and_images()
+        return self.cached_list_response(request, public_rings)
+
+    @action(detail=True, methods=['put', 'patch'], url_path='eras')
+    def eras(self, request, pk=None):
+        """Replace (PUT) or patch (PATCH) the ring's era set in one transaction"""
+        ring = get_object_or_404(Ring, pk=pk)
+        partial = request.method == 'PATCH'
+
+        # A bare list is shorthand for {"eras": [...]}
+        data = {'eras': request.data} if isinstance(request.data, list) else request.data
+        serializer = RingEraSetSerializer(data=data, partial=partial)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        eras = write_eras(
+            ring,
+            serializer.validated_data.get('eras', []),
+            partial=partial,
+            allow_gaps=serializer.validated_data.get('allow_gaps', False),
+        )
+        return Response(RingEraSerializer(eras, many=True, context={'request': request}).data)
+
+    @action(detail=True, methods=['get'], url_path='images')
+    def image_variants(self, request, pk=None):
+        """Get the URL of each of the ring's images at the size they take on screen"""
+        ring = get_object_or_404(Ring, pk=pk)
+        query = parse_image_query(request, ring.thickness)
+        if query is None:
+            return image_query_error()
+
+        width, image_format = query
+        config = get_derivative_config()
+        images = []
+        for image in RingImage.objects.filter(ring=ring).order_by('order', 'id'):
+            # Images without derivatives yet fall back to their source path
+            variant = image_variant(image, width, image_format, config)
+            url, variant_width, variant_height = variant or (image.image_path, image.width, image.height)
+            images.append({
+                'id': image.id,
+                'order': image.order,
+                'url': url,
+                'width': variant_width,
+                'height': variant_height,
+            })
+        response = Response({'ring': ring.id, 'width': width, 'image_format': image_format, 'images': images})
+        response['Vary'] = 'Accept'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Get the rings whose names, descriptions or eras match ``?q=``, best first"""
+        query = parse_search_query(request)
+        if query is None:
+            return Response(
+                {'error': f'q must contain a word, offset be a non-negative integer '
+                          f'and limit an integer from 1 to {MAX_SEARCH_LIMIT}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        text, offset, limit = query
+
+        def results():
+            with timed('search'):
+                rings = search_rings(text, offset, limit)
+            return {
+                'q': text,
+                'offset': offset,
+                'limit': limit,
+                # One extra row is read to tell whether there is a next page
+                'next': offset + limit if len(rings) > limit else None,
+                'results': [{**ring, 'score': round(ring['score'], 6)} for ring in rings[:limit]],
+            }
+
+        # The browsable API and other renderers bypass the cache
+        if request.accepted_renderer.format != 'json':
+            return Response(results())
+
+        def render():
+            data = results()
+            with timed('render'):
+                return JSONRenderer().render(data)
+
+        # Ring and era changes bump the dataset version inside the cache
+        key = f"search:q={' '.join(query_words(text))}:offset={offset}:limit={limit}"
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        body = get_response_cache().get_or_render(key, render, encoding=encoding)
+        return encoded_response(body, request.accepted_renderer.media_type, encoding)
+
+    @action(detail=False, methods=['get'])
+    def snapshot(self, request):
+        """Get the era active on the given day for every ring"""
+        day = parse_day(request)
+        if day is None:
+            return Response({'error': 'day must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'day': day, 'rings': get_era_index().snapshot(day)})
+
+    @action(detail=False, methods=['get'])
+    def timeline(self, request):
+        """Get a day x ring matrix of active era IDs, optionally for ``?rings=1,2,3``"""
+        timeline_range = parse_timeline_range(request)
+        if timeline_range is None:
+            return Response(
+                {'error': f'start must be a number and days an integer from 1 to {MAX_DAYS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ring_ids = None
+        if request.query_params.get('rings'):
+            try:
+                ring_ids = [int(ring_id) for ring_id in request.query_params['rings'].split(',')]
+            except ValueError:
+                return Response({'error': 'rings must be a comma-separated list of IDs'}, status=status.HTTP_400_BAD_REQUEST)
+
+        start, days = timeline_range
+        return Response(build_timeline(start, days, ring_ids))
+
+    @action(detail=False, methods=['get'])
+    def alignments(self, request):
+        """Get the next periods in which every era in ``?eras=1,2,3`` is active at once"""
+        try:
+            era_ids = [int(era_id) for era_id in request.query_params.get('eras', '').split(',') if era_id]
+        except ValueError:
+            era_ids = []
+        if not era_ids:
+            return Response({'error': 'eras must be a comma-separated list of era IDs'}, status=status.HTTP_400_BAD_REQUEST)
+
+        query = parse_alignment_query(request)
+        if query is None:
+            return Response(
+                {'error': f'start must be a number, count an integer from 1 to {MAX_COUNT} '
+                          f'and horizon a number of days up to {MAX_HORIZON}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        era_index = get_era_index()
+        unknown = [era_id for era_id in era_ids if era_id not in era_index.eras]
+        if unknown:
+            return Response({'error': f'Unknown era IDs: {unknown}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        start, count, horizon = query
+        period, alignments = find_alignments(era_index, era_ids, start, count, horizon)
+        eras = []
+        for era_id in era_ids:
+            era = era_index.eras[era_id]
+            eras.append({
+                'id': era_id,
+                'name': era['name'],
+                'ring': era['ring_id'],
+                'ring_name': era_index.ring_names[era['ring_id']],
+                'number_of_ticks': era_index.rings[era['ring_id']].number_of_ticks,
+            })
+        return Response({
+            'start': start,
+            'horizon': horizon,
+            'period': period,
+            'eras': eras,
+            'alignments': [
+                {'start': round(window_start, 6), 'end': round(window_end, 6)}
+                for window_start, window_end in alignments
+            ],
+        })
 
 class RingEraViewSet(viewsets.ModelViewSet):
     queryset = RingEra.objects.all().order_by('start_day')
     serializer_class = RingEraSerializer
 
+    @conditional(model_state(RingEra))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(model_state(RingEra))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 class RingImageViewSet(viewsets.ModelViewSet):
     queryset = RingImage.objects.all().order_by('order')
     serializer_class = RingImageSerializer
 
-class UserRingViewSet(viewsets.ViewSet):
+    @conditional(model_state(RingImage))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(model_state(RingImage))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=True, methods=['get'])
+    def variant(self, request, pk=None):
+        """Redirect to the image's derivative for ``?width=`` (or ``?scale=``) on-screen pixels"""
+        image = get_object_or_404(RingImage.objects.select_related('ring'), pk=pk)
+        query = parse_image_query(request, image.ring.thickness)
+        if query is None:
+            return image_query_error()
+        variant = image_variant(image, *query)
+        if variant is None:
+            return Response({'error': 'This image has no derivatives yet'}, status=status.HTTP_404_NOT_FOUND)
+        response = HttpResponseRedirect(variant[0])
+        response['Vary'] = 'Accept'
+        return response
+
+class CacheViewSet(viewsets.ViewSet):
+    """Viewset exposing response cache metrics"""
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Get hit/miss counters and the current dataset version"""
+        return Response(get_response_cache().stats())
+
+class UserRingViewSet(CachedListMixin, viewsets.ViewSet):
     """
     Viewset for managing user ring preferences
     """
+
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, LeanJSONRenderer]
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('context', {'request': self.request})
+        if self.request.accepted_renderer.format == 'lean':
+            return LeanRingSerializer(*args, **kwargs)
+        return RingSerializer(*args, **kwargs)
     
+    @conditional(user_ring_state)
     def list(self, request):
-        """Get all rings for the current user"""
+        """Get all rings for the current user, in the user's display order"""
         # For demo purposes, use the first user
         # In a real app, you'd use request.user
         user = User.objects.first()
+        preference_version = get_preference_version(user)
         
-        # Get the user's ring preferences
-        preferences = UserRingPreference.objects.filter(user=user).order_by('display_order')
+        # One query joining rings to the user's preferences, plus the ordered
+        # era and image prefetches
+        rings = (
+            Ring.objects.filter(user_preferences__user=user)
+            .annotate(display_order=F('user_preferences__display_order'))
+            .order_by('display_order', 'index')
+            .with_eras_and_images()
+        )
         
-        # Get the associated rings
-        ring_ids = preferences.values_list('ring_id', flat=True)
-        rings = Ring.objects.filter(id__in=ring_ids).order_by('index')
-        
-        serializer = RingSerializer(rings, many=True)
-        return Response(serializer.data)
+        # Ring data changes are covered by the dataset version inside the cache
+        key = f'{request.get_full_path()}:user={user.pk if user else None}:preferences={preference_version}'
+        return self.cached_list_response(request, rings, key=key)
+
+    @action(detail=False, methods=['get'])
+    def snapshot(self, request):
+        """Get the era active on the given day for each of the current user's rings"""
+        # For demo purposes, use the first user
+        # In a real app, you'd use request.user
+        user = User.objects.first()
+
+        day = parse_day(request)
+        if day is None:
+            return Response({'error': 'day must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ring_ids = UserRingPreference.objects.filter(user=user).values_list('ring_id', flat=True)
+        return Response({'day': day, 'rings': get_era_index().snapshot(day, ring_ids)})
+
+    @action(detail=False, methods=['get'])
+    def timeline(self, request):
+        """Get a day x ring matrix of active era IDs for the current user's rings"""
+        # For demo purposes, use the first user
+        # In a real app, you'd use request.user
+        user = User.objects.first()
+
+        timeline_range = parse_timeline_range(request)
+        if timeline_range is None:
+            return Response(
+                {'error': f'start must be a number and days an integer from 1 to {MAX_DAYS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        start, days = timeline_range
+        ring_ids = UserRingPreference.objects.filter(user=user).values_list('ring_id', flat=True)
+        return Response(build_timeline(start, days, ring_ids))
     
     @action(detail=False, methods=['post'], url_path='update')
     def update_rings(self, request):
@@ -86,27 +509,170 @@ class UserRingViewSet(viewsets.ViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         ring_ids = serializer.validated_data['ring_ids']
+        expected_version = serializer.validated_data.get('version')
         
-        # Get the rings
-        rings = Ring.objects.filter(id__in=ring_ids)
-        
-        # Check if all ring IDs are valid
-        if len(rings) != len(ring_ids):
+        # Check if all ring IDs are valid (duplicates count as invalid)
+        if Ring.objects.filter(id__in=ring_ids).count() != len(ring_ids):
             return Response(
                 {'error': 'One or more ring IDs are invalid'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         with transaction.atomic():
-            # Delete all existing preferences
-            UserRingPreference.objects.filter(user=user).delete()
-            
-            # Create new preferences
-            for i, ring_id in enumerate(ring_ids):
-                UserRingPreference.objects.create(
-                    user=user,
-                    ring_id=ring_id,
-                    display_order=i
+            version, _ = UserRingPreferenceVersion.objects.get_or_create(user=user)
+
+            # Compare-and-swap the version so concurrent updates cannot both win
+            versions = UserRingPreferenceVersion.objects.filter(pk=version.pk)
+            if expected_version is not None:
+                versions = versions.filter(version=expected_version)
+            if not versions.update(version=F('version') + 1):
+                return Response(
+                    {
+                        'error': 'Ring preferences were changed by another update',
+                        'version': UserRingPreferenceVersion.objects.get(pk=version.pk).version,
+                    },
+                    status=status.HTTP_409_CONFLICT
                 )
+
+            # Diff against the existing preferences and write only what changed
+            existing = {
+                preference.ring_id: preference
+                for preference in UserRingPreference.objects.filter(user=user)
+            }
+            to_create = []
+            to_update = []
+            for i, ring_id in enumerate(ring_ids):
+                preference = existing.pop(ring_id, None)
+                if preference is None:
+                    to_create.append(UserRingPreference(user=user, ring_id=ring_id, display_order=i))
+                elif preference.display_order != i:
+                    preference.display_order = i
+                    to_update.append(preference)
+
+            if existing:
+                # The version was bumped once above, so the per-row handler
+                # that bumps it for admin deletes is muted
+                removed = UserRingPreference.objects.filter(id__in=[preference.id for preference in existing.values()])
+                with bulk_ring_writes():
+                    removed.delete()
+            if to_update:
+                UserRingPreference.objects.bulk_update(to_update, ['display_order'])
+            if to_create:
+                UserRingPreference.objects.bulk_create(to_create)
+
+            new_version = UserRingPreferenceVersion.objects.get(pk=version.pk).version
         
-        return Response({'status': 'Ring preferences updated successfully'})
+        return Response({'status': 'Ring preferences updated successfully', 'version': new_version})
+
+    @action(detail=False, methods=['get'])
+    def preferences(self, request):
+        """Get the current user's ring IDs in display order and the preference version"""
+        # For demo purposes, use the first user
+        # In a real app, you'd use request.user
+        user = User.objects.first()
+
+        ring_ids = UserRingPreference.objects.filter(user=user).order_by('display_order').values_list('ring_id', flat=True)
+        return Response({'ring_ids': list(ring_ids), 'version': get_preference_version(user)})
+
+@require_GET
+def user_ring_calendar(request):
+    """iCalendar feed of the current user's era occurrences, streamed and cached"""
+    # For demo purposes, use the first user
+    # In a real app, you'd use request.user
+    user = User.objects.first()
+
+    calendar_range = parse_calendar_range(request.GET)
+    if calendar_range is None:
+        return JsonResponse(
+            {'error': f'anchor must be a YYYY-MM-DD date and years an integer from 1 to {MAX_YEARS}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    anchor, years = calendar_range
+    # Ring data changes are covered by the dataset version inside the cache
+    key = (
+        f'calendar:user={user.pk if user else None}:preferences={get_preference_version(user)}'
+        f':anchor={anchor.isoformat()}:years={years}'
+    )
+    chunks = get_response_cache().get_or_stream(
+        key,
+        lambda: iter_calendar(calendar_eras(user), anchor, add_years(anchor, years)),
+        MAX_CACHED_BYTES,
+    )
+    return StreamingHttpResponse(chunks, content_type='text/calendar; charset=utf-8')
+
+def wheel_image_response(request, ring_ids, image_format, key):
+    """Rendered wheel for ``ring_ids`` (innermost first), cached under ``key``"""
+    if image_format not in FORMATS:
+        return JsonResponse({'error': f"Format must be one of {', '.join(FORMATS)}"}, status=status.HTTP_404_NOT_FOUND)
+    query = parse_wheel_query(request.GET)
+    if query is None:
+        return JsonResponse(
+            {'error': f"day must be a number and size an integer from {MIN_SIZE} to {get_render_config()['MAX_SIZE']}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    day, size = query
+    # PNG is compressed already; SVG is stored precompressed like list bodies
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding')) if image_format == 'svg' else None
+    # Ring data changes are covered by the dataset version inside the cache
+    body = get_response_cache().get_or_render(
+        f'{key}:day={day}:size={size}:{image_format}',
+        lambda: render_wheel(ring_ids, day, size, image_format),
+        encoding,
+    )
+    return encoded_response(body, FORMATS[image_format], encoding)
+
+@require_GET
+def wheel_image(request, image_format):
+    """SVG or PNG picture of the rings in ``?rings=1,2,3`` on ``?day=N``, ``?size=`` pixels square"""
+    try:
+        ring_ids = [int(ring_id) for ring_id in request.GET.get('rings', '').split(',') if ring_id]
+    except ValueError:
+        ring_ids = []
+    if not 0 < len(ring_ids) <= MAX_RINGS:
+        return JsonResponse(
+            {'error': f'rings must be a comma-separated list of 1 to {MAX_RINGS} ring IDs'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return wheel_image_response(request, ring_ids, image_format, f"wheel:rings={','.join(map(str, ring_ids))}")
+
+@require_GET
+def user_wheel_image(request, image_format):
+    """SVG or PNG picture of the current user's wheel on ``?day=N``"""
+    # For demo purposes, use the first user
+    # In a real app, you'd use request.user
+    user = User.objects.first()
+    ring_ids = list(
+        UserRingPreference.objects.filter(user=user).order_by('display_order').values_list('ring_id', flat=True)[:MAX_RINGS]
+    )
+    key = f'wheel:user={user.pk if user else None}:preferences={get_preference_version(user)}'
+    return wheel_image_response(request, ring_ids, image_format, key)
+
+@require_GET
+def ring_image_atlas(request, name):
+    """An image atlas file, cacheable forever as its name is a hash of its content"""
+    directory = get_atlas_config()['ATLAS_DIR']
+    if not directory or not ATLAS_NAME.match(name):
+        raise Http404
+    try:
+        stream = open(Path(directory) / name, 'rb')
+    except FileNotFoundError:
+        raise Http404
+    response = FileResponse(stream, content_type=ATLAS_FORMATS[name.rsplit('.', 1)[1]])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@require_GET
+def ring_image_derivative(request, digest, name):
+    """A ring image derivative, cacheable forever as its path holds the source's hash"""
+    directory = get_derivative_config()['DIR']
+    if not directory or not DIGEST.match(digest) or not DERIVATIVE_NAME.match(name):
+        raise Http404
+    try:
+        stream = open(derivative_dir(directory, digest) / name, 'rb')
+    except FileNotFoundError:
+        raise Http404
+    response = FileResponse(stream, content_type=DERIVATIVE_FORMATS[name.rsplit('.', 1)[1]])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response